@@ -7,15 +7,26 @@ from datetime import datetime
 import os
 from typing import Dict, List, Optional, Any
 from pydantic import BaseModel
-from fast_routes import auth_router, task_router, query_router, load_router, prompts_router
+from fast_routes import auth_router, task_router, query_router, load_router, prompts_router, stats_router
 from utils.log import logger
 from utils.rate_limiter import rate_limit_middleware
 from utils.health_check import HealthCheck
+import utils.search_outbox as search_outbox
+import utils.doc_cache as doc_cache
+import utils.likes as likes
+import utils.prompting as prompting
+from utils.indexes import ensure_indexes
+from utils.tasks.query_load import ensure_gallery_feed
+from utils.serialization import BSONJSONResponse
+from utils.model_registry import model_registry
+from utils.http_transport import transport
+import asyncio
 
 app = FastAPI(
     title="InnoWeaver",
     description="InnoWeaver API - FastAPI Version",
-    version="1.1.0"
+    version="1.1.0",
+    default_response_class=BSONJSONResponse,
 )
 
 # Configure static files and templates (must be before middleware)
@@ -31,9 +42,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Celery configuration
-app.state.broker_url = 'redis://localhost:6379/1'
-app.state.result_backend = 'redis://localhost:6379/0'
 app.state.BASE_URL = os.getenv("BASE_URL")
 
 # Add rate limiting middleware
@@ -47,6 +55,7 @@ app.include_router(task_router, prefix="/api")
 app.include_router(query_router, prefix="/api")
 app.include_router(load_router, prefix="/api")
 app.include_router(prompts_router, prefix="/api")
+app.include_router(stats_router, prefix="/api")
 
 # Request logging middleware
 @app.middleware("http")
@@ -60,6 +69,31 @@ async def log_requests(request: Request, call_next):
         logger.error(f"Request failed: {str(e)}")
         raise
 
+@app.on_event("startup")
+async def start_background_workers():
+    # Index builds can take a while and must not hold up serving requests
+    app.state.index_task = asyncio.create_task(ensure_indexes())
+    app.state.feed_build_task = asyncio.create_task(ensure_gallery_feed())
+    app.state.search_outbox_task = asyncio.create_task(search_outbox.run_consumer())
+    app.state.cache_listener_task = asyncio.create_task(doc_cache.run_invalidation_listener())
+    app.state.likes_flusher_task = asyncio.create_task(likes.run_flusher())
+    app.state.prompt_reloader_task = asyncio.create_task(prompting.run_reloader())
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    app.state.search_outbox_task.cancel()
+    app.state.cache_listener_task.cancel()
+    app.state.likes_flusher_task.cancel()
+    app.state.feed_build_task.cancel()
+    app.state.prompt_reloader_task.cancel()
+    app.state.index_task.cancel()
+    try:
+        await likes.flush()
+    except Exception as e:
+        logger.error(f"Final like flush failed: {e}")
+    await model_registry.aclose()
+    await transport.aclose()
+
 @app.get("/hello")
 async def hello():
     return {"message": "Hello World!"}
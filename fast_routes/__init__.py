@@ -3,11 +3,13 @@ from .task import task_router
 from .query import query_router
 from .load import load_router
 from .prompts import prompts_router
+from .stats import stats_router
 
 __all__ = [
     "auth_router",
     "task_router",
     "query_router",
     "load_router",
-    "prompts_router"
+    "prompts_router",
+    "stats_router"
 ] 
\ No newline at end of file
@@ -4,11 +4,12 @@ from utils.auth_utils import fastapi_token_required, fastapi_validate_input
 from utils.rate_limiter import rate_limit_dependency, rate_limiter
 import utils.tasks as USER
 from .utils import route_handler
+from utils.serialization import BSONJSONResponse
 
 # Configure login endpoint specific rate limiting rules - prevent brute force attacks
 rate_limiter.add_endpoint_limit("/api/login", 10, 60)  # Login 10 times per minute
 
-auth_router = APIRouter()
+auth_router = APIRouter(default_response_class=BSONJSONResponse)
 
 @auth_router.post("/register")
 @route_handler()
@@ -41,4 +42,4 @@ async def login(
 @auth_router.get("/get_user")
 @route_handler()
 async def get_user(current_user: Dict[str, Any] = Depends(fastapi_token_required)):
-    return current_user 
\ No newline at end of file
+    return {key: value for key, value in current_user.items() if key != "password"} 
\ No newline at end of file
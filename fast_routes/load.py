@@ -1,36 +1,57 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from utils.auth_utils import fastapi_token_required
 import utils.tasks as USER
 import utils.log as LOG
 from .utils import route_handler
+from utils.serialization import BSONJSONResponse
+from utils.config import PAGINATION
 import json
 
-load_router = APIRouter()
+load_router = APIRouter(default_response_class=BSONJSONResponse)
+
+# Passing `cursor` ("" for the first page) switches to keyset pagination:
+# the response becomes {"items": [...], "next_cursor": "..." | null}.
+# Without it, ?page=N keeps returning a plain list.
 
 @load_router.get("/user/load_solutions")
 @route_handler()
 async def load_user_solutions(
     page: int = Query(default=1, ge=1),
+    cursor: Optional[str] = Query(default=None),
+    limit: int = Query(default=PAGINATION["default_page_size"], ge=1, le=PAGINATION["max_page_size"]),
     current_user: Dict[str, Any] = Depends(fastapi_token_required)
 ):
-    result = await USER.load_solutions(current_user['_id'], page)
-    return result
+    try:
+        return await USER.load_solutions(current_user['_id'], page, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @load_router.get("/user/load_liked_solutions")
 @route_handler()
 async def load_user_liked_solutions(
     page: int = Query(default=1, ge=1),
+    cursor: Optional[str] = Query(default=None),
+    limit: int = Query(default=PAGINATION["default_page_size"], ge=1, le=PAGINATION["max_page_size"]),
     current_user: Dict[str, Any] = Depends(fastapi_token_required)
 ):
-    result = await USER.load_liked_solutions(current_user['_id'], page)
-    return result
+    try:
+        return await USER.load_liked_solutions(current_user['_id'], page, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @load_router.get("/gallery")
 @route_handler()
-async def gallery(page: int = Query(default=1, ge=1)):
-    result = await USER.gallery(page)
-    return result
+async def gallery(
+    page: int = Query(default=1, ge=1),
+    cursor: Optional[str] = Query(default=None),
+    limit: int = Query(default=PAGINATION["default_page_size"], ge=1, le=PAGINATION["max_page_size"]),
+    order: str = Query(default="recent", pattern="^(recent|hot)$"),
+):
+    try:
+        return await USER.gallery(page, cursor, limit, order)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @load_router.get("/logs")
 @route_handler()
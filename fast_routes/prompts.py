@@ -2,15 +2,16 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 from typing import Dict, Any
 from utils.auth_utils import fastapi_token_required, fastapi_validate_input
 import utils.prompting as PROMPTING
+import asyncio
 from pydantic import BaseModel
 from .utils import route_handler
-import os
+from utils.serialization import BSONJSONResponse
 
 class PromptUpdate(BaseModel):
     prompt_name: str
     new_content: str
 
-prompts_router = APIRouter()
+prompts_router = APIRouter(default_response_class=BSONJSONResponse)
 
 @prompts_router.get("/prompts")
 @route_handler()
@@ -41,16 +42,18 @@ async def modify_prompt(
     if prompt_name not in PROMPTING._PROMPT_FILE_PATHS:
         raise HTTPException(status_code=400, detail='Invalid prompt name')
     
-    file_name = PROMPTING._PROMPT_FILE_PATHS.get(prompt_name)
-    
-    file_path = os.path.join('prompting', f'{file_name}.txt')
-    
     try:
-        with open(file_path, 'w', encoding='utf-8') as file:
-            file.write(new_content)
-        return {'message': f'{prompt_name} updated successfully'}
-    except FileNotFoundError:
-        raise HTTPException(status_code=500, detail=f'Cannot find prompt file: {file_path}')
+        version = await asyncio.to_thread(PROMPTING.update_prompt, prompt_name, new_content)
+        return {'message': f'{prompt_name} updated successfully', 'version': version}
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=500, detail=f'Cannot find prompt directory: {e}')
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f'Error updating prompt: {e}') 
+        raise HTTPException(status_code=500, detail=f'Error updating prompt: {e}')
+
+@prompts_router.get("/prompts/versions")
+@route_handler()
+async def prompt_versions(current_user: Dict[str, Any] = Depends(fastapi_token_required)):
+    if current_user['user_type'] != 'developer':
+        raise HTTPException(status_code=403, detail='No permission to access this resource')
+    return PROMPTING.get_versions() 
     
\ No newline at end of file
@@ -2,30 +2,19 @@ from fastapi import APIRouter, Depends, HTTPException, Query, Body, Request
 from typing import Dict, Any, List
 from utils.auth_utils import fastapi_token_required
 import utils.tasks as USER
-from utils.redis import async_redis
+import utils.likes as LIKES
+from bson.objectid import ObjectId
 from pydantic import BaseModel
 from .utils import route_handler
-import json
+from utils.serialization import BSONJSONResponse
 
-query_router = APIRouter()
+query_router = APIRouter(default_response_class=BSONJSONResponse)
 
 @query_router.get("/query_solution")
 @route_handler()
 async def query_solution(id: str = Query(default="1")):
-    cache_key = f"solution:{id}"
-    cached_result = await async_redis.get(cache_key)
-    if cached_result:
-        return cached_result
-    
-    try:
-        result = await USER.query_solution(id)
-    except Exception as e:
-        print(f"Query failed: {e}")
-    try:
-        await async_redis.setex(cache_key, 3600, json.dumps(result))
-    except Exception as e:
-        print(f"Cache write failed: {e}")
-    return result
+    # Cached in utils.doc_cache; like/delete invalidate it
+    return await USER.query_solution(id)
 
 # @query_router.get("/query_paper")
 # @route_handler()
@@ -60,10 +49,7 @@ async def query_liked_solution(
 @query_router.get("/solution/{solution_id}/like_count")
 @route_handler()
 async def get_solution_like_count(solution_id: str):
-    from utils.db import solutions_collection
-    from bson.objectid import ObjectId
-    doc = await solutions_collection.find_one({'_id': ObjectId(solution_id)})
-    if not doc:
+    like_count = await LIKES.get_count(solution_id) if ObjectId.is_valid(solution_id) else None
+    if like_count is None:
         raise HTTPException(status_code=404, detail="Solution not found")
-    like_count = doc.get('Liked', 0)
     return {"solution_id": solution_id, "like_count": like_count}
@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, HTTPException
+from typing import Dict, Any
+import inspect
+from utils.auth_utils import require_developer
+from .utils import route_handler
+from utils.serialization import BSONJSONResponse
+import utils.research_queue as research_queue
+import utils.research_cache as research_cache
+import utils.search_outbox as search_outbox
+import utils.likes as likes
+import utils.feed as feed
+import utils.llm_resilience as llm_resilience
+import utils.conversations as conversations
+import utils.doc_cache as doc_cache
+import utils.streaming as streaming
+from utils.scheduler import scheduler
+from utils.model_registry import model_registry
+from utils.http_transport import transport
+
+stats_router = APIRouter(default_response_class=BSONJSONResponse)
+
+# Component name -> get_stats of the module; providers may be sync or async
+STATS_PROVIDERS = {
+    "research_queue": research_queue.get_stats,
+    "research_cache": research_cache.get_stats,
+    "search_outbox": search_outbox.get_stats,
+    "likes": likes.get_stats,
+    "feed": feed.get_stats,
+    "scheduler": scheduler.get_stats,
+    "llm_clients": model_registry.get_stats,
+    "http_transport": transport.get_stats,
+    "llm_resilience": llm_resilience.get_stats,
+    "conversations": conversations.get_stats,
+    "doc_cache": doc_cache.get_stats,
+    "streaming": streaming.get_stats,
+}
+
+@stats_router.get("/stats")
+@route_handler()
+async def list_stats(current_user: Dict[str, Any] = Depends(require_developer)):
+    return sorted(STATS_PROVIDERS)
+
+@stats_router.get("/stats/{component}")
+@route_handler()
+async def component_stats(component: str, current_user: Dict[str, Any] = Depends(require_developer)):
+    provider = STATS_PROVIDERS.get(component)
+    if provider is None:
+        raise HTTPException(status_code=404, detail=f'Unknown stats component: {component}')
+    stats = provider()
+    if inspect.isawaitable(stats):
+        stats = await stats
+    return stats
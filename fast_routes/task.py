@@ -6,12 +6,18 @@ import utils.tasks as USER
 from utils.redis import redis_client, async_redis
 from pydantic import BaseModel
 from .utils import route_handler
+from utils.serialization import BSONJSONResponse
 import json
-from utils.tasks.research import start_research
+from utils.tasks.research import start_research, resume_research
+import utils.streaming as streaming
+import utils.research_queue as research_queue
+import utils.conversations as conversations
+from utils.scheduler import scheduler
+from utils.config import RESEARCH_QUEUE, DISCONNECT_WATCH
 import asyncio
 from sse_starlette.sse import EventSourceResponse
 
-task_router = APIRouter()
+task_router = APIRouter(default_response_class=BSONJSONResponse)
 
 class KnowledgeRequest(BaseModel):
     paper: str
@@ -83,43 +89,51 @@ async def test_api_connection(
 
 # ------------------------------------------------------------------------
 
-@task_router.post("/query")
-@route_handler()
-@fastapi_validate_input(["query"])
-async def query(
-    request: Request,
-    current_user: Dict[str, Any] = Depends(fastapi_token_required),
-    _: Dict = Depends(rate_limit_dependency)
-):
-    data = await request.json()
-    query_text = data["query"]
-    design_doc = data.get("design_doc", "")
-
+def stream_workflow(request: Request, workflow, name: str, current_user: Dict[str, Any]) -> EventSourceResponse:
+    """Run workflow(send_event) in a background task and stream its events over SSE"""
     async def event_generator():
         queue: asyncio.Queue = asyncio.Queue()
+        disconnected = asyncio.Event()
+        task = None
 
         async def send_event(event_type: str, payload: Any):
-            if await request.is_disconnected():
+            if disconnected.is_set():
                 raise asyncio.CancelledError()
             await queue.put({"event": event_type, "data": payload})
 
+        async def watch_disconnect():
+            # Cancel the whole workflow as soon as the client leaves, so upstream
+            # LLM streams and image generations stop and completed checkpoints are kept
+            while not task.done():
+                if await request.is_disconnected():
+                    disconnected.set()
+                    streaming.record_disconnect()
+                    task.cancel()
+                    return
+                await asyncio.sleep(DISCONNECT_WATCH["poll_interval"])
+
+        sender = streaming.CoalescingSender(send_event, name)
+
+        async def on_queued(position: int):
+            await sender.send_event("queued", {"position": position})
+
         async def run_workflow():
             try:
-                await USER.query(
-                    current_user=current_user,
-                    query_text=query_text,
-                    design_doc=design_doc,
-                    send_event=send_event
-                )
+                async with scheduler.admit(str(current_user["_id"]), name, on_queued):
+                    await workflow(sender.send_event)
+                    await sender.flush()
             except asyncio.CancelledError:
-                print("query cancelled")
+                print(f"{name} cancelled")
                 raise
             except Exception as e:
+                await sender.flush()
                 await queue.put({"event": "error", "data": str(e)})
             finally:
+                sender.close()
                 await queue.put({"event": "end", "data": "complete"})
 
         task = asyncio.create_task(run_workflow())
+        watcher = asyncio.create_task(watch_disconnect())
         try:
             while True:
                 msg = await queue.get()
@@ -130,11 +144,62 @@ async def query(
             task.cancel()
             raise
         finally:
+            watcher.cancel()
             if not task.done():
                 task.cancel()
-    
+
+    return EventSourceResponse(event_generator(), media_type="text/event-stream")
+
+def stream_job(request: Request, job_id: str, last_event_id: Optional[str] = None) -> EventSourceResponse:
+    """Stream the events a research worker publishes for a queued job"""
+    async def event_generator():
+        client_left = False
+
+        async def disconnected() -> bool:
+            nonlocal client_left
+            client_left = await request.is_disconnected()
+            return client_left
+
+        await research_queue.attach(job_id)
+        try:
+            yield {"event": "job", "data": {"job_id": job_id}}
+            events = research_queue.subscribe(job_id, last_event_id or "0-0", should_stop=disconnected)
+            async for event_id, event_type, payload in events:
+                yield {"event": event_type, "data": payload, "id": event_id}
+        except (asyncio.CancelledError, GeneratorExit):
+            client_left = True
+            raise
+        finally:
+            if client_left:
+                streaming.record_disconnect()
+            # The worker cancels the job if no client re-attaches within cancel_grace;
+            # shielded because the response task may already be cancelled
+            await asyncio.shield(research_queue.detach(job_id, abandoned=client_left))
+
     return EventSourceResponse(event_generator(), media_type="text/event-stream")
 
+@task_router.post("/query")
+@route_handler()
+@fastapi_validate_input(["query"])
+async def query(
+    request: Request,
+    current_user: Dict[str, Any] = Depends(fastapi_token_required),
+    _: Dict = Depends(rate_limit_dependency)
+):
+    data = await request.json()
+    query_text = data["query"]
+    design_doc = data.get("design_doc", "")
+
+    async def workflow(send_event):
+        await USER.query(
+            current_user=current_user,
+            query_text=query_text,
+            design_doc=design_doc,
+            send_event=send_event
+        )
+
+    return stream_workflow(request, workflow, "query", current_user)
+
 @task_router.post("/inspiration/chat")
 @route_handler()
 async def inspiration_chat(
@@ -145,47 +210,33 @@ async def inspiration_chat(
     inspiration_id = data.get("inspiration_id")
     new_message = data.get("new_message")
     chat_history = data.get("chat_history", [])
-    
-    async def event_generator():
-        queue: asyncio.Queue = asyncio.Queue()
+    conversation_id = data.get("conversation_id")
+    # Clients opt into delta-only chunks with {"protocol": "delta"} or the X-Stream-Protocol header
+    protocol = streaming.negotiate_protocol(data.get("protocol") or request.headers.get("x-stream-protocol"))
 
-        async def send_event(event_type: str, payload: Any):
-            if await request.is_disconnected():
-                raise asyncio.CancelledError()
-            await queue.put({"event": event_type, "data": payload})
+    async def workflow(send_event):
+        await USER.handle_inspiration_chat(
+            current_user=current_user,
+            inspiration_id=inspiration_id,
+            new_message=new_message,
+            chat_history=chat_history,
+            send_event=send_event,
+            protocol=protocol,
+            conversation_id=conversation_id
+        )
 
-        async def run_workflow():
-            try:
-                await USER.handle_inspiration_chat(
-                    current_user=current_user,
-                    inspiration_id=inspiration_id,
-                    new_message=new_message,
-                    chat_history=chat_history,
-                    send_event=send_event
-                )
-            except asyncio.CancelledError:
-                print("inspiration_chat cancelled")
-                raise
-            except Exception as e:
-                await queue.put({"event": "error", "data": str(e)})
-            finally:
-                await queue.put({"event": "end", "data": "complete"})
+    return stream_workflow(request, workflow, "inspiration_chat", current_user)
 
-        task = asyncio.create_task(run_workflow())
-        try:
-            while True:
-                msg = await queue.get()
-                yield msg
-                if msg["event"] == "end":
-                    break
-        except asyncio.CancelledError:
-            task.cancel()
-            raise
-        finally:
-            if not task.done():
-                task.cancel()
-
-    return EventSourceResponse(event_generator(), media_type="text/event-stream")
+@task_router.get("/inspiration/chat/{conversation_id}")
+@route_handler()
+async def inspiration_conversation(
+    conversation_id: str,
+    current_user: Dict[str, Any] = Depends(fastapi_token_required)
+):
+    conversation = await conversations.get_conversation(str(current_user["_id"]), conversation_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail='Conversation not found')
+    return conversation
 
 @task_router.post("/research")
 @route_handler()
@@ -198,49 +249,73 @@ async def research(
     with_paper = data.get("with_paper", False)
     with_example = data.get("with_example", False)
     is_drawing = data.get("is_drawing", False)
+    use_cache = data.get("use_cache", True)
+    replay_speed = data.get("replay_speed")
     print("start research")
     print(f"with_paper: {with_paper}, with_example: {with_example}, is_drawing: {is_drawing}")
-    
-    async def event_generator():
-        queue: asyncio.Queue = asyncio.Queue()
 
-        async def send_event(event_type: str, payload: Any):
-            if await request.is_disconnected():
-                raise asyncio.CancelledError()
-            # print(f"event: {event_type}, data: {payload}")
-            await queue.put({"event": event_type, "data": payload})
+    if RESEARCH_QUEUE["enabled"]:
+        job_id = await research_queue.submit(
+            current_user,
+            {
+                "query": query,
+                "query_analysis_result": query_analysis_result,
+                "with_paper": with_paper,
+                "with_example": with_example,
+                "is_drawing": is_drawing,
+                "use_cache": use_cache,
+                "replay_speed": replay_speed,
+            },
+        )
+        return stream_job(request, job_id)
 
-        async def run_workflow():
-            try:
-                await start_research(
-                    current_user=current_user,
-                    query=query,
-                    query_analysis_result=query_analysis_result,
-                    with_paper=with_paper,
-                    with_example=with_example,
-                    is_drawing=is_drawing,
-                    send_event=send_event,
-                )
-            except asyncio.CancelledError:
-                print("research cancelled")
-                raise
-            except Exception as e:
-                await queue.put({"event": "error", "data": str(e)})
-            finally:
-                await queue.put({"event": "end", "data": "complete"})
+    async def workflow(send_event):
+        await start_research(
+            current_user=current_user,
+            query=query,
+            query_analysis_result=query_analysis_result,
+            with_paper=with_paper,
+            with_example=with_example,
+            is_drawing=is_drawing,
+            send_event=send_event,
+            use_cache=use_cache,
+            replay_speed=replay_speed,
+        )
 
-        task = asyncio.create_task(run_workflow())
-        try:
-            while True:
-                msg = await queue.get()
-                yield msg
-                if msg["event"] == "end":
-                    break
-        except asyncio.CancelledError:
-            task.cancel()
-            raise
-        finally:
-            if not task.done():
-                task.cancel()
+    return stream_workflow(request, workflow, "research", current_user)
 
-    return EventSourceResponse(event_generator(), media_type="text/event-stream")
+@task_router.get("/research/jobs/{job_id}")
+@route_handler()
+async def research_job(job_id: str, current_user: Dict[str, Any] = Depends(fastapi_token_required)):
+    job = await research_queue.get_job(job_id)
+    if not job or job.get("user_id") != str(current_user["_id"]):
+        raise HTTPException(status_code=404, detail="Research job not found")
+    return {"job_id": job_id, **job}
+
+@task_router.get("/research/jobs/{job_id}/events")
+@route_handler()
+async def research_job_events(
+    job_id: str, request: Request, current_user: Dict[str, Any] = Depends(fastapi_token_required)
+):
+    job = await research_queue.get_job(job_id)
+    if not job or job.get("user_id") != str(current_user["_id"]):
+        raise HTTPException(status_code=404, detail="Research job not found")
+    return stream_job(request, job_id, request.headers.get("last-event-id"))
+
+@task_router.post("/research/resume")
+@route_handler()
+@fastapi_validate_input(["run_id"])
+async def resume_research_run(
+    request: Request, current_user: Dict[str, Any] = Depends(fastapi_token_required)
+):
+    data = await request.json()
+    run_id = data["run_id"]
+
+    async def workflow(send_event):
+        await resume_research(
+            current_user=current_user,
+            run_id=run_id,
+            send_event=send_event,
+        )
+
+    return stream_workflow(request, workflow, "research_resume", current_user)
@@ -1,5 +1,7 @@
 from functools import wraps
 from fastapi import HTTPException
+from fastapi.responses import Response
+from utils.serialization import BSONJSONResponse
 import utils.log as LOG
 
 def route_handler():
@@ -7,7 +9,9 @@ def route_handler():
         @wraps(func)
         async def wrapper(*args, **kwargs):
             try:
-                return await func(*args, **kwargs)
+                result = await func(*args, **kwargs)
+                # Returning a Response skips FastAPI's jsonable_encoder pass
+                return result if isinstance(result, Response) else BSONJSONResponse(result)
             except HTTPException as e:
                 LOG.logger.error(f"Error in {func.__name__}: {str(e.detail)}")
                 raise
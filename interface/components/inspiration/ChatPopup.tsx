@@ -27,6 +27,8 @@ const ChatPopup = ({ isOpen, onClose, onMinimize, inspirationId, solution }: Cha
     const [inputMessage, setInputMessage] = useState('');
     const [isLoading, setIsLoading] = useState(false);
     const [streamingContent, setStreamingContent] = useState("");
+    // Server-side conversation; history after the first message is kept by the server
+    const [conversationId, setConversationId] = useState<string | null>(null);
     const { toast } = useToast();
     const messagesEndRef = useRef<HTMLDivElement>(null);
     const { apiKey } = useAuthStore();
@@ -56,6 +58,12 @@ const ChatPopup = ({ isOpen, onClose, onMinimize, inspirationId, solution }: Cha
     // Define the event handler for SSE messages
     const handleSSEEvent = (eventType: string, data: any) => {
         switch (eventType) {
+            case 'conversation':
+                if (data.conversation_id) {
+                    setConversationId(data.conversation_id);
+                }
+                break;
+
             case 'chunk':
                 if (data.content) {
                     setStreamingContent(data.content);
@@ -129,6 +137,7 @@ const ChatPopup = ({ isOpen, onClose, onMinimize, inspirationId, solution }: Cha
             inspiration_id: inspirationId,
             new_message: currentInput,
             chat_history: messageHistory,
+            conversation_id: conversationId,
         };
 
         await connect(payload, handleSSEEvent);
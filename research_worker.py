@@ -0,0 +1,41 @@
+import argparse
+import asyncio
+import multiprocessing
+from utils.config import RESEARCH_QUEUE
+
+
+def run(concurrency: int):
+    from utils.research_queue import run_worker
+
+    try:
+        asyncio.run(run_worker(concurrency))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run research job workers")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes to start")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=RESEARCH_QUEUE["concurrency"],
+        help="Research jobs run concurrently by each process",
+    )
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        run(args.concurrency)
+    else:
+        context = multiprocessing.get_context("spawn")
+        processes = [
+            context.Process(target=run, args=(args.concurrency,)) for _ in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.join()
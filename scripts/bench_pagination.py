@@ -0,0 +1,99 @@
+"""
+Compare ?page=N (skip) with keyset pagination on a synthetic solutions collection.
+
+    python -m scripts.bench_pagination --count 1000000 --pages 1,10,100,1000,10000,50000
+
+Documents go to a separate database (--db, dropped with --drop) so the real
+collections are untouched. The Mongo listing in utils/tasks/query_load.py is
+pointed at it and timed directly, so the Redis gallery feed is never read.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from bson.objectid import ObjectId
+from utils.db import mongo_client
+from utils.indexes import INDEXES
+from utils.db import solutions_collection
+import utils.tasks.query_load as QUERY
+
+
+async def seed(collection, count: int, users: int, batch: int = 10000):
+    existing = await collection.estimated_document_count()
+    if existing >= count:
+        print(f"{existing} documents already present, skipping seed")
+        return
+    user_ids = [ObjectId() for _ in range(users)]
+    base = int(time.time()) - count
+    filler = "x" * 2000
+    for start in range(existing, count, batch):
+        docs = [
+            {
+                "user_id": random.choice(user_ids),
+                "query": f"query {i}",
+                # Every third timestamp repeats, so ties on timestamp are exercised
+                "timestamp": base + i - i % 3,
+                "solution": {
+                    "Title": f"Solution {i}",
+                    "Function": f"Function {i}",
+                    "image_url": f"https://example.com/{i}.png",
+                    "Technical Method": {"Original": filler},
+                },
+            }
+            for i in range(start, min(start + batch, count))
+        ]
+        await collection.insert_many(docs, ordered=False)
+        print(f"\rseeded {start + len(docs)}/{count}", end="", flush=True)
+    print()
+
+
+async def timed(coro_factory, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await coro_factory()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--db", default="innoweaver_bench")
+    parser.add_argument("--pages", default="1,10,100,1000,10000,50000")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--drop", action="store_true", help="drop the benchmark database first")
+    args = parser.parse_args()
+
+    if args.drop:
+        await mongo_client.drop_database(args.db)
+    collection = mongo_client[args.db]["solutions"]
+    await seed(collection, args.count, args.users)
+    for spec in INDEXES:
+        if spec.collection.name == solutions_collection.name:
+            await collection.create_index(spec.keys, **spec.options)
+    QUERY.solutions_collection = collection
+
+    print(f"{'page':>8} {'skip ms':>10} {'keyset ms':>10}")
+    for page in (int(p) for p in args.pages.split(",")):
+        offset = (page - 1) * args.limit
+        if offset >= args.count:
+            break
+        skip_ms = await timed(
+            lambda: QUERY._solution_page({}, page, None, args.limit, page_projection=QUERY.CARD_PROJECTION),
+            args.repeat,
+        )
+        # Cursor of the last card on the previous page, as a client scrolling there would hold
+        cursor = ""
+        if offset:
+            last = await collection.find({}, {"timestamp": 1}).sort(QUERY.SOLUTION_SORT).skip(offset - 1).limit(1).to_list(1)
+            cursor = QUERY.encode_cursor({"t": last[0]["timestamp"], "id": str(last[0]["_id"])})
+        keyset_ms = await timed(lambda: QUERY._solution_page({}, page, cursor, args.limit), args.repeat)
+        print(f"{page:>8} {skip_ms:>10.1f} {keyset_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""
+Compare the previous response path (jsonable_encoder, JSONResponse) with
+BSONJSONResponse on synthetic gallery payloads.
+
+    python -m scripts.bench_serialization --items 10,100,1000 --repeat 50
+
+Both paths render the same payload with ids already converted to strings, as
+the routes returned it before: cards shaped like the old /api/gallery items,
+or with --full whole solution documents as returned by /api/query_solution.
+No database is needed.
+"""
+import argparse
+import datetime
+import random
+import statistics
+import time
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from utils.serialization import BSONJSONResponse
+
+
+def object_id() -> str:
+    return "%024x" % random.getrandbits(96)
+
+
+def make_solution(i: int, full: bool):
+    text = " ".join(random.choice(["sensor", "haptic", "wearable", "feedback", "interface", "display"]) for _ in range(60))
+    solution = {
+        "Title": f"Solution {i}",
+        "Function": text,
+        "image_url": f"https://example.com/{i}.png",
+    }
+    if full:
+        solution.update({
+            "Use Case": text,
+            "Technical Method": {"Original": text * 4, "Iteration": [text, text]},
+            "Possible Results": {"Performance": text, "User Experience": text},
+            "Evaluation": {"Feasibility": random.randint(1, 10), "Novelty": random.randint(1, 10), "score": random.random()},
+        })
+    card = {
+        "id": object_id(),
+        "user_id": object_id(),
+        "query": f"How can wearables give feedback {i}?",
+        "solution": solution,
+        "timestamp": int(time.time()) - i,
+    }
+    if full:
+        card.update({"_id": card["id"], "created_at": datetime.datetime.utcnow(), "Liked": random.randint(0, 500)})
+    return card
+
+
+def legacy_render(payload) -> bytes:
+    return JSONResponse(jsonable_encoder(payload)).body
+
+
+def orjson_render(payload) -> bytes:
+    return BSONJSONResponse(payload).body
+
+
+def timed(render, payload, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        render(payload)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", default="10,100,1000")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--full", action="store_true", help="whole solution documents instead of cards")
+    args = parser.parse_args()
+
+    print(f"{'items':>6} {'bytes':>10} {'legacy ms':>10} {'orjson ms':>10} {'speedup':>8}")
+    for count in (int(n) for n in args.items.split(",")):
+        payload = [make_solution(i, args.full) for i in range(count)]
+        size = len(orjson_render(payload))
+        legacy_ms = timed(legacy_render, payload, args.repeat)
+        orjson_ms = timed(orjson_render, payload, args.repeat)
+        print(f"{count:>6} {size:>10} {legacy_ms:>10.2f} {orjson_ms:>10.2f} {legacy_ms / orjson_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Apply the index registry in utils/indexes.py or verify the hot query plans.
+
+    python -m scripts.mongo_indexes apply
+    python -m scripts.mongo_indexes check
+
+apply is idempotent (the server also runs it at startup). check runs explain()
+on every hot query and exits non-zero if any plan is a COLLSCAN.
+"""
+import argparse
+import asyncio
+import sys
+from utils.indexes import ensure_indexes, check_query_plans
+
+
+async def apply() -> int:
+    failed = 0
+    for result in await ensure_indexes():
+        status = f"ok    {result['name']}" if result["ok"] else f"FAIL  {result['error']}"
+        print(f"{result['index']:<70} {status}")
+        failed += not result["ok"]
+    return 1 if failed else 0
+
+
+async def check() -> int:
+    failed = 0
+    for result in await check_query_plans():
+        detail = result.get("error") or " > ".join(result["stages"])
+        print(f"{'ok' if result['ok'] else 'FAIL':<5} {result['collection']:<18} {result['query']:<26} {detail}")
+        failed += not result["ok"]
+    if failed:
+        print(f"{failed} hot queries are not served by an index")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["apply", "check"])
+    args = parser.parse_args()
+    sys.exit(asyncio.run(apply() if args.command == "apply" else check()))
+
+
+if __name__ == "__main__":
+    main()
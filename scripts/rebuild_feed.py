@@ -0,0 +1,28 @@
+"""
+Regenerate the materialized gallery feed (utils/feed.py) from Mongo.
+
+    python -m scripts.rebuild_feed
+
+The new feed is swapped in atomically. Solutions inserted, liked or deleted
+while it is being built may be missing from it until they change again.
+"""
+import asyncio
+import sys
+import utils.feed as feed
+from utils.tasks.query_load import rebuild_gallery_feed
+
+
+async def main() -> int:
+    if not await feed.acquire_rebuild_lock():
+        print("A feed rebuild is already running")
+        return 1
+    try:
+        count = await rebuild_gallery_feed()
+    finally:
+        await feed.release_rebuild_lock()
+    print(f"Gallery feed rebuilt with {count} solutions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -54,6 +54,27 @@ class AsyncMeilisearchIndex:
             logger.error(f"Error deleting document {document_id} from index {self.index_uid}: {str(e)}")
             raise
 
+    async def delete_documents(self, document_ids: List[str]) -> Dict:
+        """Asynchronously delete several documents in one task"""
+        try:
+            url = f"{self.base_url}/documents/delete-batch"
+
+            async with httpx.AsyncClient() as client:
+                response = await client.post(
+                    url,
+                    json=document_ids,
+                    headers=self.client.headers
+                )
+                response.raise_for_status()
+                logger.info(f"Successfully deleted {len(document_ids)} documents from index {self.index_uid}")
+                return response.json()
+        except httpx.HTTPError as e:
+            logger.error(f"HTTP error while deleting documents from index {self.index_uid}: {str(e)}")
+            raise
+        except Exception as e:
+            logger.error(f"Error deleting documents from index {self.index_uid}: {str(e)}")
+            raise
+
     async def search(self, query: str, search_params: Optional[Dict] = None) -> Dict:
         """Asynchronously search documents"""
         try:
@@ -177,6 +198,47 @@ class AsyncMeilisearchClient:
             logger.error(f"Error deleting index {index_uid}: {str(e)}")
             raise
 
+    async def multi_search(self, queries: List[Dict]) -> Dict:
+        """Asynchronously run several searches in a single request"""
+        try:
+            url = f"{self.base_url}/multi-search"
+
+            async with httpx.AsyncClient() as client:
+                response = await client.post(
+                    url,
+                    json={"queries": queries},
+                    headers=self.headers
+                )
+                response.raise_for_status()
+                logger.info(f"Successfully ran multi-search with {len(queries)} queries")
+                return response.json()
+        except httpx.HTTPError as e:
+            logger.error(f"HTTP error while running multi-search: {str(e)}")
+            raise
+        except Exception as e:
+            logger.error(f"Error running multi-search: {str(e)}")
+            raise
+
+    async def get_tasks(self, task_uids: List[int]) -> Dict:
+        """Asynchronously get the status of several tasks"""
+        try:
+            url = f"{self.base_url}/tasks"
+
+            async with httpx.AsyncClient() as client:
+                response = await client.get(
+                    url,
+                    params={"uids": ",".join(str(uid) for uid in task_uids)},
+                    headers=self.headers
+                )
+                response.raise_for_status()
+                return response.json()
+        except httpx.HTTPError as e:
+            logger.error(f"HTTP error while getting tasks: {str(e)}")
+            raise
+        except Exception as e:
+            logger.error(f"Error getting tasks: {str(e)}")
+            raise
+
     async def health(self) -> Dict:
         """Asynchronously check Meilisearch health status"""
         try:
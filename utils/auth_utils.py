@@ -66,6 +66,20 @@ async def fastapi_token_required(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+async def require_developer(
+    current_user: dict = Depends(fastapi_token_required)
+) -> dict:
+    """
+    Token validation that also requires a developer account
+    Usage:
+    @router.get("/internal")
+    async def internal_route(current_user: dict = Depends(require_developer)):
+        ...
+    """
+    if current_user['user_type'] != 'developer':
+        raise HTTPException(status_code=403, detail='No permission to access this resource')
+    return current_user
+
 # FastAPI version of input validation decorator
 def fastapi_validate_input(fields: list):
     """
@@ -0,0 +1,202 @@
+from typing import Any, AsyncIterator, Dict, Optional, Sequence, Tuple
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.types import TASKS
+from utils.config import CHECKPOINT
+from utils.redis import async_redis_bytes
+
+
+class AsyncRedisCheckpointSaver(BaseCheckpointSaver):
+    """
+    LangGraph checkpointer backed by plain Redis hashes.
+
+    Layout (per thread / namespace):
+        {prefix}checkpoint:{thread_id}:{ns}           checkpoint_id -> checkpoint record
+        {prefix}writes:{thread_id}:{ns}:{checkpoint}  task_id:idx -> pending write
+    """
+
+    def __init__(self, redis=None, prefix: str = None, ttl: int = None, *, serde=None):
+        super().__init__(serde=serde)
+        self.redis = redis or async_redis_bytes
+        self.prefix = prefix or CHECKPOINT["prefix"]
+        self.ttl = ttl or CHECKPOINT["ttl"]
+
+    def _checkpoint_key(self, thread_id: str, checkpoint_ns: str) -> str:
+        return f"{self.prefix}checkpoint:{thread_id}:{checkpoint_ns}"
+
+    def _writes_key(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> str:
+        return f"{self.prefix}writes:{thread_id}:{checkpoint_ns}:{checkpoint_id}"
+
+    def _dump(self, value: Any) -> bytes:
+        type_, data = self.serde.dumps_typed(value)
+        return type_.encode() + b":" + data
+
+    def _load(self, raw: bytes) -> Any:
+        type_, data = raw.split(b":", 1)
+        return self.serde.loads_typed((type_.decode(), data))
+
+    async def _load_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> list:
+        raw_writes = await self.redis.hgetall(self._writes_key(thread_id, checkpoint_ns, checkpoint_id))
+        writes = []
+        for field, raw in raw_writes.items():
+            write = self._load(raw)
+            idx = int(field.decode().rsplit(":", 1)[1])
+            writes.append((write["task_id"], write["channel"], write["value"], write["task_path"], idx))
+        return writes
+
+    async def _build_tuple(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, raw: bytes
+    ) -> CheckpointTuple:
+        record = self._load(raw)
+        parent_checkpoint_id = record["parent_checkpoint_id"]
+        writes = await self._load_writes(thread_id, checkpoint_ns, checkpoint_id)
+
+        sends = []
+        if parent_checkpoint_id:
+            parent_writes = await self._load_writes(thread_id, checkpoint_ns, parent_checkpoint_id)
+            sends = sorted(
+                (w for w in parent_writes if w[1] == TASKS),
+                key=lambda w: (w[3], w[0], w[4]),
+            )
+
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={**record["checkpoint"], "pending_sends": [w[2] for w in sends]},
+            metadata=record["metadata"],
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes=[(w[0], w[1], w[2]) for w in writes],
+        )
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        key = self._checkpoint_key(thread_id, checkpoint_ns)
+
+        checkpoint_id = get_checkpoint_id(config)
+        if not checkpoint_id:
+            checkpoint_ids = await self.redis.hkeys(key)
+            if not checkpoint_ids:
+                return None
+            checkpoint_id = max(checkpoint_ids).decode()
+
+        raw = await self.redis.hget(key, checkpoint_id)
+        if raw is None:
+            return None
+        return await self._build_tuple(thread_id, checkpoint_ns, checkpoint_id, raw)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        if not config:
+            return
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        records = await self.redis.hgetall(self._checkpoint_key(thread_id, checkpoint_ns))
+
+        before_id = get_checkpoint_id(before) if before else None
+        for checkpoint_id in sorted(records, reverse=True):
+            checkpoint_id_str = checkpoint_id.decode()
+            if before_id and checkpoint_id_str >= before_id:
+                continue
+            item = await self._build_tuple(thread_id, checkpoint_ns, checkpoint_id_str, records[checkpoint_id])
+            if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                if limit <= 0:
+                    break
+                limit -= 1
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        c = checkpoint.copy()
+        c.pop("pending_sends", None)
+        record = {
+            "checkpoint": c,
+            "metadata": get_checkpoint_metadata(config, metadata),
+            "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+        }
+
+        key = self._checkpoint_key(thread_id, checkpoint_ns)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hset(key, checkpoint["id"], self._dump(record))
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        key = self._writes_key(thread_id, checkpoint_ns, checkpoint_id)
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for idx, (channel, value) in enumerate(writes):
+                write_idx = WRITES_IDX_MAP.get(channel, idx)
+                field = f"{task_id}:{write_idx}"
+                payload = self._dump(
+                    {"task_id": task_id, "channel": channel, "value": value, "task_path": task_path}
+                )
+                if write_idx >= 0:
+                    pipe.hsetnx(key, field, payload)
+                else:
+                    pipe.hset(key, field, payload)
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        keys = []
+        for pattern in (f"{self.prefix}checkpoint:{thread_id}:*", f"{self.prefix}writes:{thread_id}:*"):
+            keys.extend([key async for key in self.redis.scan_iter(match=pattern)])
+        if keys:
+            await self.redis.delete(*keys)
@@ -42,6 +42,166 @@ MEILISEARCH = {
     "api_key": os.getenv("MEILI_API_KEY", ""),
 }
 
+# Retrieval configuration for the research pipeline
+RAG = {
+    "index": os.getenv("RAG_INDEX", "paper_id"),
+    "max_queries": int(os.getenv("RAG_MAX_QUERIES", 8)),
+    "hits_per_query": int(os.getenv("RAG_HITS_PER_QUERY", 10)),
+    "max_hits": int(os.getenv("RAG_MAX_HITS", 10)),
+    "rrf_k": int(os.getenv("RAG_RRF_K", 60)),
+}
+
+# Image generation concurrency for the research drawing stage
+DRAWING = {
+    "run_concurrency": int(os.getenv("DRAWING_RUN_CONCURRENCY", 3)),
+    "global_concurrency": int(os.getenv("DRAWING_GLOBAL_CONCURRENCY", 8)),
+}
+
+# Research run checkpoints (LangGraph state saved after each node)
+CHECKPOINT = {
+    "prefix": os.getenv("CHECKPOINT_PREFIX", "innoweaver:research:"),
+    "ttl": int(os.getenv("CHECKPOINT_TTL", 3600 * 24)),
+    "lock_ttl": int(os.getenv("CHECKPOINT_LOCK_TTL", 900)),
+}
+
+# Result cache for completed research runs
+RESEARCH_CACHE = {
+    "enabled": os.getenv("RESEARCH_CACHE_ENABLED", "true").lower() == "true",
+    "prefix": os.getenv("RESEARCH_CACHE_PREFIX", "innoweaver:research_cache:"),
+    "ttl": int(os.getenv("RESEARCH_CACHE_TTL", 3600 * 24)),
+    "max_entries": int(os.getenv("RESEARCH_CACHE_MAX_ENTRIES", 500)),
+    "max_bytes": int(os.getenv("RESEARCH_CACHE_MAX_BYTES", 2 * 1024 * 1024)),
+    "replay_speed": float(os.getenv("RESEARCH_CACHE_REPLAY_SPEED", 0)),
+    "max_replay_delay": float(os.getenv("RESEARCH_CACHE_MAX_REPLAY_DELAY", 0.5)),
+}
+
+# Write-behind outbox that syncs Mongo writes into Meilisearch
+SEARCH_OUTBOX = {
+    "stream": os.getenv("SEARCH_OUTBOX_STREAM", "innoweaver:outbox:search"),
+    "group": os.getenv("SEARCH_OUTBOX_GROUP", "search-sync"),
+    "max_len": int(os.getenv("SEARCH_OUTBOX_MAX_LEN", 100000)),
+    "batch_size": int(os.getenv("SEARCH_OUTBOX_BATCH_SIZE", 200)),
+    "block_ms": int(os.getenv("SEARCH_OUTBOX_BLOCK_MS", 1000)),
+    "claim_idle_ms": int(os.getenv("SEARCH_OUTBOX_CLAIM_IDLE_MS", 30000)),
+    "max_attempts": int(os.getenv("SEARCH_OUTBOX_MAX_ATTEMPTS", 5)),
+    "retry_delay": float(os.getenv("SEARCH_OUTBOX_RETRY_DELAY", 5)),
+    "task_check_interval": float(os.getenv("SEARCH_OUTBOX_TASK_CHECK_INTERVAL", 10)),
+}
+
+# Research job queue consumed by research_worker.py processes
+RESEARCH_QUEUE = {
+    "enabled": os.getenv("RESEARCH_QUEUE_ENABLED", "true").lower() == "true",
+    "prefix": os.getenv("RESEARCH_QUEUE_PREFIX", "innoweaver:jobs:research:"),
+    "group": os.getenv("RESEARCH_QUEUE_GROUP", "research-workers"),
+    "concurrency": int(os.getenv("RESEARCH_WORKER_CONCURRENCY", 4)),
+    "job_timeout": int(os.getenv("RESEARCH_JOB_TIMEOUT", 600)),
+    "max_attempts": int(os.getenv("RESEARCH_JOB_MAX_ATTEMPTS", 2)),
+    "block_ms": int(os.getenv("RESEARCH_QUEUE_BLOCK_MS", 1000)),
+    "event_ttl": int(os.getenv("RESEARCH_JOB_EVENT_TTL", 3600)),
+    "heartbeat_interval": int(os.getenv("RESEARCH_WORKER_HEARTBEAT", 10)),
+    "defer_delay": float(os.getenv("RESEARCH_JOB_DEFER_DELAY", 1)),
+    # Running research jobs per user across all workers. Not shared with SCHEDULER's
+    # per_user_limit, so a user can hold this many research jobs and that many chat/query streams
+    "per_user_limit": int(os.getenv("RESEARCH_QUEUE_PER_USER_LIMIT", 2)),
+    # A job is cancelled once its last client has been gone this long without re-attaching
+    "cancel_grace": float(os.getenv("RESEARCH_JOB_CANCEL_GRACE", 15)),
+    "cancel_poll_interval": float(os.getenv("RESEARCH_JOB_CANCEL_POLL_INTERVAL", 1)),
+    # A job stream is closed after this long without events; clients re-attach with Last-Event-ID
+    "stream_idle_timeout": int(os.getenv("RESEARCH_STREAM_IDLE_TIMEOUT", 900)),
+}
+
+# Admission control for LLM-heavy streams; a lower priority value is served first
+SCHEDULER = {
+    "global_limit": int(os.getenv("SCHEDULER_GLOBAL_LIMIT", 32)),
+    # Per process; research jobs on workers count against RESEARCH_QUEUE["per_user_limit"] instead
+    "per_user_limit": int(os.getenv("SCHEDULER_PER_USER_LIMIT", 2)),
+    "max_waiting": int(os.getenv("SCHEDULER_MAX_WAITING", 200)),
+    "priorities": {
+        "inspiration_chat": 0,
+        "query": 1,
+        "research": 2,
+        "research_resume": 2,
+    },
+}
+
+# Coalescing of token chunks sent over SSE, per endpoint
+STREAMING = {
+    "default": {
+        "window_ms": int(os.getenv("STREAM_WINDOW_MS", 30)),
+        "max_bytes": int(os.getenv("STREAM_MAX_BYTES", 512)),
+    },
+    "inspiration_chat": {
+        "window_ms": int(os.getenv("CHAT_STREAM_WINDOW_MS", 30)),
+        "max_bytes": int(os.getenv("CHAT_STREAM_MAX_BYTES", 256)),
+        # Delta protocol: first snapshot after this many characters, then each time the reply doubles
+        "snapshot_min_chars": int(os.getenv("CHAT_STREAM_SNAPSHOT_MIN_CHARS", 1024)),
+    },
+}
+
+# Shared chat-model clients keyed by (base_url, api key, model)
+LLM_CLIENTS = {
+    "default_base_url": os.getenv("LLM_DEFAULT_BASE_URL", "https://api.deepseek.com/v1"),
+    "default_model": os.getenv("LLM_DEFAULT_MODEL", "deepseek-chat"),
+    "max_size": int(os.getenv("LLM_CLIENTS_MAX_SIZE", 64)),
+    "ttl": int(os.getenv("LLM_CLIENTS_TTL", 900)),
+    "http2": os.getenv("LLM_CLIENTS_HTTP2", "false").lower() == "true",
+    "max_connections": int(os.getenv("LLM_CLIENTS_MAX_CONNECTIONS", 100)),
+    "max_keepalive_connections": int(os.getenv("LLM_CLIENTS_MAX_KEEPALIVE", 20)),
+    "keepalive_expiry": float(os.getenv("LLM_CLIENTS_KEEPALIVE_EXPIRY", 60)),
+    "connect_timeout": float(os.getenv("LLM_CLIENTS_CONNECT_TIMEOUT", 10)),
+    "read_timeout": float(os.getenv("LLM_CLIENTS_READ_TIMEOUT", 120)),
+}
+
+# Shared HTTP transport for the raw OpenAI-compatible helpers in utils/main.py
+HTTP_TRANSPORT = {
+    "max_connections": int(os.getenv("HTTP_MAX_CONNECTIONS", 100)),
+    "max_keepalive_connections": int(os.getenv("HTTP_MAX_KEEPALIVE", 20)),
+    "keepalive_expiry": float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 60)),
+    "connect_timeout": float(os.getenv("HTTP_CONNECT_TIMEOUT", 10)),
+    "pool_timeout": float(os.getenv("HTTP_POOL_TIMEOUT", 30)),
+    "chat_timeout": float(os.getenv("HTTP_CHAT_TIMEOUT", 300)),
+    "image_timeout": float(os.getenv("HTTP_IMAGE_TIMEOUT", 60)),
+    "test_timeout": float(os.getenv("HTTP_TEST_TIMEOUT", 10)),
+}
+
+# Hedged requests, failover and circuit breakers for LLM providers
+LLM_RESILIENCE = {
+    "hedge_after": float(os.getenv("LLM_HEDGE_AFTER", 4.0)),
+    "secondary_base_url": os.getenv("LLM_SECONDARY_BASE_URL"),
+    "secondary_model": os.getenv("LLM_SECONDARY_MODEL"),
+    "secondary_api_key": os.getenv("LLM_SECONDARY_API_KEY"),
+    "hedge_user_keys": os.getenv("LLM_HEDGE_USER_KEYS", "false").lower() == "true",
+    "breaker_failures": int(os.getenv("LLM_BREAKER_FAILURES", 5)),
+    "breaker_reset": float(os.getenv("LLM_BREAKER_RESET", 30)),
+    "retries": int(os.getenv("LLM_RETRIES", 3)),
+    "retry_base_delay": float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5)),
+    "retry_max_delay": float(os.getenv("LLM_RETRY_MAX_DELAY", 8)),
+}
+
+# How often each SSE connection is polled for a client disconnect
+DISCONNECT_WATCH = {
+    "poll_interval": float(os.getenv("DISCONNECT_POLL_INTERVAL", 0.25)),
+}
+
+# Server-side inspiration chat conversations
+CONVERSATIONS = {
+    "prefix": os.getenv("CONVERSATIONS_PREFIX", "innoweaver:chat:"),
+    "ttl": int(os.getenv("CONVERSATIONS_TTL", 3600 * 24 * 7)),
+    "context_ttl": int(os.getenv("CONVERSATIONS_CONTEXT_TTL", 3600)),
+    # Tokens of recent turns sent verbatim; older turns are only in the summary
+    "window_tokens": int(os.getenv("CONVERSATIONS_WINDOW_TOKENS", 3000)),
+    # Turns kept verbatim after a summary pass, leaving headroom below window_tokens
+    "keep_tokens": int(os.getenv("CONVERSATIONS_KEEP_TOKENS", 1500)),
+    "summary_lock_ttl": int(os.getenv("CONVERSATIONS_SUMMARY_LOCK_TTL", 120)),
+}
+
+# Domain knowledge compaction before the expert nodes
+KNOWLEDGE = {
+    "token_budget": int(os.getenv("KNOWLEDGE_TOKEN_BUDGET", 6000)),
+    "encoding": os.getenv("KNOWLEDGE_ENCODING", "cl100k_base"),
+    "dedup_threshold": float(os.getenv("KNOWLEDGE_DEDUP_THRESHOLD", 0.85)),
+}
+
 # API configuration
 API = {
     "secret_key": os.getenv("SECRET_KEY", "your-secret-key"),
@@ -66,7 +226,36 @@ SMMS = {
 CACHE = {
     "default_expire": 3600,  # 1 hour
     "solution_expire": 3600 * 24,  # 24 hours
+    "paper_expire": 3600 * 24,  # 24 hours
     "user_session_expire": 3600,  # 1 hour
+    # Solution/paper documents: per-process LRU (L1) in front of Redis (L2)
+    "prefix": os.getenv("DOC_CACHE_PREFIX", "innoweaver:doc:"),
+    "invalidation_channel": os.getenv("DOC_CACHE_CHANNEL", "innoweaver:doc:invalidate"),
+    "l1_size": int(os.getenv("DOC_CACHE_L1_SIZE", 2048)),
+    "l1_ttl": float(os.getenv("DOC_CACHE_L1_TTL", 60)),
+    "negative_expire": int(os.getenv("DOC_CACHE_NEGATIVE_TTL", 30)),
+    # Loads that started before an invalidation are not written back within this window
+    "invalidation_window": int(os.getenv("DOC_CACHE_INVALIDATION_WINDOW", 5)),
+}
+
+# Solution likes are toggled in Redis and flushed to Mongo/Meilisearch in batches
+LIKES = {
+    "prefix": os.getenv("LIKES_PREFIX", "innoweaver:likes:"),
+    "flush_interval": float(os.getenv("LIKES_FLUSH_INTERVAL", 1)),
+    "flush_lock_ttl": int(os.getenv("LIKES_FLUSH_LOCK_TTL", 60)),
+    # A user's liked set is reloaded from Mongo after this much inactivity
+    "user_ttl": int(os.getenv("LIKES_USER_TTL", 3600 * 24 * 7)),
+    # Cached like counts are recomputed from Mongo after this long
+    "count_ttl": int(os.getenv("LIKES_COUNT_TTL", 3600)),
+}
+
+# Materialized /api/gallery feed in Redis; pages past max_items are read from Mongo
+FEED = {
+    "prefix": os.getenv("FEED_PREFIX", "innoweaver:feed:"),
+    "max_items": int(os.getenv("FEED_MAX_ITEMS", 10000)),
+    # "hot" order: ten times the likes is worth this many seconds of recency
+    "hot_decay_seconds": int(os.getenv("FEED_HOT_DECAY_SECONDS", 45000)),
+    "rebuild_lock_ttl": int(os.getenv("FEED_REBUILD_LOCK_TTL", 300)),
 }
 
 # Pagination configuration
@@ -74,6 +263,10 @@ PAGINATION = {"default_page_size": 10, "max_page_size": 100}
 
 # Prompt file paths
 PROMPT_DIR = ROOT_DIR / "prompting"
+# Prompts are served from memory; a background task checks the files for changes this often (seconds)
+PROMPTS = {
+    "reload_interval": float(os.getenv("PROMPTS_RELOAD_INTERVAL", 2)),
+}
 PROMPT_FILES = {
     "KNOWLEDGE_EXTRACTION": "knowledge_extraction_system_prompt",
     "DOMAIN_EXPERT": "domain_expert_system_prompt",
@@ -0,0 +1,253 @@
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from utils.config import CONVERSATIONS
+from utils.redis import async_redis
+from utils.knowledge import count_tokens, render_json
+from utils.model_registry import model_registry
+import utils.prompting as prompting
+import utils.tasks.query_load as QUERY
+import utils.log as LOG
+
+_PREFIX = CONVERSATIONS["prefix"]
+# Identifiers carry no meaning for the model
+_CONTEXT_SKIP_FIELDS = ("_id", "id", "user_id")
+
+_summary_tasks = set()
+_stats = {
+    "turns": 0,
+    "prompts": 0,
+    "conversations_created": 0,
+    "context_hits": 0,
+    "context_misses": 0,
+    "summaries": 0,
+    "summary_failures": 0,
+    "turns_summarized": 0,
+    "history_tokens_total": 0,
+    "history_tokens_max": 0,
+}
+
+
+def _conversation_key(conversation_id: str) -> str:
+    return f"{_PREFIX}conv:{conversation_id}"
+
+
+def _turns_key(conversation_id: str) -> str:
+    return f"{_PREFIX}conv:{conversation_id}:turns"
+
+
+def _context_key(inspiration_id: str) -> str:
+    return f"{_PREFIX}context:{inspiration_id}"
+
+
+def _turn(role: str, content: str) -> str:
+    return json.dumps({"role": role, "content": content, "tokens": count_tokens(content)}, ensure_ascii=False)
+
+
+def _recent(turns: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+    """The longest suffix of turns that fits in budget tokens"""
+    total = 0
+    start = len(turns)
+    for turn in reversed(turns):
+        total += turn["tokens"]
+        if total > budget:
+            break
+        start -= 1
+    return turns[start:]
+
+
+async def get_context(inspiration_id: str) -> str:
+    """Inspiration rendered once for the prompt and shared by every conversation about it"""
+    if not inspiration_id:
+        return "No inspiration found."
+    key = _context_key(inspiration_id)
+    cached = await async_redis.get(key)
+    if cached is not None:
+        _stats["context_hits"] += 1
+        return cached
+    _stats["context_misses"] += 1
+    doc = await QUERY.query_solution(inspiration_id)
+    if not doc:
+        return "No inspiration found."
+    context = render_json({k: v for k, v in doc.items() if k not in _CONTEXT_SKIP_FIELDS})
+    await async_redis.set(key, context, ex=CONVERSATIONS["context_ttl"])
+    return context
+
+
+async def invalidate_context(inspiration_id: str):
+    await async_redis.delete(_context_key(inspiration_id))
+
+
+async def open_conversation(
+    user_id: str,
+    conversation_id: Optional[str],
+    inspiration_id: Optional[str],
+    chat_history: Optional[list] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Load a conversation owned by user_id, or start one seeded with the
+    client-sent chat_history. Without a conversation_id the user gets one
+    conversation per inspiration, kept while the history sent matches its
+    turns, so clients that only send chat_history reuse it (and its summary)
+    instead of starting a new one on every message.
+    """
+    if conversation_id:
+        meta = await async_redis.hgetall(_conversation_key(conversation_id))
+        if meta and meta.get("user_id") == user_id and (not inspiration_id or meta.get("inspiration_id") == inspiration_id):
+            return conversation_id, meta
+
+    seed = [
+        _turn(msg["role"], msg["content"])
+        for msg in chat_history or []
+        if isinstance(msg, dict) and msg.get("role") in ("user", "assistant") and isinstance(msg.get("content"), str)
+    ]
+    if conversation_id:
+        # Unknown or expired: start over under a new id
+        conversation_id = uuid.uuid4().hex
+    else:
+        conversation_id = f"{user_id}.{inspiration_id or 'none'}"
+        async with async_redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(_conversation_key(conversation_id))
+            pipe.llen(_turns_key(conversation_id))
+            meta, stored = await pipe.execute()
+        # Each recorded turn is also appended by the client, so matching lengths mean the same chat
+        if meta and stored == len(seed):
+            return conversation_id, meta
+
+    meta = {
+        "user_id": user_id,
+        "inspiration_id": inspiration_id or "",
+        "summary": "",
+        "summarized": 0,
+        "created_at": time.time(),
+    }
+    async with async_redis.pipeline(transaction=True) as pipe:
+        pipe.delete(_turns_key(conversation_id))
+        pipe.hset(_conversation_key(conversation_id), mapping=meta)
+        pipe.expire(_conversation_key(conversation_id), CONVERSATIONS["ttl"])
+        if seed:
+            pipe.rpush(_turns_key(conversation_id), *seed)
+            pipe.expire(_turns_key(conversation_id), CONVERSATIONS["ttl"])
+        await pipe.execute()
+    _stats["conversations_created"] += 1
+    return conversation_id, meta
+
+
+async def _load_turns(conversation_id: str, start: int) -> List[Dict[str, Any]]:
+    return [json.loads(turn) for turn in await async_redis.lrange(_turns_key(conversation_id), start, -1)]
+
+
+async def build_messages(conversation_id: str, meta: Dict[str, Any], new_message: str) -> List[BaseMessage]:
+    """
+    Prompt for the next turn: system prompt, cached inspiration context, the
+    running summary and as many recent turns as fit in window_tokens.
+    """
+    context = await get_context(meta.get("inspiration_id"))
+    turns = _recent(await _load_turns(conversation_id, int(meta.get("summarized", 0))), CONVERSATIONS["window_tokens"])
+
+    messages: List[BaseMessage] = [
+        SystemMessage(content=prompting.get_prompt("INSPIRATION_CHAT_SYSTEM_PROMPT")),
+        SystemMessage(content=f"Inspiration: {context}"),
+    ]
+    summary = meta.get("summary")
+    if summary:
+        messages.append(SystemMessage(content=f"Summary of the earlier conversation: {summary}"))
+    messages.extend(
+        HumanMessage(content=turn["content"]) if turn["role"] == "user" else AIMessage(content=turn["content"])
+        for turn in turns
+    )
+    messages.append(HumanMessage(content=new_message))
+
+    history_tokens = sum(turn["tokens"] for turn in turns) + (count_tokens(summary) if summary else 0)
+    _stats["prompts"] += 1
+    _stats["history_tokens_total"] += history_tokens
+    _stats["history_tokens_max"] = max(_stats["history_tokens_max"], history_tokens)
+    return messages
+
+
+async def record_turn(
+    conversation_id: str,
+    meta: Dict[str, Any],
+    user_message: str,
+    reply: str,
+    current_user: Dict[str, Any],
+):
+    """Append a user/assistant turn and summarize older turns in the background once the window overflows"""
+    async with async_redis.pipeline(transaction=True) as pipe:
+        pipe.rpush(_turns_key(conversation_id), _turn("user", user_message), _turn("assistant", reply))
+        pipe.expire(_turns_key(conversation_id), CONVERSATIONS["ttl"])
+        pipe.expire(_conversation_key(conversation_id), CONVERSATIONS["ttl"])
+        await pipe.execute()
+    _stats["turns"] += 1
+
+    turns = await _load_turns(conversation_id, int(meta.get("summarized", 0)))
+    if sum(turn["tokens"] for turn in turns) > CONVERSATIONS["window_tokens"]:
+        task = asyncio.create_task(_summarize(conversation_id, current_user))
+        _summary_tasks.add(task)
+        task.add_done_callback(_summary_tasks.discard)
+
+
+async def _summarize(conversation_id: str, current_user: Dict[str, Any]):
+    lock_key = f"{_conversation_key(conversation_id)}:summarizing"
+    if not await async_redis.set(lock_key, "1", nx=True, ex=CONVERSATIONS["summary_lock_ttl"]):
+        return
+    try:
+        meta = await async_redis.hgetall(_conversation_key(conversation_id))
+        if not meta:
+            return
+        summarized = int(meta.get("summarized", 0))
+        turns = await _load_turns(conversation_id, summarized)
+        fold = turns[: len(turns) - len(_recent(turns, CONVERSATIONS["keep_tokens"]))]
+        if not fold:
+            return
+
+        transcript = "\n\n".join(f"{turn['role']}: {turn['content']}" for turn in fold)
+        messages = [
+            SystemMessage(content=prompting.get_prompt("CONVERSATION_SUMMARY_SYSTEM_PROMPT")),
+            HumanMessage(content=f"Previous summary: {meta.get('summary') or 'None'}\n\nConversation:\n{transcript}"),
+        ]
+        async with model_registry.for_user(current_user) as model:
+            response = await model.ainvoke(messages)
+
+        # The conversation may have been reseeded by open_conversation meanwhile
+        if await async_redis.hget(_conversation_key(conversation_id), "created_at") != meta.get("created_at"):
+            return
+        # Turns are only appended, so indexes below summarized + len(fold) are stable
+        await async_redis.hset(
+            _conversation_key(conversation_id),
+            mapping={"summary": response.content, "summarized": summarized + len(fold)},
+        )
+        _stats["summaries"] += 1
+        _stats["turns_summarized"] += len(fold)
+    except Exception as e:
+        _stats["summary_failures"] += 1
+        LOG.logger.error(f"Failed to summarize conversation {conversation_id}: {e}")
+    finally:
+        await async_redis.delete(lock_key)
+
+
+async def get_conversation(user_id: str, conversation_id: str) -> Optional[Dict[str, Any]]:
+    meta = await async_redis.hgetall(_conversation_key(conversation_id))
+    if not meta or meta.get("user_id") != user_id:
+        return None
+    turns = await _load_turns(conversation_id, 0)
+    return {
+        "conversation_id": conversation_id,
+        "inspiration_id": meta.get("inspiration_id"),
+        "summary": meta.get("summary", ""),
+        "summarized": int(meta.get("summarized", 0)),
+        "messages": [{"role": turn["role"], "content": turn["content"]} for turn in turns],
+    }
+
+
+def get_stats() -> Dict[str, Any]:
+    lookups = _stats["context_hits"] + _stats["context_misses"]
+    return {
+        **_stats,
+        "context_hit_rate": round(_stats["context_hits"] / lookups, 4) if lookups else 0,
+        "history_tokens_avg": round(_stats["history_tokens_total"] / _stats["prompts"], 1) if _stats["prompts"] else 0,
+        "summaries_running": len(_summary_tasks),
+    }
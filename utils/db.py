@@ -2,8 +2,10 @@ import json
 from typing import Optional, Dict, Any
 from motor.motor_asyncio import AsyncIOMotorClient
 from meilisearch import Client
-from .config import MONGODB, MEILISEARCH, API
+from .config import MONGODB, MEILISEARCH, API, RAG
 from .async_meilisearch import AsyncMeilisearchClient
+from .llm_json import repair_json
+from .serialization import to_jsonable
 
 # MongoDB connection URI
 mongo_uri = f"mongodb://{MONGODB['username']}:{MONGODB['password']}@{MONGODB['host']}:{MONGODB['port']}/?authSource={MONGODB['auth_db']}"
@@ -81,17 +83,58 @@ async def async_search_in_meilisearch(query, requirements):
         return {"hits": []}
 
 
+def _build_rag_queries(query, requirements):
+    if isinstance(requirements, str):
+        requirements = [requirements]
+    texts = [query] + [str(r) for r in (requirements or [])]
+
+    queries, seen = [], set()
+    for text in texts:
+        text = (text or "").strip()
+        if text and text.lower() not in seen:
+            seen.add(text.lower())
+            queries.append(text)
+    return queries[:RAG["max_queries"]]
+
+
+def fuse_search_results(result_lists, k=None, limit=None):
+    """Merge ranked hit lists with reciprocal rank fusion, de-duplicated by paper id"""
+    k = k or RAG["rrf_k"]
+    limit = limit or RAG["max_hits"]
+    scores, hits = {}, {}
+    for result_hits in result_lists:
+        for rank, hit in enumerate(result_hits):
+            paper_id = str(hit.get("_id") or hit.get("id") or "")
+            if not paper_id:
+                continue
+            scores[paper_id] = scores.get(paper_id, 0.0) + 1.0 / (k + rank + 1)
+            hits.setdefault(paper_id, hit)
+
+    ranked = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [hits[paper_id] for paper_id in ranked]
+
+
+async def async_multi_search_in_meilisearch(query, requirements):
+    """Search one query per requirement (plus the raw query) in a single multi-search request"""
+    queries = _build_rag_queries(query, requirements)
+    if not queries:
+        return {"hits": [], "queries": []}
+    try:
+        response = await async_meili_client.multi_search([
+            {"indexUid": RAG["index"], "q": q, "limit": RAG["hits_per_query"]}
+            for q in queries
+        ])
+        result_lists = [result.get("hits", []) for result in response.get("results", [])]
+        return {"hits": fuse_search_results(result_lists), "queries": queries}
+    except Exception as e:
+        print(f"Async multi-search error: {str(e)}")
+        return {"hits": [], "queries": queries}
+
+
 # Utility functions moved from tasks/config.py
 def convert_objectid_to_str(data):
-    """Convert MongoDB ObjectId to string recursively"""
-    if isinstance(data, dict):
-        return {key: convert_objectid_to_str(value) for key, value in data.items()}
-    elif isinstance(data, list):
-        return [convert_objectid_to_str(element) for element in data]
-    elif not isinstance(data, str):
-        return str(data)
-    else:
-        return data
+    """Convert MongoDB ObjectId (and other BSON types) to JSON types; numbers and booleans are kept"""
+    return to_jsonable(data)
 
 
 def solution_eval(solution: Any) -> Optional[Dict[str, Any]]:
@@ -110,15 +153,12 @@ def solution_eval(solution: Any) -> Optional[Dict[str, Any]]:
             # Try JSON parsing
             return json.loads(solution)
         except json.JSONDecodeError:
-            try:
-                # Try Python eval parsing
-                result = eval(solution)
-                if isinstance(result, dict):
-                    return result
-                return None
-            except Exception as e:
-                print(f"Parse failed: {e}")
-                return None
+            # Tolerant repair (fences, Python literals, truncation) instead of eval
+            result = repair_json(solution)
+            if isinstance(result, dict):
+                return result
+            print(f"Parse failed: {solution[:200]}")
+            return None
     elif isinstance(solution, dict):
         return solution
     else:
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from redis.exceptions import WatchError
+from utils.config import CACHE
+from utils.redis import async_redis
+import utils.serialization as serialization
+import utils.log as LOG
+
+_PREFIX = CACHE["prefix"]
+_CHANNEL = CACHE["invalidation_channel"]
+# Stored for ids that do not exist, so repeated lookups of unknown ids stay off Mongo
+_MISSING = "__missing__"
+
+_caches: Dict[str, "DocumentCache"] = {}
+
+
+class DocumentCache:
+    """
+    Two-tier read-through cache for one kind of document: an in-process LRU
+    (L1) in front of Redis (L2) in front of the loader. Writers call
+    invalidate(), which clears L2 and tells every process to drop its L1 copy.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        loader: Callable[[str], Awaitable[Optional[Dict[str, Any]]]],
+        ttl: int,
+        negative_ttl: int = None,
+        l1_size: int = None,
+        l1_ttl: float = None,
+    ):
+        self.kind = kind
+        self.loader = loader
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl or CACHE["negative_expire"]
+        self.l1_size = l1_size or CACHE["l1_size"]
+        self.l1_ttl = l1_ttl or CACHE["l1_ttl"]
+        self._l1: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        # Bumped on invalidation so a load that raced with it is not stored in L1
+        self._generation: Dict[str, int] = {}
+        self._stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "negative_hits": 0, "invalidations": 0, "l2_errors": 0}
+        _caches[kind] = self
+
+    def _key(self, doc_id: str) -> str:
+        return f"{_PREFIX}{self.kind}:{doc_id}"
+
+    def _marker_key(self, doc_id: str) -> str:
+        return f"{_PREFIX}{self.kind}:invalidated:{doc_id}"
+
+    @staticmethod
+    def _decode(payload: str) -> Optional[Dict[str, Any]]:
+        # Decoded per hit so callers never share a mutable document
+        return None if payload == _MISSING else serialization.loads(payload)
+
+    def _l1_get(self, doc_id: str) -> Optional[str]:
+        entry = self._l1.get(doc_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._l1[doc_id]
+            return None
+        self._l1.move_to_end(doc_id)
+        return entry[1]
+
+    def _l1_put(self, doc_id: str, payload: str):
+        ttl = self.negative_ttl if payload == _MISSING else self.l1_ttl
+        self._l1[doc_id] = (time.monotonic() + min(ttl, self.l1_ttl), payload)
+        self._l1.move_to_end(doc_id)
+        while len(self._l1) > self.l1_size:
+            self._l1.popitem(last=False)
+
+    def evict_local(self, doc_id: str):
+        self._l1.pop(doc_id, None)
+        self._generation[doc_id] = self._generation.get(doc_id, 0) + 1
+
+    async def _fill(self, doc_id: str, payload: str, ttl: int):
+        """Write L2 unless the document was invalidated while it was being loaded"""
+        marker = self._marker_key(doc_id)
+        async with async_redis.pipeline(transaction=True) as pipe:
+            await pipe.watch(marker)
+            if await pipe.exists(marker):
+                return
+            pipe.multi()
+            pipe.set(self._key(doc_id), payload, ex=ttl)
+            try:
+                await pipe.execute()
+            except WatchError:
+                pass
+
+    async def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        doc_id = str(doc_id)
+        payload = self._l1_get(doc_id)
+        if payload is not None:
+            self._stats["l1_hits"] += 1
+            if payload == _MISSING:
+                self._stats["negative_hits"] += 1
+            return self._decode(payload)
+
+        generation = self._generation.get(doc_id, 0)
+        try:
+            payload = await async_redis.get(self._key(doc_id))
+        except Exception as e:
+            self._stats["l2_errors"] += 1
+            LOG.logger.warning(f"{self.kind} cache read failed: {e}")
+            payload = None
+        if payload is not None:
+            self._stats["l2_hits"] += 1
+            if payload == _MISSING:
+                self._stats["negative_hits"] += 1
+        else:
+            self._stats["misses"] += 1
+            doc = await self.loader(doc_id)
+            payload = _MISSING if doc is None else serialization.dumps(doc).decode()
+            try:
+                await self._fill(doc_id, payload, self.negative_ttl if doc is None else self.ttl)
+            except Exception as e:
+                self._stats["l2_errors"] += 1
+                LOG.logger.warning(f"{self.kind} cache write failed: {e}")
+
+        if self._generation.get(doc_id, 0) == generation:
+            self._l1_put(doc_id, payload)
+        return self._decode(payload)
+
+    async def invalidate(self, *doc_ids: str):
+        doc_ids = [str(doc_id) for doc_id in doc_ids if doc_id]
+        if not doc_ids:
+            return
+        for doc_id in doc_ids:
+            self.evict_local(doc_id)
+        self._stats["invalidations"] += len(doc_ids)
+        async with async_redis.pipeline(transaction=False) as pipe:
+            for doc_id in doc_ids:
+                pipe.delete(self._key(doc_id))
+                pipe.set(self._marker_key(doc_id), 1, ex=CACHE["invalidation_window"])
+            pipe.publish(_CHANNEL, json.dumps({"kind": self.kind, "ids": doc_ids}))
+            await pipe.execute()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self._stats["l1_hits"] + self._stats["l2_hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "l1_size": len(self._l1),
+            "l1_hit_rate": round(self._stats["l1_hits"] / lookups, 4) if lookups else 0,
+            # Share of L1 misses served by Redis
+            "l2_hit_rate": round(self._stats["l2_hits"] / (lookups - self._stats["l1_hits"]), 4)
+            if lookups - self._stats["l1_hits"]
+            else 0,
+            "hit_rate": round((lookups - self._stats["misses"]) / lookups, 4) if lookups else 0,
+        }
+
+
+async def invalidate(kind: str, *doc_ids: str):
+    cache = _caches.get(kind)
+    if cache is not None:
+        await cache.invalidate(*doc_ids)
+
+
+async def run_invalidation_listener():
+    """Drop L1 entries invalidated by other processes; runs for the life of the process"""
+    while True:
+        pubsub = async_redis.pubsub()
+        try:
+            await pubsub.subscribe(_CHANNEL)
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                data = json.loads(message["data"])
+                cache = _caches.get(data.get("kind"))
+                if cache is not None:
+                    for doc_id in data.get("ids", []):
+                        cache.evict_local(doc_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            LOG.logger.error(f"Cache invalidation listener failed, reconnecting: {e}")
+            # Entries cached while disconnected may have missed invalidations
+            for cache in _caches.values():
+                cache._l1.clear()
+            await asyncio.sleep(1)
+        finally:
+            try:
+                await pubsub.reset()
+            except Exception:
+                pass
+
+
+def get_stats() -> Dict[str, Any]:
+    return {kind: cache.get_stats() for kind, cache in _caches.items()}
@@ -0,0 +1,176 @@
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from utils.config import FEED
+from utils.redis import async_redis
+import utils.serialization as serialization
+import utils.log as LOG
+
+RECENT = "recent"
+HOT = "hot"
+
+_PREFIX = FEED["prefix"]
+# Sorted sets of solution ids; equal scores are ordered by id, matching the (timestamp, _id) sort in Mongo
+_ORDERS = {RECENT: f"{_PREFIX}{RECENT}", HOT: f"{_PREFIX}{HOT}"}
+_CARDS = f"{_PREFIX}cards"
+_BUILT = f"{_PREFIX}built"
+_REBUILD_LOCK = f"{_PREFIX}rebuild_lock"
+
+_stats = {"reads": 0, "missing_cards": 0, "fallbacks": 0, "added": 0, "removed": 0, "trimmed": 0, "like_updates": 0, "rebuilds": 0, "write_errors": 0}
+
+
+def hot_score(likes: int, timestamp: float) -> float:
+    """Decays by ordering rather than over time: newer solutions need fewer likes to rank as high"""
+    return math.log10(1 + max(likes, 0)) + timestamp / FEED["hot_decay_seconds"]
+
+
+async def is_built() -> bool:
+    return bool(await async_redis.exists(_BUILT))
+
+
+async def add(entries: Iterable[Tuple[Dict[str, Any], int]]):
+    """Insert (card, like count) pairs; cards are the listing payloads from utils/tasks/query_load.py"""
+    entries = list(entries)
+    if not entries:
+        return
+    try:
+        async with async_redis.pipeline(transaction=True) as pipe:
+            pipe.hset(_CARDS, mapping={card["id"]: serialization.dumps(card) for card, _ in entries})
+            pipe.zadd(_ORDERS[RECENT], {card["id"]: card["timestamp"] for card, _ in entries})
+            pipe.zadd(_ORDERS[HOT], {card["id"]: hot_score(likes, card["timestamp"]) for card, likes in entries})
+            await pipe.execute()
+        _stats["added"] += len(entries)
+        await _trim()
+    except Exception as e:
+        _stats["write_errors"] += 1
+        LOG.logger.warning(f"Gallery feed add failed: {e}")
+
+
+async def _trim():
+    """Keep the newest max_items; older pages are served from Mongo"""
+    stale = await async_redis.zrevrange(_ORDERS[RECENT], FEED["max_items"], -1)
+    if stale:
+        await _remove(stale)
+        _stats["trimmed"] += len(stale)
+
+
+async def _remove(solution_ids: List[str]):
+    async with async_redis.pipeline(transaction=True) as pipe:
+        for key in _ORDERS.values():
+            pipe.zrem(key, *solution_ids)
+        pipe.hdel(_CARDS, *solution_ids)
+        await pipe.execute()
+
+
+async def remove(*solution_ids: str):
+    solution_ids = [str(sid) for sid in solution_ids if sid]
+    if not solution_ids:
+        return
+    try:
+        await _remove(solution_ids)
+        _stats["removed"] += len(solution_ids)
+    except Exception as e:
+        _stats["write_errors"] += 1
+        LOG.logger.warning(f"Gallery feed remove failed: {e}")
+
+
+async def set_likes(counts: Dict[str, int]):
+    """Re-score solutions already in the feed after their like counts changed"""
+    if not counts:
+        return
+    try:
+        solution_ids = list(counts)
+        timestamps = await async_redis.zmscore(_ORDERS[RECENT], solution_ids)
+        scores = {
+            sid: hot_score(counts[sid], timestamp)
+            for sid, timestamp in zip(solution_ids, timestamps)
+            if timestamp is not None
+        }
+        if scores:
+            await async_redis.zadd(_ORDERS[HOT], scores, xx=True)
+            _stats["like_updates"] += len(scores)
+    except Exception as e:
+        _stats["write_errors"] += 1
+        LOG.logger.warning(f"Gallery feed like update failed: {e}")
+
+
+async def read(order: str, start: int, count: int) -> List[Tuple[str, Optional[Dict[str, Any]], float]]:
+    """
+    (solution id, card, score) at positions start..start+count-1: one ZREVRANGE
+    and one HMGET. The card is None if it is missing from the cards hash; the
+    entry is still returned so callers can tell where the listing ends.
+    """
+    _stats["reads"] += 1
+    ranked = await async_redis.zrevrange(_ORDERS[order], start, start + count - 1, withscores=True)
+    if not ranked:
+        return []
+    cards = await async_redis.hmget(_CARDS, [sid for sid, _ in ranked])
+    missing = cards.count(None)
+    if missing:
+        _stats["missing_cards"] += missing
+        LOG.logger.warning(f"Gallery feed is missing {missing} cards in {order}[{start}:{start + count}]")
+    return [
+        (sid, serialization.loads(card) if card is not None else None, score)
+        for (sid, score), card in zip(ranked, cards)
+    ]
+
+
+async def position_after(order: str, solution_id: str, score: float) -> int:
+    """Index of the first entry after a cursor; by score if the cursor's solution was removed"""
+    rank = await async_redis.zrevrank(_ORDERS[order], solution_id)
+    if rank is not None:
+        return rank + 1
+    ahead = await async_redis.zcount(_ORDERS[order], f"({score}", "+inf")
+    # Entries with an equal score are ordered by id, descending
+    ties = await async_redis.zrangebyscore(_ORDERS[order], score, score)
+    return ahead + sum(1 for member in ties if member > solution_id)
+
+
+async def size() -> int:
+    return await async_redis.zcard(_ORDERS[RECENT])
+
+
+def is_truncated(feed_size: int) -> bool:
+    return feed_size >= FEED["max_items"]
+
+
+async def replace(entries: List[Tuple[Dict[str, Any], int]]):
+    """Swap in a feed built from scratch; readers see the old or the new feed, never a partial one"""
+    staging = {key: f"{key}:rebuild" for key in (*_ORDERS.values(), _CARDS)}
+    async with async_redis.pipeline(transaction=False) as pipe:
+        pipe.delete(*staging.values())
+        for start in range(0, len(entries), 1000):
+            batch = entries[start:start + 1000]
+            pipe.hset(staging[_CARDS], mapping={card["id"]: serialization.dumps(card) for card, _ in batch})
+            pipe.zadd(staging[_ORDERS[RECENT]], {card["id"]: card["timestamp"] for card, _ in batch})
+            pipe.zadd(staging[_ORDERS[HOT]], {card["id"]: hot_score(likes, card["timestamp"]) for card, likes in batch})
+        await pipe.execute()
+    async with async_redis.pipeline(transaction=True) as pipe:
+        for key, staged in staging.items():
+            if entries:
+                pipe.rename(staged, key)
+            else:
+                pipe.delete(key)
+        pipe.set(_BUILT, 1)
+        await pipe.execute()
+    _stats["rebuilds"] += 1
+
+
+async def acquire_rebuild_lock() -> bool:
+    return bool(await async_redis.set(_REBUILD_LOCK, "1", nx=True, ex=FEED["rebuild_lock_ttl"]))
+
+
+async def release_rebuild_lock():
+    await async_redis.delete(_REBUILD_LOCK)
+
+
+def record_fallback():
+    _stats["fallbacks"] += 1
+
+
+async def get_stats() -> Dict[str, Any]:
+    async with async_redis.pipeline(transaction=False) as pipe:
+        pipe.exists(_BUILT)
+        pipe.zcard(_ORDERS[RECENT])
+        pipe.hlen(_CARDS)
+        built, items, cards = await pipe.execute()
+    return {**_stats, "built": bool(built), "items": items, "cards": cards}
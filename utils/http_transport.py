@@ -0,0 +1,84 @@
+from typing import Any, Dict, Optional
+import httpx
+from utils.config import HTTP_TRANSPORT
+import utils.log as LOG
+
+
+class HttpTransport:
+    """
+    One keep-alive httpx.AsyncClient shared by the raw OpenAI-compatible
+    helpers. Requests use absolute URLs, so a single pool serves every
+    provider origin.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._stats = {"requests": 0, "connections_opened": 0}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=HTTP_TRANSPORT["max_connections"],
+                    max_keepalive_connections=HTTP_TRANSPORT["max_keepalive_connections"],
+                    keepalive_expiry=HTTP_TRANSPORT["keepalive_expiry"],
+                ),
+                timeout=httpx.Timeout(
+                    HTTP_TRANSPORT["chat_timeout"],
+                    connect=HTTP_TRANSPORT["connect_timeout"],
+                    pool=HTTP_TRANSPORT["pool_timeout"],
+                ),
+                event_hooks={"request": [self._on_request]},
+            )
+            self._count_connections(self._pool())
+        return self._client
+
+    def _pool(self):
+        return getattr(getattr(self._client, "_transport", None), "_pool", None)
+
+    def _count_connections(self, pool):
+        if pool is None:
+            return
+        create_connection = pool.create_connection
+
+        def counting_create_connection(origin):
+            self._stats["connections_opened"] += 1
+            return create_connection(origin)
+
+        pool.create_connection = counting_create_connection
+
+    async def _on_request(self, request: httpx.Request):
+        self._stats["requests"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self._stats)
+        requests = stats["requests"]
+        stats["reuse_ratio"] = round(1 - stats["connections_opened"] / requests, 4) if requests else 0
+        pool = self._pool()
+        if pool is None or self._client.is_closed:
+            stats.update({"open_connections": 0, "idle_connections": 0, "waiters": 0})
+            return stats
+        connections = list(pool.connections)
+        stats["open_connections"] = len(connections)
+        stats["idle_connections"] = sum(1 for connection in connections if connection.is_idle())
+        # Requests queued for a free connection; httpcore keeps them privately
+        stats["waiters"] = sum(
+            1 for request in getattr(pool, "_requests", []) if getattr(request, "connection", None) is None
+        )
+        return stats
+
+    async def aclose(self):
+        if self._client is not None:
+            try:
+                await self._client.aclose()
+            except Exception as e:
+                LOG.logger.error(f"Failed to close HTTP transport: {e}")
+            self._client = None
+
+
+def endpoint(base_url: str, path: str) -> str:
+    return f"{base_url.rstrip('/')}/{path.lstrip('/')}"
+
+
+transport = HttpTransport()
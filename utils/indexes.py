@@ -0,0 +1,140 @@
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from bson.objectid import ObjectId
+from pymongo.errors import ConnectionFailure, OperationFailure
+from utils.db import (
+    users_collection, solutions_collection, papers_collection,
+    solutions_liked_collection, papers_cited_collection, papers_liked_collection
+)
+import utils.log as LOG
+
+
+class IndexSpec(NamedTuple):
+    collection: Any
+    keys: List[Tuple[str, int]]
+    unique: bool = False
+    purpose: str = ""
+
+    @property
+    def options(self) -> Dict[str, Any]:
+        return {"unique": True} if self.unique else {}
+
+
+class HotQuery(NamedTuple):
+    name: str
+    collection: Any
+    filter: Dict[str, Any]
+    sort: Optional[List[Tuple[str, int]]] = None
+    limit: int = 0
+
+
+# Every collection used in utils/tasks/; papersCollection is only read by _id
+INDEXES: List[IndexSpec] = [
+    IndexSpec(users_collection, [("email", 1)], unique=True,
+              purpose="register/login lookup; one account per email"),
+    IndexSpec(solutions_collection, [("timestamp", -1), ("_id", -1)],
+              purpose="gallery, newest first"),
+    IndexSpec(solutions_collection, [("user_id", 1), ("timestamp", -1), ("_id", -1)],
+              purpose="load_solutions: a user's solutions, newest first"),
+    IndexSpec(solutions_liked_collection, [("user_id", 1), ("solution_id", 1)], unique=True,
+              purpose="like toggle and isLiked lookups; one like per user and solution"),
+    IndexSpec(solutions_liked_collection, [("user_id", 1), ("_id", -1)],
+              purpose="load_liked_solutions: a user's likes, newest first"),
+    IndexSpec(solutions_liked_collection, [("solution_id", 1)],
+              purpose="utils.likes flush: recount Liked from the relations"),
+    IndexSpec(papers_cited_collection, [("solution_id", 1)],
+              purpose="papers cited by a solution, delete_solution cleanup"),
+    IndexSpec(papers_liked_collection, [("user_id", 1), ("paper_id", 1)], unique=True,
+              purpose="one like per user and paper"),
+]
+
+# Representative shapes of the queries in utils/tasks/; the values only need the right types
+_SAMPLE_ID = ObjectId()
+HOT_QUERIES: List[HotQuery] = [
+    HotQuery("login", users_collection, {"email": "someone@example.com"}, limit=1),
+    HotQuery("gallery", solutions_collection, {}, [("timestamp", -1), ("_id", -1)], 10),
+    HotQuery("gallery_cursor", solutions_collection,
+             {"$or": [{"timestamp": {"$lt": 0}}, {"timestamp": 0, "_id": {"$lt": _SAMPLE_ID}}]},
+             [("timestamp", -1), ("_id", -1)], 11),
+    HotQuery("load_solutions", solutions_collection, {"user_id": _SAMPLE_ID}, [("timestamp", -1), ("_id", -1)], 10),
+    HotQuery("query_solution", solutions_collection, {"_id": _SAMPLE_ID}, limit=1),
+    HotQuery("query_paper", papers_collection, {"_id": _SAMPLE_ID}, limit=1),
+    HotQuery("like_relation", solutions_liked_collection, {"user_id": _SAMPLE_ID, "solution_id": _SAMPLE_ID}, limit=1),
+    HotQuery("liked_set_load", solutions_liked_collection, {"user_id": _SAMPLE_ID}),
+    HotQuery("like_recount", solutions_liked_collection, {"solution_id": {"$in": [_SAMPLE_ID]}}),
+    HotQuery("load_liked_solutions", solutions_liked_collection, {"user_id": _SAMPLE_ID}, [("_id", -1)], 10),
+    HotQuery("paper_cited_by_solution", papers_cited_collection, {"solution_id": _SAMPLE_ID}),
+    HotQuery("paper_liked", papers_liked_collection, {"user_id": _SAMPLE_ID, "paper_id": _SAMPLE_ID}, limit=1),
+]
+
+
+async def ensure_indexes() -> List[Dict[str, Any]]:
+    """
+    Create missing indexes; create_index is a no-op for ones that already
+    exist. Failures (e.g. duplicates blocking a unique index) are logged and
+    reported, never raised. If Mongo cannot be reached the remaining indexes
+    are skipped rather than each waiting out the server selection timeout.
+    """
+    results = []
+    unreachable = None
+    for spec in INDEXES:
+        target = f"{spec.collection.name} {spec.keys}"
+        if unreachable:
+            results.append({"index": target, "ok": False, "error": f"skipped, Mongo unreachable: {unreachable}"})
+            continue
+        try:
+            name = await spec.collection.create_index(spec.keys, **spec.options)
+            LOG.logger.info(f"Index {spec.collection.name}.{name} ready")
+            results.append({"index": target, "ok": True, "name": name})
+        except OperationFailure as e:
+            hint = " (duplicate documents must be removed first)" if e.code == 11000 else ""
+            LOG.logger.error(f"Failed to create index {target}{hint}: {e}")
+            results.append({"index": target, "ok": False, "error": f"{e}{hint}"})
+        except ConnectionFailure as e:
+            LOG.logger.error(f"Failed to create index {target}, skipping the rest: {e}")
+            results.append({"index": target, "ok": False, "error": str(e)})
+            unreachable = e
+        except Exception as e:
+            LOG.logger.error(f"Failed to create index {target}: {e}")
+            results.append({"index": target, "ok": False, "error": str(e)})
+    return results
+
+
+def _plan_stages(plan: Any) -> List[str]:
+    """Every stage name in a (possibly nested) explain plan"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_plan_stages(value))
+    return stages
+
+
+async def explain_query(query: HotQuery) -> Dict[str, Any]:
+    cursor = query.collection.find(query.filter)
+    if query.sort:
+        cursor = cursor.sort(query.sort)
+    if query.limit:
+        cursor = cursor.limit(query.limit)
+    explain = await cursor.explain()
+    stages = _plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+    return {
+        "query": query.name,
+        "collection": query.collection.name,
+        "stages": stages,
+        "ok": "COLLSCAN" not in stages,
+    }
+
+
+async def check_query_plans() -> List[Dict[str, Any]]:
+    """explain() every hot query; a result with ok=False fell back to a collection scan"""
+    results = []
+    for query in HOT_QUERIES:
+        try:
+            results.append(await explain_query(query))
+        except Exception as e:
+            results.append({"query": query.name, "collection": query.collection.name, "stages": [], "ok": False, "error": str(e)})
+    return results
@@ -0,0 +1,131 @@
+import json
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+from utils.config import KNOWLEDGE
+import utils.log as LOG
+
+# Paper fields the expert prompts actually reference
+PAPER_FIELDS = (
+    "Title",
+    "Target Definition",
+    "Contributions",
+    "Artifact Knowledge",
+    "Results",
+    "Second Extraction",
+)
+SOLUTION_FIELDS = ("query", "solution")
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(KNOWLEDGE["encoding"])
+    except Exception as e:
+        LOG.logger.warning(f"tiktoken unavailable, falling back to estimated token counts: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def render_json(data: Any) -> str:
+    """Compact canonical JSON rendering"""
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def _get_hits(domain_knowledge) -> List[Dict[str, Any]]:
+    if isinstance(domain_knowledge, dict):
+        domain_knowledge = domain_knowledge.get("hits", [])
+    if not isinstance(domain_knowledge, list):
+        return []
+    return [hit for hit in domain_knowledge if isinstance(hit, dict)]
+
+
+def project_hit(hit: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only the fields the prompts use"""
+    content = hit.get("content")
+    if "solution_id" in hit and isinstance(content, dict):
+        projected = {key: content[key] for key in SOLUTION_FIELDS if content.get(key)}
+        projected["solution_id"] = str(hit["solution_id"])
+        return projected
+
+    source = content if "paper_id" in hit and isinstance(content, dict) else hit
+    projected = {key: source[key] for key in PAPER_FIELDS if source.get(key)}
+    paper_id = hit.get("paper_id") or source.get("_id") or source.get("id")
+    if paper_id:
+        projected["id"] = str(paper_id)
+    return projected
+
+
+def _signature(projected: Dict[str, Any]) -> frozenset:
+    if projected.get("Title"):
+        text = str(projected["Title"])
+    else:
+        text = render_json({k: v for k, v in projected.items() if k not in ("id", "solution_id")})
+    return frozenset(_WORD_RE.findall(text.lower()))
+
+
+def _is_near_duplicate(signature: frozenset, kept: List[frozenset], threshold: float) -> bool:
+    if not signature:
+        return False
+    for other in kept:
+        union = len(signature | other)
+        if union and len(signature & other) / union >= threshold:
+            return True
+    return False
+
+
+def compact_domain_knowledge(domain_knowledge, token_budget: int = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Project, de-duplicate and fit retrieved knowledge into a token budget.
+
+    Returns:
+        (rendered JSON list, stats dict with token savings)
+    """
+    token_budget = token_budget or KNOWLEDGE["token_budget"]
+    threshold = KNOWLEDGE["dedup_threshold"]
+    hits = _get_hits(domain_knowledge)
+
+    rendered_items, signatures = [], []
+    duplicates = over_budget = 0
+    used_tokens = 2  # surrounding brackets
+    for hit in hits:
+        projected = project_hit(hit)
+        if not projected:
+            continue
+        signature = _signature(projected)
+        if _is_near_duplicate(signature, signatures, threshold):
+            duplicates += 1
+            continue
+
+        item = render_json(projected)
+        item_tokens = count_tokens(item) + 1
+        if used_tokens + item_tokens > token_budget:
+            over_budget += 1
+            continue
+        used_tokens += item_tokens
+        signatures.append(signature)
+        rendered_items.append(item)
+
+    text = "[" + ",".join(rendered_items) + "]"
+    original_tokens = count_tokens(str(domain_knowledge))
+    compact_tokens = count_tokens(text)
+    stats = {
+        "items_in": len(hits),
+        "items_out": len(rendered_items),
+        "duplicates_dropped": duplicates,
+        "over_budget_dropped": over_budget,
+        "original_tokens": original_tokens,
+        "compact_tokens": compact_tokens,
+        "tokens_saved_per_prompt": max(0, original_tokens - compact_tokens),
+        "token_budget": token_budget,
+    }
+    return text, stats
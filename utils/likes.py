@@ -0,0 +1,239 @@
+import asyncio
+import datetime
+from typing import Any, Dict, List, Optional
+from bson.objectid import ObjectId
+from pymongo import DeleteOne, UpdateOne
+from redis.exceptions import WatchError
+from utils.config import LIKES
+from utils.db import solutions_collection, solutions_liked_collection
+from utils.redis import async_redis
+import utils.doc_cache as doc_cache
+import utils.feed as feed
+import utils.search_outbox as OUTBOX
+import utils.log as LOG
+
+_PREFIX = LIKES["prefix"]
+# Relation changes not yet in Mongo: "user_id:solution_id" -> "+<time>" (liked) or "-" (unliked)
+_PENDING = f"{_PREFIX}pending"
+# Like count changes not yet in Mongo: solution_id -> delta
+_DELTAS = f"{_PREFIX}deltas"
+_PENDING_FLUSHING = f"{_PENDING}:flushing"
+_DELTAS_FLUSHING = f"{_DELTAS}:flushing"
+_FLUSH_LOCK = f"{_PREFIX}flush_lock"
+# Member that marks a user's set as loaded, so users without likes are not reloaded
+_LOADED = "__loaded__"
+
+# KEYS: user set, solution counter, deltas, pending
+# ARGV: solution_id, user_id:solution_id, user_ttl, like time
+# Returns 1 for a like, -1 for an unlike, 0 if the user's set is not loaded
+_TOGGLE = async_redis.register_script("""
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local delta = 1
+if redis.call('SREM', KEYS[1], ARGV[1]) == 1 then
+    delta = -1
+else
+    redis.call('SADD', KEYS[1], ARGV[1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('HINCRBY', KEYS[3], ARGV[1], delta)
+if delta == 1 then
+    redis.call('HSET', KEYS[4], ARGV[2], '+' .. ARGV[4])
+else
+    redis.call('HSET', KEYS[4], ARGV[2], '-')
+end
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('HINCRBY', KEYS[2], 'count', delta)
+end
+return delta
+""")
+
+_stats = {
+    "likes": 0,
+    "unlikes": 0,
+    "user_loads": 0,
+    "count_hits": 0,
+    "count_misses": 0,
+    "flushes": 0,
+    "flush_failures": 0,
+    "relations_flushed": 0,
+    "solutions_recounted": 0,
+}
+
+
+def _user_key(user_id: str) -> str:
+    return f"{_PREFIX}user:{user_id}"
+
+
+def _count_key(solution_id: str) -> str:
+    return f"{_PREFIX}solution:{solution_id}"
+
+
+def _now() -> str:
+    return datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+async def _load_user(user_id: str):
+    """Fill a user's liked set from Mongo unless another request already did"""
+    key = _user_key(user_id)
+    async with async_redis.pipeline(transaction=True) as pipe:
+        await pipe.watch(key)
+        if await pipe.exists(key):
+            return
+        relations = await solutions_liked_collection.find(
+            {"user_id": ObjectId(user_id)}, {"solution_id": 1}
+        ).to_list(None)
+        pipe.multi()
+        pipe.sadd(key, _LOADED, *[str(relation["solution_id"]) for relation in relations])
+        pipe.expire(key, LIKES["user_ttl"])
+        try:
+            await pipe.execute()
+            _stats["user_loads"] += 1
+        except WatchError:
+            pass
+
+
+async def toggle(user_id: str, solution_id: str) -> int:
+    """Like or unlike atomically; returns 1 if the solution is now liked, -1 if not"""
+    user_id, solution_id = str(user_id), str(solution_id)
+    keys = [_user_key(user_id), _count_key(solution_id), _DELTAS, _PENDING]
+    args = [solution_id, f"{user_id}:{solution_id}", LIKES["user_ttl"], _now()]
+    delta = await _TOGGLE(keys=keys, args=args)
+    if not delta:
+        await _load_user(user_id)
+        delta = await _TOGGLE(keys=keys, args=args)
+    if not delta:
+        raise RuntimeError(f"Liked set of user {user_id} could not be loaded")
+    _stats["likes" if delta > 0 else "unlikes"] += 1
+    return int(delta)
+
+
+async def is_liked(user_id: str, solution_ids: List[str]) -> List[bool]:
+    key = _user_key(str(user_id))
+    solution_ids = [str(sid) for sid in solution_ids]
+    async with async_redis.pipeline(transaction=False) as pipe:
+        pipe.exists(key)
+        pipe.smismember(key, solution_ids)
+        pipe.expire(key, LIKES["user_ttl"])
+        loaded, members, _ = await pipe.execute()
+    if not loaded:
+        await _load_user(str(user_id))
+        members = await async_redis.smismember(key, solution_ids)
+    return [bool(member) for member in members]
+
+
+async def get_count(solution_id: str) -> Optional[int]:
+    """Like count including changes not yet flushed; None if the solution does not exist"""
+    solution_id = str(solution_id)
+    key = _count_key(solution_id)
+    cached = await async_redis.hget(key, "count")
+    if cached is not None:
+        _stats["count_hits"] += 1
+        return int(cached)
+
+    _stats["count_misses"] += 1
+    async with async_redis.pipeline(transaction=True) as pipe:
+        # A toggle or flush while reading would make the sum stale, so it is only cached if neither happened
+        await pipe.watch(_DELTAS, _DELTAS_FLUSHING)
+        doc = await solutions_collection.find_one({"_id": ObjectId(solution_id)}, {"Liked": 1})
+        if doc is None:
+            return None
+        count = doc.get("Liked", 0)
+        for deltas_key in (_DELTAS, _DELTAS_FLUSHING):
+            count += int(await pipe.hget(deltas_key, solution_id) or 0)
+        # Mid-flush, Liked may already include the flushing deltas, so the sum is not cached
+        if await pipe.exists(_DELTAS_FLUSHING):
+            return count
+        pipe.multi()
+        pipe.hset(key, "count", count)
+        pipe.expire(key, LIKES["count_ttl"])
+        try:
+            await pipe.execute()
+        except WatchError:
+            pass
+    return count
+
+
+async def forget_solution(solution_id: str):
+    await async_redis.delete(_count_key(str(solution_id)))
+
+
+async def _write_relations(pending: Dict[str, str]) -> List[ObjectId]:
+    operations = []
+    solution_ids = set()
+    for field, value in pending.items():
+        user_id, solution_id = field.split(":", 1)
+        relation = {"user_id": ObjectId(user_id), "solution_id": ObjectId(solution_id)}
+        if value.startswith("+"):
+            operations.append(UpdateOne(relation, {"$setOnInsert": {"time": value[1:]}}, upsert=True))
+        else:
+            operations.append(DeleteOne(relation))
+        solution_ids.add(relation["solution_id"])
+    if operations:
+        await solutions_liked_collection.bulk_write(operations, ordered=False)
+    return list(solution_ids)
+
+
+async def _recount(solution_ids: List[ObjectId]) -> Dict[str, int]:
+    """Set Liked from the relations, so a repeated or partial flush cannot make counts drift"""
+    counts = {
+        row["_id"]: row["count"]
+        for row in await solutions_liked_collection.aggregate([
+            {"$match": {"solution_id": {"$in": solution_ids}}},
+            {"$group": {"_id": "$solution_id", "count": {"$sum": 1}}},
+        ]).to_list(None)
+    }
+    await solutions_collection.bulk_write(
+        [UpdateOne({"_id": sid}, {"$set": {"Liked": counts.get(sid, 0)}}) for sid in solution_ids],
+        ordered=False,
+    )
+    return {str(sid): counts.get(sid, 0) for sid in solution_ids}
+
+
+async def flush() -> int:
+    """Write pending likes to Mongo, re-score the gallery feed and queue Meilisearch updates; returns relations written"""
+    if not await async_redis.set(_FLUSH_LOCK, "1", nx=True, ex=LIKES["flush_lock_ttl"]):
+        return 0
+    try:
+        # A batch left by a failed flush is retried before new changes are taken
+        if not await async_redis.exists(_PENDING_FLUSHING, _DELTAS_FLUSHING):
+            async with async_redis.pipeline(transaction=True) as pipe:
+                pipe.rename(_PENDING, _PENDING_FLUSHING)
+                pipe.rename(_DELTAS, _DELTAS_FLUSHING)
+                # Both keys are missing when there is nothing to flush
+                await pipe.execute(raise_on_error=False)
+        pending = await async_redis.hgetall(_PENDING_FLUSHING)
+        if pending:
+            solution_ids = await _write_relations(pending)
+            await feed.set_likes(await _recount(solution_ids))
+            await OUTBOX.enqueue(OUTBOX.SOLUTION_INDEX, solution_ids)
+            await doc_cache.invalidate("solution", *[str(sid) for sid in solution_ids])
+            _stats["relations_flushed"] += len(pending)
+            _stats["solutions_recounted"] += len(solution_ids)
+        await async_redis.delete(_PENDING_FLUSHING, _DELTAS_FLUSHING)
+        _stats["flushes"] += 1
+        return len(pending)
+    finally:
+        await async_redis.delete(_FLUSH_LOCK)
+
+
+async def run_flusher():
+    """Background loop that flushes likes every flush_interval seconds"""
+    while True:
+        try:
+            await asyncio.sleep(LIKES["flush_interval"])
+            await flush()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _stats["flush_failures"] += 1
+            LOG.logger.error(f"Like flush failed: {e}")
+
+
+async def get_stats() -> Dict[str, Any]:
+    async with async_redis.pipeline(transaction=False) as pipe:
+        pipe.hlen(_PENDING)
+        pipe.hlen(_PENDING_FLUSHING)
+        pending, flushing = await pipe.execute()
+    return {**_stats, "pending": pending, "flushing": flushing}
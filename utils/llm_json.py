@@ -0,0 +1,194 @@
+import ast
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+_FENCE = re.compile(r"```(?:json)?\s*([\s\S]*?)\s*(?:```|$)")
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _json_body(text: str) -> Optional[str]:
+    """The JSON-looking part of an LLM reply: a fenced block, or from the first bracket on"""
+    match = _FENCE.search(text)
+    if match:
+        text = match.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    return text[min(starts):] if starts else None
+
+
+def _close_truncated(body: str) -> List[str]:
+    """
+    Candidates for a reply cut off mid-stream: the text with its open string
+    and brackets closed, then the text cut back to the last comma with the
+    brackets open at that point closed (drops a half-written last entry).
+    """
+    stack: List[str] = []
+    in_string = escape = False
+    last_comma = None
+    for i, ch in enumerate(body):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]" and stack:
+            stack.pop()
+            if not stack:
+                return [body[: i + 1]]
+        elif ch == ",":
+            last_comma = (i, list(stack))
+
+    closed = body + ('"' if in_string else "")
+    closed = closed.rstrip().rstrip(",")
+    if closed.endswith(":"):
+        closed += " null"
+    candidates = [closed + "".join(_CLOSERS[c] for c in reversed(stack))]
+    if last_comma:
+        i, open_at = last_comma
+        candidates.append(body[:i] + "".join(_CLOSERS[c] for c in reversed(open_at)))
+    return candidates
+
+
+def repair_json(text: str) -> Optional[Any]:
+    """
+    Tolerant parse of JSON produced by an LLM: markdown fences, trailing text,
+    trailing commas, Python literals (single quotes, True/None) and truncated
+    output. Returns None when nothing usable can be recovered.
+    """
+    body = _json_body(text)
+    if body is None:
+        return None
+    try:
+        return json.JSONDecoder().raw_decode(body)[0]
+    except json.JSONDecodeError:
+        pass
+    for candidate in _close_truncated(body):
+        for attempt in (candidate, _TRAILING_COMMA.sub(r"\1", candidate)):
+            try:
+                return json.loads(attempt)
+            except json.JSONDecodeError:
+                pass
+            try:
+                # Python dict/list literals only, never arbitrary expressions
+                return ast.literal_eval(attempt)
+            except (ValueError, SyntaxError, MemoryError, RecursionError):
+                pass
+    return None
+
+
+def process_llm_response(content: str) -> Dict[str, Any]:
+    """
+    Parses the LLM's string response into a dictionary.
+    Handles raw JSON, JSON within markdown code blocks and slightly broken JSON;
+    anything else comes back as {"text": content}.
+    """
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        pass
+    stripped = content.lstrip()
+    # Only repair replies that are meant to be JSON, so prose that happens to contain braces stays text
+    if stripped.startswith(("{", "[", "```")):
+        result = repair_json(content)
+        if isinstance(result, dict):
+            return result
+    return {"text": content}
+
+
+class SolutionStreamParser:
+    """
+    Incremental parser for streamed replies shaped like {"solutions": [{...}, ...]}.
+    feed() consumes text chunks and returns each element of the solutions
+    array as soon as its closing brace arrives.
+    """
+
+    def __init__(self, key: str = "solutions"):
+        self.key = key
+        self.solutions: List[Dict[str, Any]] = []
+        self._chunks: List[str] = []
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string: List[str] = []
+        self._last_key: Optional[str] = None
+        self._array_depth: Optional[int] = None
+        self._array_done = False
+        self._element: Optional[List[str]] = None
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        self._chunks.append(text)
+        completed = []
+        stack = self._stack
+        for ch in text:
+            if self._element is not None:
+                self._element.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(stack) == 1:
+                        self._last_key = "".join(self._string)
+                elif len(stack) == 1:
+                    self._string.append(ch)
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string = []
+            elif ch == "[":
+                stack.append(ch)
+                if (
+                    self._array_depth is None
+                    and not self._array_done
+                    and stack[0] == "{"
+                    and len(stack) == 2
+                    and self._last_key == self.key
+                ):
+                    self._array_depth = 2
+            elif ch == "{":
+                if self._array_depth is not None and len(stack) == self._array_depth and self._element is None:
+                    self._element = [ch]
+                stack.append(ch)
+            elif ch in "}]" and stack:
+                stack.pop()
+                if self._array_depth is None:
+                    continue
+                if self._element is not None and len(stack) == self._array_depth:
+                    solution = self._parse_element("".join(self._element))
+                    self._element = None
+                    if solution is not None:
+                        self.solutions.append(solution)
+                        completed.append(solution)
+                elif len(stack) < self._array_depth:
+                    self._array_depth = None
+                    self._array_done = True
+        return completed
+
+    @staticmethod
+    def _parse_element(text: str) -> Optional[Dict[str, Any]]:
+        try:
+            element = json.loads(text)
+        except json.JSONDecodeError:
+            element = repair_json(text)
+        return element if isinstance(element, dict) else None
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    def result(self) -> Dict[str, Any]:
+        """The full parsed reply; falls back to the solutions seen so far if it does not parse"""
+        parsed = process_llm_response(self.text)
+        if self.solutions and not (isinstance(parsed.get("solutions"), list) and parsed["solutions"]):
+            parsed = {k: v for k, v in parsed.items() if k != "text"}
+            parsed["solutions"] = list(self.solutions)
+        return parsed
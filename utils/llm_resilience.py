@@ -0,0 +1,280 @@
+import asyncio
+import random
+import time
+from collections import defaultdict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+import httpx
+from langchain_core.runnables import Runnable, RunnableConfig
+from utils.config import LLM_RESILIENCE
+import utils.log as LOG
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half_open after reset_timeout, one trial call"""
+
+    def __init__(self, name: str, failure_threshold: int = None, reset_timeout: float = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or LLM_RESILIENCE["breaker_failures"]
+        self.reset_timeout = reset_timeout or LLM_RESILIENCE["breaker_reset"]
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self.counters = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def available(self) -> bool:
+        """Whether a call could be allowed now, without claiming the half-open trial"""
+        if self.state == "open":
+            return time.monotonic() - self.opened_at >= self.reset_timeout
+        return self.state == "closed" or not self._trial_in_flight
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._trial_in_flight = False
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        self.counters["rejected"] += 1
+        return False
+
+    def release_trial(self):
+        """End a half-open trial that neither succeeded nor failed (cancelled, or a non-retryable error)"""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.counters["successes"] += 1
+        self.state = "closed"
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.counters["failures"] += 1
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.counters["opened"] += 1
+                LOG.logger.warning(f"Circuit breaker for {self.name} opened after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures, **self.counters}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_hedge_stats: Dict[str, int] = defaultdict(int)
+_ttft: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    breaker = _breakers.get(provider)
+    if breaker is None:
+        breaker = _breakers[provider] = CircuitBreaker(provider)
+    return breaker
+
+
+def _record_ttft(provider: str, seconds: float):
+    count, mean = _ttft[provider]
+    _ttft[provider] = [count + 1, mean + (seconds - mean) / (count + 1)]
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    # openai client errors without a status (connection errors, timeouts)
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+async def call_with_retry(
+    provider: str,
+    call: Callable[[], Awaitable[Any]],
+    retries: int = None,
+) -> Any:
+    """Run a non-streamed call with exponential backoff and jitter, guarded by the provider's breaker"""
+    retries = LLM_RESILIENCE["retries"] if retries is None else retries
+    breaker = get_breaker(provider)
+    for attempt in range(retries + 1):
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit breaker for {provider} is open")
+        trial = breaker.state == "half_open"
+        try:
+            result = await call()
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            breaker.record_failure()
+            trial = False
+            if attempt == retries:
+                raise
+            delay = min(LLM_RESILIENCE["retry_base_delay"] * 2 ** attempt, LLM_RESILIENCE["retry_max_delay"])
+            delay *= random.uniform(0.5, 1.0)
+            LOG.logger.warning(f"Retrying {provider} in {delay:.2f}s after error: {e}")
+            await asyncio.sleep(delay)
+        else:
+            breaker.record_success()
+            trial = False
+            return result
+        finally:
+            # Non-retryable errors and cancellation say nothing about the provider's health
+            if trial:
+                breaker.release_trial()
+
+
+async def _first_chunk(stream: AsyncIterator) -> Any:
+    return await stream.__anext__()
+
+
+class HedgedChatModel(Runnable):
+    """
+    Chat model wrapper that hedges on time to first token: if the primary has
+    not produced a chunk within hedge_after seconds, the same request is sent
+    to the secondary and whichever streams first is kept. Providers whose
+    breaker is open are skipped, and a provider that fails before its first
+    token fails over to the other one.
+    """
+
+    def __init__(self, primary, primary_name: str, secondary, secondary_name: str, hedge_after: float = None):
+        self.primary = primary
+        self.primary_name = primary_name
+        self.secondary = secondary
+        self.secondary_name = secondary_name
+        self.hedge_after = LLM_RESILIENCE["hedge_after"] if hedge_after is None else hedge_after
+
+    def invoke(self, input, config: Optional[RunnableConfig] = None, **kwargs):
+        return self.primary.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input, config: Optional[RunnableConfig] = None, **kwargs):
+        last_error = None
+        for name, model in self._candidates():
+            try:
+                return await call_with_retry(name, lambda model=model: model.ainvoke(input, config, **kwargs))
+            except Exception as e:
+                last_error = e
+                _hedge_stats["failovers"] += 1
+                LOG.logger.warning(f"Failing over from {name}: {e}")
+        raise last_error
+
+    def _candidates(self) -> List[Tuple[str, Any]]:
+        candidates = [
+            (name, model)
+            for name, model in ((self.primary_name, self.primary), (self.secondary_name, self.secondary))
+            if get_breaker(name).available()
+        ]
+        # With every breaker open, still try the primary rather than failing outright
+        return candidates or [(self.primary_name, self.primary)]
+
+    async def astream(self, input, config: Optional[RunnableConfig] = None, **kwargs) -> AsyncIterator:
+        waiting = self._candidates()
+        started = time.monotonic()
+        streams: Dict[asyncio.Task, Tuple[str, AsyncIterator]] = {}
+        launched: List[str] = []
+        # Providers whose half-open trial this call holds; released unless recorded
+        trials = set()
+
+        def release(name: str):
+            if name in trials:
+                trials.discard(name)
+                get_breaker(name).release_trial()
+
+        def launch_next() -> bool:
+            while waiting:
+                name, model = waiting.pop(0)
+                breaker = get_breaker(name)
+                # The first candidate always runs; later ones need their breaker's permission
+                allowed = breaker.allow()
+                if not allowed and launched:
+                    continue
+                if allowed and breaker.state == "half_open":
+                    trials.add(name)
+                launched.append(name)
+                stream = model.astream(input, config, **kwargs)
+                streams[asyncio.ensure_future(_first_chunk(stream))] = (name, stream)
+                return True
+            return False
+
+        launch_next()
+        winner = None
+        hedged = False
+        last_error: Optional[BaseException] = None
+        try:
+            while streams:
+                timeout = self.hedge_after if waiting else None
+                done, _ = await asyncio.wait(set(streams), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # No first token yet: hedge with the next provider
+                    if launch_next():
+                        hedged = True
+                        _hedge_stats["hedges"] += 1
+                    continue
+                for task in done:
+                    name, stream = streams.pop(task)
+                    if task.exception() is None:
+                        winner = (name, stream, task.result())
+                        break
+                    last_error = task.exception()
+                    trials.discard(name)
+                    get_breaker(name).record_failure()
+                    LOG.logger.warning(f"Stream from {name} failed before its first token: {last_error}")
+                    if not streams and launch_next():
+                        _hedge_stats["failovers"] += 1
+                if winner:
+                    break
+        finally:
+            for task, (name, _) in streams.items():
+                task.cancel()
+                release(name)
+            await asyncio.gather(*streams, return_exceptions=True)
+            if winner is None:
+                for name in list(trials):
+                    release(name)
+
+        if winner is None:
+            raise last_error or CircuitOpenError("No LLM provider is available")
+
+        name, stream, first = winner
+        _record_ttft(name, time.monotonic() - started)
+        _hedge_stats["wins:" + ("primary" if name == self.primary_name else "secondary")] += 1
+        if hedged and name != launched[0]:
+            _hedge_stats["hedge_wins"] += 1
+        try:
+            yield first
+            async for chunk in stream:
+                yield chunk
+        except Exception:
+            trials.discard(name)
+            get_breaker(name).record_failure()
+            raise
+        else:
+            trials.discard(name)
+            get_breaker(name).record_success()
+        finally:
+            # Reached without a record when the consumer stops early (CancelledError, GeneratorExit)
+            release(name)
+            await stream.aclose()
+
+
+def get_stats() -> Dict[str, Any]:
+    hedges = _hedge_stats["hedges"]
+    return {
+        "hedge_after": LLM_RESILIENCE["hedge_after"],
+        "hedges": hedges,
+        "primary_wins": _hedge_stats["wins:primary"],
+        "secondary_wins": _hedge_stats["wins:secondary"],
+        "failovers": _hedge_stats["failovers"],
+        "hedge_wins": _hedge_stats["hedge_wins"],
+        "hedge_win_rate": round(_hedge_stats["hedge_wins"] / hedges, 4) if hedges else 0,
+        "ttft_avg": {provider: round(mean, 3) for provider, (_, mean) in _ttft.items()},
+        "breakers": {name: breaker.snapshot() for name, breaker in _breakers.items()},
+    }
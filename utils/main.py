@@ -5,19 +5,24 @@ import utils.prompting as prompting
 import utils.db as RAG
 import utils.log as LOG
 import json
-import requests
-import re
 import asyncio
+from utils.config import HTTP_TRANSPORT
+from utils.http_transport import transport, endpoint
+from utils.llm_resilience import call_with_retry
+from utils.llm_json import process_llm_response
+from utils.streaming import ChatStreamEncoder
 
-async def _stream_openai_response(http_client, data, headers):
+async def _stream_openai_response(url, data, headers):
+    # The generator owns the response, so the connection goes back to the shared pool when it is closed
     try:
-        async with http_client.stream('POST', "/chat/completions", json=data, headers=headers) as response:
+        async with transport.client.stream('POST', url, json=data, headers=headers) as response:
             response.raise_for_status()
             async for chunk in response.aiter_lines():
                 if chunk.startswith('data: '):
                     chunk = chunk[6:]
                     if chunk.strip() == '[DONE]':
-                        break
+                        # Read to the end of the body so the connection can be reused
+                        continue
                     try:
                         content = json.loads(chunk)
                         delta = content.get('choices', [{}])[0].get('delta', {})
@@ -58,27 +63,31 @@ async def make_openai_request(messages, model, client, stream=False):
         headers["Accept"] = "text/event-stream"
         data["stream"] = True
 
-    async with httpx.AsyncClient(base_url=client.base_url, timeout=300.0) as http_client:
-        if stream:
-            # Call the extracted stream handler
-            return _stream_openai_response(http_client, data, headers)
-        else:
-            try:
-                response = await http_client.post("/chat/completions", json=data, headers=headers)
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                 error_body = "Unknown error body"
-                 try:
-                     error_body = await e.response.aread()
-                 except Exception as read_err:
-                     LOG.logger.error(f"Failed to read error response body: {read_err}")
-                 LOG.logger.error(f"HTTP error in non-stream request: {e.response.status_code} - {error_body}")
-                 # Re-raise the exception or return an error structure consistent with your error handling
-                 raise e # Or return an error dict/object
-            except Exception as e:
-                LOG.logger.error(f"Error during OpenAI non-stream request: {e}", exc_info=True)
-                raise e # Or return an error dict/object
+    url = endpoint(client.base_url, "/chat/completions")
+    if stream:
+        # Call the extracted stream handler
+        return _stream_openai_response(url, data, headers)
+    async def post():
+        response = await transport.client.post(url, json=data, headers=headers)
+        response.raise_for_status()
+        return response
+
+    try:
+        # Transient failures (connect errors, 429, 5xx) are retried with backoff
+        response = await call_with_retry(client.base_url, post)
+        return response.json()
+    except httpx.HTTPStatusError as e:
+         error_body = "Unknown error body"
+         try:
+             error_body = await e.response.aread()
+         except Exception as read_err:
+             LOG.logger.error(f"Failed to read error response body: {read_err}")
+         LOG.logger.error(f"HTTP error in non-stream request: {e.response.status_code} - {error_body}")
+         # Re-raise the exception or return an error structure consistent with your error handling
+         raise e # Or return an error dict/object
+    except Exception as e:
+        LOG.logger.error(f"Error during OpenAI non-stream request: {e}", exc_info=True)
+        raise e # Or return an error dict/object
 
 async def make_image_request(prompt, client):
     headers = {
@@ -99,11 +108,19 @@ async def make_image_request(prompt, client):
     
     LOG.logger.info(f"Making image request with model: {model_name}, base_url: {client.base_url}")
     
+    async def post():
+        response = await transport.client.post(
+            endpoint(client.base_url, "/images/generations"),
+            json=data,
+            headers=headers,
+            timeout=httpx.Timeout(HTTP_TRANSPORT["image_timeout"], connect=HTTP_TRANSPORT["connect_timeout"]),
+        )
+        response.raise_for_status()
+        return response
+
     try:
-        async with httpx.AsyncClient(base_url=client.base_url, timeout=60.0) as http_client:
-            response = await http_client.post("/images/generations", json=data, headers=headers)
-            response.raise_for_status()
-            return response.json()
+        response = await call_with_retry(client.base_url, post)
+        return response.json()
     except httpx.HTTPStatusError as e:
         error_body = "Unknown error body"
         try:
@@ -119,23 +136,6 @@ async def make_image_request(prompt, client):
     
 # -----------------------------------------------------------------------------
 
-# Add a helper function to process LLM response content
-def process_llm_response(content):
-    try:
-        return json.loads(content)
-    except json.JSONDecodeError:
-        # If content is not JSON format, try to extract JSON part from content
-        json_match = re.search(r'```json\s*([\s\S]*?)\s*```', content)
-        if json_match:
-            try:
-                return json.loads(json_match.group(1))
-            except json.JSONDecodeError:
-                # If extracted JSON part parsing fails, return original content as text
-                return {"text": content}
-        else:
-            # If no JSON part found, return original content as text
-            return {"text": content}
-
 async def knowledge_extraction(paper, client, user_type=None, stream=False):
     model_name = client.model_name or "deepseek-chat"
     LOG.logger.info(f"Using model {model_name} for knowledge extraction (Stream: {stream}, User Type: {user_type})")
@@ -217,7 +217,7 @@ async def html_generator(useage_scenario, solutions, client, stream=False):
 
 # -----------------------------------------------------------------------------
 
-async def inspiration_chat(inspiration, new_message, client, chat_history=None, user_type=None, stream=False):
+async def inspiration_chat(inspiration, new_message, client, chat_history=None, user_type=None, stream=False, protocol="full"):
     model_name = client.model_name or "deepseek-chat"
     LOG.logger.info(f"Using model {model_name} for inspiration chat (Stream: {stream}, User Type: {user_type})")
     
@@ -242,8 +242,9 @@ async def inspiration_chat(inspiration, new_message, client, chat_history=None,
 
     if stream:
         # Define the async generator for streaming response format
+        # Yields chunk payloads; with protocol="delta" snapshots are yielded as {"snapshot": {...}}
         async def stream_formatter():
-            full_content = ""
+            encoder = ChatStreamEncoder(protocol)
             async for chunk in result_gen:
                 if 'error' in chunk:
                     LOG.logger.error(f"Stream error received in inspiration_chat: {chunk['error']}")
@@ -252,12 +253,8 @@ async def inspiration_chat(inspiration, new_message, client, chat_history=None,
                 
                 content_piece = chunk.get('content', '')
                 if content_piece:
-                    full_content += content_piece
-                    yield {
-                        "delta": content_piece,
-                        "content": full_content,
-                        "message": {"role": "assistant", "content": full_content}
-                    }
+                    for event_type, payload in encoder.add(content_piece):
+                        yield payload if event_type == "chunk" else {event_type: payload}
         return stream_formatter()
     else:
         # Handle non-stream response
@@ -278,7 +275,7 @@ async def inspiration_chat(inspiration, new_message, client, chat_history=None,
             processed_result["response"] = content 
         return processed_result
 
-def simple_completion(prompt, client, model=None):
+async def simple_completion(prompt, client, model=None):
     """
     A simple function to test API connection by sending a basic completion request
     
@@ -313,11 +310,11 @@ def simple_completion(prompt, client, model=None):
         base_url = client.base_url or "https://api.deepseek.com/v1"
         LOG.logger.info(f"Making API request to {base_url} with model {model_to_use}")
         
-        response = requests.post(
-            f"{base_url}/chat/completions",
+        response = await transport.client.post(
+            endpoint(base_url, "/chat/completions"),
             headers=headers,
             json=payload,
-            timeout=10
+            timeout=HTTP_TRANSPORT["test_timeout"]
         )
         
         if response.status_code == 200:
@@ -336,7 +333,7 @@ def simple_completion(prompt, client, model=None):
             # Raise exception with detailed error information
             raise Exception(json.dumps(error_info))
     
-    except requests.exceptions.RequestException as re:
+    except httpx.HTTPError as re:
         error_msg = f"Network error in API request: {str(re)}"
         LOG.logger.error(error_msg)
         raise Exception(error_msg)
@@ -348,4 +345,3 @@ def simple_completion(prompt, client, model=None):
         error_msg = f"Error in simple_completion: {str(e)}"
         LOG.logger.error(error_msg)
         raise Exception(error_msg)
-
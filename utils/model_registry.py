@@ -0,0 +1,177 @@
+import hashlib
+import time
+from collections import OrderedDict
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, Dict, Optional, Tuple
+import httpx
+from langchain.chat_models import init_chat_model
+from utils.config import LLM_CLIENTS, LLM_RESILIENCE
+from utils.llm_resilience import HedgedChatModel
+import utils.log as LOG
+
+
+def _http2_enabled() -> bool:
+    if not LLM_CLIENTS["http2"]:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        LOG.logger.warning("LLM_CLIENTS_HTTP2 is set but the h2 package is missing, using HTTP/1.1")
+        return False
+
+
+class _Entry:
+    __slots__ = ("model", "http_client", "last_used", "leases", "retired")
+
+    def __init__(self, model, http_client: httpx.AsyncClient):
+        self.model = model
+        self.http_client = http_client
+        self.last_used = time.monotonic()
+        self.leases = 0
+        self.retired = False
+
+
+class ChatModelRegistry:
+    """
+    Process-wide cache of chat models, each with its own keep-alive connection
+    pool. Idle entries expire after ttl seconds and the least recently used
+    entry is evicted beyond max_size; an entry still leased is closed once
+    its last lease ends.
+    """
+
+    def __init__(self, max_size: int = None, ttl: int = None):
+        self.max_size = max_size or LLM_CLIENTS["max_size"]
+        self.ttl = ttl or LLM_CLIENTS["ttl"]
+        self._http2 = _http2_enabled()
+        self._entries: "OrderedDict[Tuple[str, str, str], _Entry]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "closed": 0}
+
+    @staticmethod
+    def _key(model_name: str, api_key: Optional[str], base_url: str) -> Tuple[str, str, str]:
+        return base_url, hashlib.sha256((api_key or "").encode("utf-8")).hexdigest(), model_name
+
+    def _create(self, model_name: str, api_key: Optional[str], base_url: str) -> _Entry:
+        http_client = httpx.AsyncClient(
+            http2=self._http2,
+            limits=httpx.Limits(
+                max_connections=LLM_CLIENTS["max_connections"],
+                max_keepalive_connections=LLM_CLIENTS["max_keepalive_connections"],
+                keepalive_expiry=LLM_CLIENTS["keepalive_expiry"],
+            ),
+            timeout=httpx.Timeout(LLM_CLIENTS["read_timeout"], connect=LLM_CLIENTS["connect_timeout"]),
+        )
+        model = init_chat_model(
+            model=model_name,
+            model_provider="openai",
+            api_key=api_key,
+            base_url=base_url,
+            streaming=True,
+            http_async_client=http_client,
+        )
+        return _Entry(model, http_client)
+
+    async def _close(self, entry: _Entry):
+        self._stats["closed"] += 1
+        try:
+            await entry.http_client.aclose()
+        except Exception as e:
+            LOG.logger.error(f"Failed to close chat model client: {e}")
+
+    async def _retire(self, entry: _Entry):
+        self._stats["evictions"] += 1
+        entry.retired = True
+        if not entry.leases:
+            await self._close(entry)
+
+    async def _evict(self):
+        now = time.monotonic()
+        for key in [key for key, entry in self._entries.items() if not entry.leases and now - entry.last_used > self.ttl]:
+            await self._retire(self._entries.pop(key))
+        while len(self._entries) > self.max_size:
+            _, entry = self._entries.popitem(last=False)
+            await self._retire(entry)
+
+    async def _get(self, model_name: str, api_key: Optional[str], base_url: str) -> _Entry:
+        key = self._key(model_name, api_key, base_url)
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats["misses"] += 1
+            entry = self._create(model_name, api_key, base_url)
+            self._entries[key] = entry
+        else:
+            self._stats["hits"] += 1
+            self._entries.move_to_end(key)
+        entry.leases += 1
+        await self._evict()
+        return entry
+
+    @asynccontextmanager
+    async def lease(self, model_name: str, api_key: Optional[str], base_url: str):
+        """Borrow the shared model for (base_url, api_key, model_name)"""
+        entry = await self._get(model_name, api_key, base_url)
+        try:
+            yield entry.model
+        finally:
+            entry.leases -= 1
+            entry.last_used = time.monotonic()
+            if entry.retired and not entry.leases:
+                await self._close(entry)
+
+    @asynccontextmanager
+    async def for_user(self, current_user: Dict[str, Any]):
+        """
+        Lease the model configured in a user's API settings. When a secondary
+        provider is configured, service-key requests get a hedged model that
+        can fail over to it.
+        """
+        model_name, api_key, base_url = resolve_user_model(current_user)
+        async with AsyncExitStack() as stack:
+            model = await stack.enter_async_context(self.lease(model_name, api_key, base_url))
+            secondary = _secondary_provider(api_key, base_url)
+            if secondary:
+                fallback = await stack.enter_async_context(self.lease(*secondary))
+                model = HedgedChatModel(model, base_url, fallback, secondary[2])
+            yield model
+
+    async def aclose(self):
+        entries = list(self._entries.values())
+        self._entries.clear()
+        for entry in entries:
+            await self._close(entry)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "size": len(self._entries),
+            "leased": sum(1 for entry in self._entries.values() if entry.leases),
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0,
+            "http2": self._http2,
+        }
+
+
+def resolve_user_model(current_user: Dict[str, Any]) -> Tuple[str, Optional[str], str]:
+    """(model_name, api_key, base_url) for a user, with the service defaults"""
+    return (
+        current_user.get("model_name") or LLM_CLIENTS["default_model"],
+        current_user.get("api_key") or None,
+        current_user.get("api_url") or LLM_CLIENTS["default_base_url"],
+    )
+
+
+def _secondary_provider(api_key: Optional[str], base_url: str) -> Optional[Tuple[str, Optional[str], str]]:
+    secondary_url = LLM_RESILIENCE["secondary_base_url"]
+    if not secondary_url or secondary_url == base_url:
+        return None
+    # Users bringing their own key are not fanned out to another provider unless allowed
+    if api_key and not LLM_RESILIENCE["hedge_user_keys"]:
+        return None
+    return (
+        LLM_RESILIENCE["secondary_model"] or LLM_CLIENTS["default_model"],
+        LLM_RESILIENCE["secondary_api_key"],
+        secondary_url,
+    )
+
+
+model_registry = ChatModelRegistry()
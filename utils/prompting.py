@@ -1,4 +1,13 @@
+import asyncio
+import hashlib
 import os
+import stat
+import tempfile
+import threading
+from types import MappingProxyType
+from typing import Dict, Iterable, Mapping, NamedTuple, Optional
+from utils.config import PROMPT_DIR, PROMPTS
+import utils.log as LOG
 
 _PROMPT_FILE_PATHS = {
     'KNOWLEDGE_EXTRACTION_SYSTEM_PROMPT': 'knowledge_extraction_system_prompt',
@@ -11,14 +20,34 @@ _PROMPT_FILE_PATHS = {
     'DRAWING_EXPERT_SYSTEM_PROMPT': 'drawing_expert_system_prompt',
     'HTML_GENERATION_SYSTEM_PROMPT': 'html_generation_system_prompt',
     'INSPIRATION_CHAT_SYSTEM_PROMPT': 'inspiration_chat_system_prompt',
+    'CONVERSATION_SUMMARY_SYSTEM_PROMPT': 'conversation_summary_system_prompt',
 }
 
+
+class Prompt(NamedTuple):
+    name: str
+    content: str
+    version: str
+    mtime: float
+
+
+# Immutable snapshot, replaced as a whole on reload so readers never see a partial update
+_registry: Mapping[str, Prompt] = MappingProxyType({})
+_lock = threading.Lock()
+
+
 def _get_prompt_file_path(prompt_name: str) -> str | None:
     """Get corresponding filename based on prompt name (without extension)."""
     return _PROMPT_FILE_PATHS.get(prompt_name)
 
+def _file_path(file_name: str) -> str:
+    return os.path.join(PROMPT_DIR, f'{file_name}.txt')
+
+def _version(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:12]
+
 def readfile(name: str):
-    file_path = f'prompting/{name}.txt'
+    file_path = _file_path(name)
     if not os.path.exists(file_path):
         print(f"Warning: Prompt file not found: {file_path}")
         return ""
@@ -30,13 +59,104 @@ def readfile(name: str):
         print(f"Error reading prompt file {file_path}: {e}")
         return ""
 
+def _mtime(prompt_name: str) -> float:
+    try:
+        return os.stat(_file_path(_PROMPT_FILE_PATHS[prompt_name])).st_mtime
+    except OSError:
+        return 0.0
+
+def _load(prompt_name: str) -> Prompt:
+    mtime = _mtime(prompt_name)
+    content = readfile(_PROMPT_FILE_PATHS[prompt_name])
+    return Prompt(prompt_name, content, _version(content), mtime)
+
+def reload(force: bool = False) -> Dict[str, str]:
+    """Reload prompts whose file changed (or all with force); returns {name: version} of the reloaded ones"""
+    global _registry
+    with _lock:
+        current = dict(_registry)
+        changed = {}
+        for prompt_name in _PROMPT_FILE_PATHS:
+            entry = current.get(prompt_name)
+            if force or entry is None or _mtime(prompt_name) != entry.mtime:
+                prompt = _load(prompt_name)
+                if entry is None or prompt.version != entry.version:
+                    changed[prompt_name] = prompt.version
+                current[prompt_name] = prompt
+        _registry = MappingProxyType(current)
+    return changed
+
+def _ensure_loaded():
+    # Only the first read touches the disk; later changes are picked up by run_reloader
+    if not _registry:
+        reload()
+
+async def run_reloader():
+    """Background loop that picks up edits made on disk or by another process"""
+    while True:
+        try:
+            await asyncio.sleep(PROMPTS["reload_interval"])
+            changed = await asyncio.to_thread(reload)
+            if changed:
+                LOG.logger.info(f"Prompts reloaded: {changed}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            LOG.logger.error(f"Prompt reload failed: {e}")
+
+def get(prompt_name: str) -> Optional[Prompt]:
+    _ensure_loaded()
+    return _registry.get(prompt_name)
+
 def get_prompt(prompt_name: str) -> str:
     """
-    Dynamically read and return content based on prompt logical name.
+    Return the content of a prompt by logical name from the in-memory registry.
     """
-    file_name = _get_prompt_file_path(prompt_name)
-    if file_name:
-        return readfile(file_name)
-    else:
+    prompt = get(prompt_name)
+    if prompt is None:
         print(f"Warning: Unknown prompt name: {prompt_name}")
-        return ""
\ No newline at end of file
+        return ""
+    return prompt.content
+
+def get_prompt_version(prompt_name: str) -> str:
+    prompt = get(prompt_name)
+    return prompt.version if prompt else ""
+
+def get_versions(prompt_names: Iterable[str] = None) -> Dict[str, str]:
+    _ensure_loaded()
+    names = _PROMPT_FILE_PATHS if prompt_names is None else prompt_names
+    return {name: _registry[name].version for name in names if name in _registry}
+
+def combined_version(prompt_names: Iterable[str]) -> str:
+    """One version string for a set of prompts, for cache keys and run logs"""
+    digest = hashlib.sha256()
+    for name, version in sorted(get_versions(prompt_names).items()):
+        digest.update(f"{name}={version};".encode())
+    return digest.hexdigest()[:12]
+
+def update_prompt(prompt_name: str, content: str) -> str:
+    """Atomically replace a prompt file and swap it into the registry; returns the new version"""
+    global _registry
+    file_path = _file_path(_PROMPT_FILE_PATHS[prompt_name])
+    # Held across write and swap, so concurrent updates and reloads cannot pair one content with another's mtime
+    with _lock:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), prefix='.tmp-', suffix='.txt')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                file.write(content)
+                file.flush()
+                os.fsync(file.fileno())
+                # The rename keeps this mtime
+                mtime = os.fstat(file.fileno()).st_mtime
+            # mkstemp creates the file readable by its owner only
+            if os.path.exists(file_path):
+                os.chmod(tmp_path, stat.S_IMODE(os.stat(file_path).st_mode))
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        current = dict(_registry)
+        current[prompt_name] = Prompt(prompt_name, content, _version(content), mtime)
+        _registry = MappingProxyType(current)
+    return current[prompt_name].version
\ No newline at end of file
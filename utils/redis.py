@@ -23,6 +23,15 @@ async_redis = AsyncRedis(
     decode_responses=True,
 )
 
+# Asynchronous Redis client for binary payloads (checkpoints)
+async_redis_bytes = AsyncRedis(
+    host=REDIS["host"],
+    port=REDIS["port"],
+    db=REDIS["db"],
+    password=REDIS["password"],
+    decode_responses=False,
+)
+
 
 def start_task(current_user):
     task_id = str(int(time.time() * 1000))
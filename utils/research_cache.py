@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from utils.config import RESEARCH_CACHE
+from utils.redis import async_redis
+import utils.prompting as prompting
+import utils.log as LOG
+
+# Prompts whose content shapes a cached research result
+RESEARCH_PROMPTS = (
+    "DOMAIN_EXPERT_SYSTEM_PROMPT",
+    "INTERDISCIPLINARY_EXPERT_SYSTEM_PROMPT",
+    "PRACTICAL_EXPERT_EVALUATE_SYSTEM_PROMPT",
+)
+# Content events research.py sends during a run; "run" and "cache" describe the run itself and are not replayed
+RECORDED_EVENTS = ("chunk", "solution_partial", "node_complete", "progress", "status")
+
+_PREFIX = RESEARCH_CACHE["prefix"]
+_INDEX_KEY = f"{_PREFIX}index"
+_STATS_KEY = f"{_PREFIX}stats"
+
+
+def _normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", (query or "").strip().lower())
+
+
+def _prompt_hash() -> str:
+    return prompting.combined_version(RESEARCH_PROMPTS)
+
+
+def make_key(
+    query: str,
+    query_analysis_result: Any,
+    with_paper: bool,
+    with_example: bool,
+    is_drawing: bool,
+    model_name: str,
+    base_url: str,
+) -> str:
+    payload = {
+        "query": _normalize_query(query),
+        "query_analysis_result": query_analysis_result,
+        "with_paper": bool(with_paper),
+        "with_example": bool(with_example),
+        "is_drawing": bool(is_drawing),
+        "model": model_name,
+        "base_url": base_url,
+        "prompts": _prompt_hash(),
+    }
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return f"{_PREFIX}entry:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+
+class EventRecorder:
+    """Wraps send_event and records the replayable part of a research run"""
+
+    def __init__(self, send_event: Callable[[str, Any], Awaitable[None]]):
+        self._send_event = send_event
+        self._started = time.monotonic()
+        self.events: List[list] = []
+        self.final_solution = None
+
+    async def send_event(self, event_type: str, payload: Any):
+        await self._send_event(event_type, payload)
+        if event_type not in RECORDED_EVENTS:
+            return
+        if event_type == "node_complete":
+            if payload.get("node") == "persistence":
+                return
+            if payload.get("node") in ("evaluation", "drawing"):
+                self.final_solution = json.loads(json.dumps(payload.get("result"), default=str))
+        offset = round(time.monotonic() - self._started, 3)
+        self.events.append([offset, event_type, json.loads(json.dumps(payload, default=str))])
+
+
+async def get(key: str) -> Optional[Dict[str, Any]]:
+    raw = await async_redis.get(key)
+    await async_redis.hincrby(_STATS_KEY, "hits" if raw else "misses", 1)
+    return json.loads(raw) if raw else None
+
+
+async def put(key: str, recorder: EventRecorder, domain_knowledge: Any) -> bool:
+    if not recorder.final_solution or "solutions" not in recorder.final_solution:
+        return False
+
+    entry = json.dumps(
+        {
+            "events": recorder.events,
+            "final_solution": recorder.final_solution,
+            "domain_knowledge": domain_knowledge,
+            "created": int(time.time()),
+        },
+        ensure_ascii=False,
+        default=str,
+    )
+    if len(entry) > RESEARCH_CACHE["max_bytes"]:
+        await async_redis.hincrby(_STATS_KEY, "oversized", 1)
+        return False
+
+    async with async_redis.pipeline(transaction=False) as pipe:
+        pipe.setex(key, RESEARCH_CACHE["ttl"], entry)
+        pipe.zadd(_INDEX_KEY, {key: time.time()})
+        pipe.hincrby(_STATS_KEY, "stores", 1)
+        await pipe.execute()
+    await _evict()
+    return True
+
+
+async def _evict():
+    # Drop expired members, then the oldest entries beyond the size bound
+    await async_redis.zremrangebyscore(_INDEX_KEY, 0, time.time() - RESEARCH_CACHE["ttl"])
+    overflow = await async_redis.zcard(_INDEX_KEY) - RESEARCH_CACHE["max_entries"]
+    if overflow > 0:
+        evicted = [key for key, _ in await async_redis.zpopmin(_INDEX_KEY, overflow)]
+        if evicted:
+            await async_redis.delete(*evicted)
+            await async_redis.hincrby(_STATS_KEY, "evictions", len(evicted))
+
+
+async def replay(
+    entry: Dict[str, Any],
+    send_event: Callable[[str, Any], Awaitable[None]],
+    speed: float = 0,
+):
+    """Re-emit a cached run; speed > 0 keeps the original pacing fast-forwarded by that factor"""
+    previous = 0.0
+    for offset, event_type, payload in entry["events"]:
+        if speed > 0:
+            delay = min((offset - previous) / speed, RESEARCH_CACHE["max_replay_delay"])
+            if delay > 0:
+                await asyncio.sleep(delay)
+        previous = offset
+        await send_event(event_type, payload)
+
+
+async def get_stats() -> Dict[str, int]:
+    stats = {key: int(value) for key, value in (await async_redis.hgetall(_STATS_KEY)).items()}
+    stats["entries"] = await async_redis.zcard(_INDEX_KEY)
+    lookups = stats.get("hits", 0) + stats.get("misses", 0)
+    stats["hit_rate"] = round(stats.get("hits", 0) / lookups, 4) if lookups else 0
+    return stats
+
+
+async def safe_put(key: str, recorder: EventRecorder, domain_knowledge: Any):
+    try:
+        if await put(key, recorder, domain_knowledge):
+            LOG.logger.info(f"Cached research result {key}")
+    except Exception as e:
+        LOG.logger.error(f"Research cache write failed: {e}")
@@ -0,0 +1,439 @@
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+from bson.objectid import ObjectId
+from utils.config import RESEARCH_QUEUE, CHECKPOINT
+from utils.db import users_collection
+from utils.redis import async_redis
+from utils.streaming import CoalescingSender
+from utils.model_registry import model_registry
+from utils.http_transport import transport
+import utils.doc_cache as doc_cache
+import utils.prompting as prompting
+from utils.tasks.research import start_research, resume_research
+import utils.log as LOG
+
+_PREFIX = RESEARCH_QUEUE["prefix"]
+_STREAM = f"{_PREFIX}queue"
+_GROUP = RESEARCH_QUEUE["group"]
+_STATS_KEY = f"{_PREFIX}stats"
+_WORKERS_KEY = f"{_PREFIX}workers"
+_CONSUMER = f"{socket.gethostname()}-{os.getpid()}"
+# A job is only reclaimed once its worker would already have timed it out, and once
+# the run lock a worker that died mid-run never deleted has expired, so resuming can take it
+_CLAIM_IDLE_MS = (max(RESEARCH_QUEUE["job_timeout"], CHECKPOINT["lock_ttl"]) + 60) * 1000
+_TERMINAL_STATUSES = ("completed", "failed", "timeout", "cancelled")
+
+# KEYS: subscriber count, cancel request
+# ARGV: "1" to request cancellation when the last subscriber leaves, request time, ttl
+_DETACH = async_redis.register_script("""
+local remaining = redis.call('DECR', KEYS[1])
+if remaining <= 0 then
+    redis.call('DEL', KEYS[1])
+    if ARGV[1] == '1' then
+        redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+    end
+end
+return remaining
+""")
+
+
+class _Abandoned(Exception):
+    """The job's clients disconnected and none re-attached within cancel_grace"""
+
+
+def _job_key(job_id: str) -> str:
+    return f"{_PREFIX}job:{job_id}"
+
+
+def _events_key(job_id: str) -> str:
+    return f"{_PREFIX}events:{job_id}"
+
+
+def _running_key(user_id: str) -> str:
+    return f"{_PREFIX}running:{user_id}"
+
+
+def _subscribers_key(job_id: str) -> str:
+    return f"{_PREFIX}subscribers:{job_id}"
+
+
+def _cancel_key(job_id: str) -> str:
+    return f"{_PREFIX}cancel:{job_id}"
+
+
+async def _queue_position(entry_id: str) -> int:
+    """1-based rank of a stream entry among those no worker has read yet; 0 once it is read"""
+    try:
+        groups = await async_redis.xinfo_groups(_STREAM)
+        last_delivered = next(
+            (group["last-delivered-id"] for group in groups if group["name"] == _GROUP), "0-0"
+        )
+    except Exception:
+        last_delivered = "0-0"
+    # Workers read in id order, so the entries ahead are those between the group's cursor and this one
+    ahead = await async_redis.xrange(_STREAM, min=f"({last_delivered}", max=entry_id)
+    return len(ahead)
+
+
+async def _queued_count() -> int:
+    depth = await async_redis.xlen(_STREAM)
+    try:
+        running = (await async_redis.xpending(_STREAM, _GROUP))["pending"]
+    except Exception:
+        running = 0
+    return max(depth - running, 0)
+
+
+async def submit(current_user, params: Dict[str, Any]) -> str:
+    """Queue a research run; its id doubles as the research run id"""
+    job_id = uuid.uuid4().hex
+    async with async_redis.pipeline(transaction=True) as pipe:
+        pipe.hset(
+            _job_key(job_id),
+            mapping={
+                "user_id": str(current_user["_id"]),
+                "status": "queued",
+                "created": int(time.time()),
+                "attempts": 0,
+            },
+        )
+        pipe.xadd(_STREAM, {"job_id": job_id, "params": json.dumps(params, default=str)})
+        pipe.hincrby(_STATS_KEY, "submitted", 1)
+        _, entry_id, _ = await pipe.execute()
+    await _publish(job_id, "queued", {"position": await _queue_position(entry_id)})
+    return job_id
+
+
+async def get_job(job_id: str) -> Optional[Dict[str, str]]:
+    job = await async_redis.hgetall(_job_key(job_id))
+    return job or None
+
+
+async def _publish(job_id: str, event_type: str, payload: Any):
+    key = _events_key(job_id)
+    async with async_redis.pipeline(transaction=False) as pipe:
+        pipe.xadd(key, {"event": event_type, "data": json.dumps(payload, default=str)})
+        pipe.expire(key, RESEARCH_QUEUE["event_ttl"])
+        await pipe.execute()
+
+
+async def subscribe(
+    job_id: str,
+    last_id: str = "0-0",
+    should_stop: Optional[Callable[[], Awaitable[bool]]] = None,
+) -> AsyncIterator[Tuple[str, str, Any]]:
+    """
+    Yield (event id, event type, payload) for a job until its end event. Also stops
+    when the job is gone or finished, after stream_idle_timeout seconds without
+    events, or once should_stop() is true; it is checked every block_ms at most.
+    """
+    key = _events_key(job_id)
+    last_event = time.monotonic()
+    while True:
+        if should_stop and await should_stop():
+            return
+        response = await async_redis.xread(
+            {key: last_id}, count=100, block=RESEARCH_QUEUE["block_ms"]
+        )
+        if not response:
+            # The end event is published before the final status is set, so none is left to read
+            status = await async_redis.hget(_job_key(job_id), "status")
+            if status is None or status in _TERMINAL_STATUSES:
+                return
+            if time.monotonic() - last_event > RESEARCH_QUEUE["stream_idle_timeout"]:
+                return
+            continue
+        last_event = time.monotonic()
+        for _, entries in response:
+            for entry_id, fields in entries:
+                last_id = entry_id
+                yield entry_id, fields["event"], json.loads(fields["data"])
+                if fields["event"] == "end":
+                    return
+
+
+async def attach(job_id: str):
+    """Count a client streaming the job; re-attaching withdraws a pending cancel request"""
+    async with async_redis.pipeline(transaction=True) as pipe:
+        pipe.incr(_subscribers_key(job_id))
+        pipe.expire(_subscribers_key(job_id), RESEARCH_QUEUE["event_ttl"])
+        pipe.delete(_cancel_key(job_id))
+        await pipe.execute()
+
+
+async def detach(job_id: str, abandoned: bool):
+    """Uncount a client; if it left mid-run and was the last one, ask the worker to cancel the job"""
+    await _DETACH(
+        keys=[_subscribers_key(job_id), _cancel_key(job_id)],
+        args=["1" if abandoned else "0", time.time(), RESEARCH_QUEUE["event_ttl"]],
+    )
+
+
+# ------------------------------------------------------------
+# Worker
+
+
+async def _execute(job_id: str, params: Dict[str, Any], current_user, attempts: int, send_event):
+    if attempts > 1:
+        # A previous worker died mid-run; continue from its last checkpoint
+        try:
+            await resume_research(current_user, job_id, send_event)
+            return
+        except ValueError:
+            pass
+    await start_research(current_user=current_user, send_event=send_event, run_id=job_id, **params)
+
+
+async def _watch_cancel(job_id: str, run: asyncio.Task) -> bool:
+    """Cancel run once a cancel request is cancel_grace seconds old; True if it did"""
+    key = _cancel_key(job_id)
+    while not run.done():
+        try:
+            requested = await async_redis.get(key)
+        except Exception as e:
+            LOG.logger.error(f"Research job {job_id} cancel check failed: {e}")
+            requested = None
+        if requested and time.time() - float(requested) >= RESEARCH_QUEUE["cancel_grace"]:
+            run.cancel()
+            return True
+        await asyncio.sleep(RESEARCH_QUEUE["cancel_poll_interval"])
+    return False
+
+
+async def _run_until_abandoned(job_id: str, coro):
+    """
+    Await coro in its own task and cancel it when the job's clients are gone, so
+    LLM streams and image generations stop as in the in-process path
+    """
+    run = asyncio.ensure_future(coro)
+    watcher = asyncio.create_task(_watch_cancel(job_id, run))
+    try:
+        return await run
+    except asyncio.CancelledError:
+        if watcher.done() and not watcher.cancelled() and watcher.result():
+            raise _Abandoned()
+        raise
+    finally:
+        watcher.cancel()
+
+
+async def _finish(entry_id: str, job_id: str, status: str):
+    job_key = _job_key(job_id)
+    await _publish(job_id, "end", "complete")
+    async with async_redis.pipeline(transaction=False) as pipe:
+        pipe.hset(job_key, mapping={"status": status, "finished": int(time.time())})
+        pipe.delete(_cancel_key(job_id))
+        pipe.expire(job_key, RESEARCH_QUEUE["event_ttl"])
+        pipe.xack(_STREAM, _GROUP, entry_id)
+        pipe.xdel(_STREAM, entry_id)
+        pipe.hincrby(_STATS_KEY, status, 1)
+        await pipe.execute()
+
+
+async def _defer(entry_id: str, fields: Dict[str, str]):
+    """Move a job to the back of the queue while its user is at the running cap"""
+    await asyncio.sleep(RESEARCH_QUEUE["defer_delay"])
+    async with async_redis.pipeline(transaction=True) as pipe:
+        pipe.xadd(_STREAM, fields)
+        pipe.xack(_STREAM, _GROUP, entry_id)
+        pipe.xdel(_STREAM, entry_id)
+        pipe.hincrby(_STATS_KEY, "deferred", 1)
+        new_entry_id, *_ = await pipe.execute()
+    await _publish(fields["job_id"], "queued", {"position": await _queue_position(new_entry_id)})
+
+
+async def _acquire_user_slot(user_id: str) -> bool:
+    """
+    Count a user's running jobs across all workers. This cap is separate from the
+    in-process AdmissionScheduler, which only sees chat and query streams once
+    research runs on workers.
+    """
+    key = _running_key(user_id)
+    async with async_redis.pipeline(transaction=True) as pipe:
+        pipe.incr(key)
+        pipe.expire(key, RESEARCH_QUEUE["job_timeout"] + 60)
+        running, _ = await pipe.execute()
+    if running > RESEARCH_QUEUE["per_user_limit"]:
+        await async_redis.decr(key)
+        return False
+    return True
+
+
+async def _run_job(entry_id: str, fields: Dict[str, str]):
+    job_id = fields["job_id"]
+    job_key = _job_key(job_id)
+    job = await async_redis.hgetall(job_key)
+    user_id = job.get("user_id")
+    if user_id and not await _acquire_user_slot(user_id):
+        await _defer(entry_id, fields)
+        return
+    try:
+        await _process_job(entry_id, job_id, fields, job)
+    finally:
+        if user_id:
+            await async_redis.decr(_running_key(user_id))
+
+
+async def _process_job(entry_id: str, job_id: str, fields: Dict[str, str], job: Dict[str, str]):
+    job_key = _job_key(job_id)
+    attempts = await async_redis.hincrby(job_key, "attempts", 1)
+    started = int(time.time())
+    async with async_redis.pipeline(transaction=False) as pipe:
+        pipe.hset(job_key, mapping={"status": "running", "started": started, "worker": _CONSUMER})
+        if attempts == 1 and job.get("created"):
+            pipe.hincrby(_STATS_KEY, "wait_s_total", started - int(job["created"]))
+            pipe.hincrby(_STATS_KEY, "wait_count", 1)
+        await pipe.execute()
+
+    async def publish(event_type: str, payload: Any):
+        await _publish(job_id, event_type, payload)
+
+    sender = CoalescingSender(publish, "research")
+    try:
+        if attempts > RESEARCH_QUEUE["max_attempts"]:
+            raise Exception("Research job exceeded its retry limit")
+        current_user = await users_collection.find_one({"_id": ObjectId(job.get("user_id"))})
+        if not current_user:
+            raise Exception("User not found")
+        await asyncio.wait_for(
+            _run_until_abandoned(
+                job_id,
+                _execute(job_id, json.loads(fields["params"]), current_user, attempts, sender.send_event),
+            ),
+            RESEARCH_QUEUE["job_timeout"],
+        )
+        await sender.flush()
+        status = "completed"
+    except asyncio.TimeoutError:
+        await sender.flush()
+        await publish("error", "Research job timed out")
+        status = "timeout"
+    except _Abandoned:
+        await sender.flush()
+        status = "cancelled"
+    except asyncio.CancelledError:
+        # Worker shutdown: the entry stays pending and is reclaimed by another worker
+        sender.close()
+        await async_redis.hset(job_key, "status", "queued")
+        raise
+    except Exception as e:
+        LOG.logger.error(f"Research job {job_id} failed: {e}")
+        await sender.flush()
+        await publish("error", str(e))
+        status = "failed"
+    finally:
+        sender.close()
+    await _finish(entry_id, job_id, status)
+
+
+async def _ensure_group():
+    try:
+        await async_redis.xgroup_create(_STREAM, _GROUP, id="0", mkstream=True)
+    except Exception as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def _read_entry() -> Optional[Tuple[str, Dict[str, str]]]:
+    claimed = await async_redis.xautoclaim(
+        _STREAM, _GROUP, _CONSUMER, min_idle_time=_CLAIM_IDLE_MS, count=1
+    )
+    entries = [entry for entry in claimed[1] if entry[1]]
+    if entries:
+        return entries[0]
+
+    response = await async_redis.xreadgroup(
+        _GROUP, _CONSUMER, {_STREAM: ">"}, count=1, block=RESEARCH_QUEUE["block_ms"]
+    )
+    for _, stream_entries in response:
+        if stream_entries:
+            return stream_entries[0]
+    return None
+
+
+async def _heartbeat(running: set, concurrency: int):
+    while True:
+        try:
+            await async_redis.hset(
+                _WORKERS_KEY,
+                _CONSUMER,
+                json.dumps({"seen": int(time.time()), "running": len(running), "concurrency": concurrency}),
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            LOG.logger.error(f"Research worker heartbeat failed: {e}")
+        await asyncio.sleep(RESEARCH_QUEUE["heartbeat_interval"])
+
+
+async def run_worker(concurrency: Optional[int] = None):
+    """Consume research jobs, running at most `concurrency` of them at a time"""
+    concurrency = concurrency or RESEARCH_QUEUE["concurrency"]
+    await _ensure_group()
+    LOG.logger.info(f"Research worker {_CONSUMER} started with concurrency {concurrency}")
+
+    slots = asyncio.Semaphore(concurrency)
+    running: set = set()
+    heartbeat = asyncio.create_task(_heartbeat(running, concurrency))
+    cache_listener = asyncio.create_task(doc_cache.run_invalidation_listener())
+    prompt_reloader = asyncio.create_task(prompting.run_reloader())
+
+    def on_done(task: asyncio.Task):
+        running.discard(task)
+        slots.release()
+
+    try:
+        while True:
+            await slots.acquire()
+            try:
+                entry = await _read_entry()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                LOG.logger.error(f"Research worker error: {e}")
+                entry = None
+                await asyncio.sleep(1)
+            if entry is None:
+                slots.release()
+                continue
+            task = asyncio.create_task(_run_job(*entry))
+            running.add(task)
+            task.add_done_callback(on_done)
+    finally:
+        heartbeat.cancel()
+        cache_listener.cancel()
+        prompt_reloader.cancel()
+        for task in list(running):
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        await async_redis.hdel(_WORKERS_KEY, _CONSUMER)
+        await model_registry.aclose()
+        await transport.aclose()
+
+
+async def get_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = {
+        key: int(value) for key, value in (await async_redis.hgetall(_STATS_KEY)).items()
+    }
+    try:
+        stats["running"] = (await async_redis.xpending(_STREAM, _GROUP))["pending"]
+    except Exception:
+        stats["running"] = 0
+    stats["queued"] = await _queued_count()
+    if stats.get("wait_count"):
+        stats["wait_s_avg"] = round(stats["wait_s_total"] / stats["wait_count"], 2)
+
+    workers = {}
+    stale_after = RESEARCH_QUEUE["heartbeat_interval"] * 3
+    for consumer, raw in (await async_redis.hgetall(_WORKERS_KEY)).items():
+        worker = json.loads(raw)
+        if time.time() - worker["seen"] <= stale_after:
+            workers[consumer] = worker
+    stats["workers"] = workers
+    stats["capacity"] = sum(worker["concurrency"] for worker in workers.values())
+    return stats
@@ -0,0 +1,159 @@
+import asyncio
+import itertools
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from utils.config import SCHEDULER
+
+
+class SchedulerFull(Exception):
+    pass
+
+
+class _Waiter:
+    __slots__ = ("key", "user_id", "kind", "future", "moved")
+
+    def __init__(self, key, user_id: str, kind: str):
+        self.key = key
+        self.user_id = user_id
+        self.kind = kind
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.moved = asyncio.Event()
+
+
+class AdmissionScheduler:
+    """
+    Per-process admission control with a global cap, a per-user cap and
+    priority classes. Waiters are served by (priority, arrival); a waiter whose
+    user is at the cap is skipped so other users are not held behind it.
+    """
+
+    def __init__(
+        self,
+        global_limit: int = None,
+        per_user_limit: int = None,
+        max_waiting: int = None,
+        priorities: Dict[str, int] = None,
+    ):
+        self.global_limit = global_limit or SCHEDULER["global_limit"]
+        self.per_user_limit = per_user_limit or SCHEDULER["per_user_limit"]
+        self.max_waiting = max_waiting or SCHEDULER["max_waiting"]
+        self.priorities = priorities or SCHEDULER["priorities"]
+        self._lowest = max(self.priorities.values(), default=0)
+        self._active = 0
+        self._active_by_user: Dict[str, int] = defaultdict(int)
+        self._waiting: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._stats: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"admitted": 0, "queued": 0, "rejected": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+        )
+
+    def _can_run(self, user_id: str) -> bool:
+        return self._active < self.global_limit and self._active_by_user.get(user_id, 0) < self.per_user_limit
+
+    def _grant(self, user_id: str):
+        self._active += 1
+        self._active_by_user[user_id] += 1
+
+    def _dispatch(self):
+        granted = False
+        for waiter in list(self._waiting):
+            if self._active >= self.global_limit:
+                break
+            if self._can_run(waiter.user_id):
+                self._waiting.remove(waiter)
+                self._grant(waiter.user_id)
+                waiter.future.set_result(True)
+                granted = True
+        if granted:
+            for waiter in self._waiting:
+                waiter.moved.set()
+
+    def _release(self, user_id: str):
+        self._active -= 1
+        self._active_by_user[user_id] -= 1
+        if not self._active_by_user[user_id]:
+            del self._active_by_user[user_id]
+        self._dispatch()
+
+    def _position(self, waiter: _Waiter) -> int:
+        return self._waiting.index(waiter) + 1
+
+    async def _wait(self, waiter: _Waiter, on_queued: Optional[Callable[[int], Awaitable[None]]]):
+        position = None
+        while not waiter.future.done():
+            if on_queued and self._position(waiter) != position:
+                position = self._position(waiter)
+                await on_queued(position)
+            if waiter.future.done():
+                break
+            waiter.moved.clear()
+            moved = asyncio.ensure_future(waiter.moved.wait())
+            try:
+                await asyncio.wait({waiter.future, moved}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                moved.cancel()
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        user_id: str,
+        kind: str,
+        on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+    ):
+        """Hold a slot for the body; on_queued(position) is awaited while waiting"""
+        stats = self._stats[kind]
+        started = time.monotonic()
+        if self._can_run(user_id) and not self._waiting:
+            self._grant(user_id)
+        else:
+            if len(self._waiting) >= self.max_waiting:
+                stats["rejected"] += 1
+                raise SchedulerFull("Server is busy, please try again later")
+            waiter = _Waiter((self.priorities.get(kind, self._lowest), next(self._seq)), user_id, kind)
+            self._waiting.append(waiter)
+            self._waiting.sort(key=lambda w: w.key)
+            self._dispatch()
+            if not waiter.future.done():
+                stats["queued"] += 1
+            try:
+                await self._wait(waiter, on_queued)
+            except BaseException:
+                if waiter.future.done():
+                    self._release(user_id)
+                else:
+                    self._waiting.remove(waiter)
+                    for other in self._waiting:
+                        other.moved.set()
+                raise
+
+        wait_ms = (time.monotonic() - started) * 1000
+        stats["admitted"] += 1
+        stats["wait_ms_total"] += wait_ms
+        stats["wait_ms_max"] = max(stats["wait_ms_max"], wait_ms)
+        try:
+            yield wait_ms
+        finally:
+            self._release(user_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        kinds = {}
+        for kind, counters in self._stats.items():
+            kinds[kind] = {
+                **counters,
+                "wait_ms_avg": round(counters["wait_ms_total"] / counters["admitted"], 2)
+                if counters["admitted"]
+                else 0,
+            }
+        return {
+            "active": self._active,
+            "waiting": len(self._waiting),
+            "active_users": len(self._active_by_user),
+            "global_limit": self.global_limit,
+            "per_user_limit": self.per_user_limit,
+            "kinds": kinds,
+        }
+
+
+scheduler = AdmissionScheduler()
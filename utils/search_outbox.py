@@ -0,0 +1,245 @@
+import asyncio
+import json
+import os
+import socket
+import time
+from typing import Dict, Iterable, List, Tuple
+from bson.objectid import ObjectId
+from utils.config import SEARCH_OUTBOX
+from utils.db import (
+    async_meili_client,
+    convert_objectid_to_str,
+    papers_collection,
+    solutions_collection,
+    users_collection,
+)
+from utils.redis import async_redis
+import utils.log as LOG
+
+PAPER_INDEX = "paper_id"
+SOLUTION_INDEX = "solution_id"
+USER_INDEX = "user_id"
+
+# Source collection for each Meilisearch index
+_COLLECTIONS = {
+    PAPER_INDEX: papers_collection,
+    SOLUTION_INDEX: solutions_collection,
+    USER_INDEX: users_collection,
+}
+
+_STREAM = SEARCH_OUTBOX["stream"]
+_GROUP = SEARCH_OUTBOX["group"]
+_TASKS_KEY = f"{_STREAM}:tasks"
+# Changes given up on after max_attempts, kept for inspection and manual replay
+_DEAD_LETTER = f"{_STREAM}:dead"
+_STATS_KEY = f"{_STREAM}:stats"
+_CONSUMER = f"{socket.gethostname()}-{os.getpid()}"
+
+
+async def enqueue(index: str, doc_ids: Iterable, op: str = "upsert", attempts: int = 0):
+    """Record that documents changed; the consumer pushes them to Meilisearch"""
+    doc_ids = [str(doc_id) for doc_id in doc_ids if doc_id]
+    if not doc_ids:
+        return
+    try:
+        await async_redis.xadd(
+            _STREAM,
+            {"index": index, "op": op, "ids": json.dumps(doc_ids), "attempts": attempts},
+            maxlen=SEARCH_OUTBOX["max_len"],
+            approximate=True,
+        )
+        await async_redis.hincrby(_STATS_KEY, "enqueued", len(doc_ids))
+    except Exception as e:
+        LOG.logger.error(f"Failed to enqueue {op} of {doc_ids} for index {index}: {e}")
+
+
+def _coalesce(entries: List[Tuple[str, Dict[str, str]]]) -> Dict[str, Dict[str, Tuple[str, int]]]:
+    """Collapse entries per index, keeping the last operation per document id"""
+    changes: Dict[str, Dict[str, Tuple[str, int]]] = {}
+    for _, fields in entries:
+        index_changes = changes.setdefault(fields["index"], {})
+        attempts = int(fields.get("attempts", 0))
+        for doc_id in json.loads(fields["ids"]):
+            index_changes.pop(doc_id, None)
+            index_changes[doc_id] = (fields["op"], attempts)
+    return changes
+
+
+async def _push_index(index: str, changes: Dict[str, Tuple[str, int]]):
+    meili_index = async_meili_client.index(index)
+    attempts = max(attempt for _, attempt in changes.values())
+    upsert_ids = [doc_id for doc_id, (op, _) in changes.items() if op == "upsert"]
+    delete_ids = [doc_id for doc_id, (op, _) in changes.items() if op == "delete"]
+
+    if upsert_ids:
+        # Mongo is the source of truth, so the current document always wins
+        documents = await _COLLECTIONS[index].find(
+            {"_id": {"$in": [ObjectId(doc_id) for doc_id in upsert_ids if ObjectId.is_valid(doc_id)]}}
+        ).to_list(None)
+        found = {str(document["_id"]) for document in documents}
+        delete_ids.extend(doc_id for doc_id in upsert_ids if doc_id not in found)
+        if documents:
+            task = await meili_index.add_documents(convert_objectid_to_str(documents))
+            await _track_task(task, index, "upsert", sorted(found), attempts)
+            await async_redis.hincrby(_STATS_KEY, "pushed_documents", len(documents))
+
+    if delete_ids:
+        task = await meili_index.delete_documents(delete_ids)
+        await _track_task(task, index, "delete", delete_ids, attempts)
+        await async_redis.hincrby(_STATS_KEY, "deleted_documents", len(delete_ids))
+
+
+async def _track_task(task: Dict, index: str, op: str, doc_ids: List[str], attempts: int):
+    task_uid = task.get("taskUid")
+    if task_uid is not None:
+        await async_redis.hset(
+            _TASKS_KEY,
+            task_uid,
+            json.dumps({"index": index, "op": op, "ids": doc_ids, "attempts": attempts}),
+        )
+
+
+async def _dead_letter(fields: Dict, error: str):
+    """fields is a stream entry (ids JSON-encoded) or a tracked task record (ids as a list)"""
+    ids = fields["ids"] if isinstance(fields["ids"], str) else json.dumps(fields["ids"])
+    await async_redis.xadd(
+        _DEAD_LETTER,
+        {"index": fields["index"], "op": fields["op"], "ids": ids, "error": error},
+        maxlen=SEARCH_OUTBOX["max_len"],
+        approximate=True,
+    )
+    await async_redis.hincrby(_STATS_KEY, "dead_lettered", 1)
+    LOG.logger.error(f"Gave up syncing {fields['op']} of {fields['ids']} to index {fields['index']}: {error}")
+
+
+async def _exhausted(entries: List[Tuple[str, Dict[str, str]]]) -> List[Tuple[str, Dict[str, str]]]:
+    """Entries delivered max_attempts times, counting task failures carried in their attempts field"""
+    async with async_redis.pipeline(transaction=False) as pipe:
+        for entry_id, _ in entries:
+            pipe.xpending_range(_STREAM, _GROUP, min=entry_id, max=entry_id, count=1)
+        pending = await pipe.execute()
+    return [
+        (entry_id, fields)
+        for (entry_id, fields), info in zip(entries, pending)
+        if (info[0]["times_delivered"] if info else 1) + int(fields.get("attempts", 0)) >= SEARCH_OUTBOX["max_attempts"]
+    ]
+
+
+async def _flush(entries: List[Tuple[str, Dict[str, str]]]):
+    changes = _coalesce(entries)
+    indexes = list(changes)
+    results = await asyncio.gather(
+        *[_push_index(index, changes[index]) for index in indexes],
+        return_exceptions=True,
+    )
+    errors = {index: result for index, result in zip(indexes, results) if isinstance(result, Exception)}
+    done = [entry_id for entry_id, fields in entries if fields["index"] not in errors]
+    if errors:
+        # Other failed entries stay pending; they are reclaimed and retried after claim_idle_ms
+        await async_redis.hincrby(_STATS_KEY, "push_failures", 1)
+        for entry_id, fields in await _exhausted([entry for entry in entries if entry[1]["index"] in errors]):
+            await _dead_letter(fields, str(errors[fields["index"]]))
+            done.append(entry_id)
+
+    if done:
+        await async_redis.xack(_STREAM, _GROUP, *done)
+        await async_redis.xdel(_STREAM, *done)
+    await async_redis.hset(_STATS_KEY, "last_flush", int(time.time()))
+    if errors:
+        raise next(iter(errors.values()))
+
+
+async def _check_tasks():
+    """Drop finished Meilisearch tasks and re-enqueue failed ones"""
+    tracked = await async_redis.hgetall(_TASKS_KEY)
+    if not tracked:
+        return
+    response = await async_meili_client.get_tasks([int(uid) for uid in tracked])
+    for task in response.get("results", []):
+        uid = str(task.get("uid"))
+        status = task.get("status")
+        if uid not in tracked or status in ("enqueued", "processing"):
+            continue
+        await async_redis.hdel(_TASKS_KEY, uid)
+        if status == "succeeded":
+            continue
+
+        record = json.loads(tracked[uid])
+        await async_redis.hincrby(_STATS_KEY, "task_failures", 1)
+        LOG.logger.error(f"Meilisearch task {uid} {status}: {task.get('error')}")
+        if record["attempts"] + 1 < SEARCH_OUTBOX["max_attempts"]:
+            await enqueue(record["index"], record["ids"], record["op"], record["attempts"] + 1)
+        else:
+            await _dead_letter(record, f"Meilisearch task {status}: {task.get('error')}")
+
+
+async def _ensure_group():
+    try:
+        await async_redis.xgroup_create(_STREAM, _GROUP, id="0", mkstream=True)
+    except Exception as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def _read_entries() -> List[Tuple[str, Dict[str, str]]]:
+    # Entries left pending by a failed flush or a dead consumer come first
+    claimed = await async_redis.xautoclaim(
+        _STREAM,
+        _GROUP,
+        _CONSUMER,
+        min_idle_time=SEARCH_OUTBOX["claim_idle_ms"],
+        count=SEARCH_OUTBOX["batch_size"],
+    )
+    entries = [entry for entry in claimed[1] if entry[1]]
+    if entries:
+        return entries
+
+    response = await async_redis.xreadgroup(
+        _GROUP,
+        _CONSUMER,
+        {_STREAM: ">"},
+        count=SEARCH_OUTBOX["batch_size"],
+        block=SEARCH_OUTBOX["block_ms"],
+    )
+    return [entry for _, stream_entries in response for entry in stream_entries]
+
+
+async def run_consumer():
+    """Background loop that batches outbox entries into Meilisearch"""
+    await _ensure_group()
+    LOG.logger.info(f"Search outbox consumer {_CONSUMER} started")
+    last_task_check = 0.0
+    while True:
+        try:
+            entries = await _read_entries()
+            if entries:
+                await _flush(entries)
+            if time.monotonic() - last_task_check >= SEARCH_OUTBOX["task_check_interval"]:
+                last_task_check = time.monotonic()
+                await _check_tasks()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            LOG.logger.error(f"Search outbox consumer error: {e}")
+            await asyncio.sleep(SEARCH_OUTBOX["retry_delay"])
+
+
+def _entry_time_ms(entry_id: str) -> int:
+    return int(entry_id.split("-", 1)[0])
+
+
+async def get_stats() -> Dict[str, int]:
+    stats = {key: int(value) for key, value in (await async_redis.hgetall(_STATS_KEY)).items()}
+    stats["stream_length"] = await async_redis.xlen(_STREAM)
+    stats["tracked_tasks"] = await async_redis.hlen(_TASKS_KEY)
+    stats["dead_letter_length"] = await async_redis.xlen(_DEAD_LETTER)
+
+    # Lag is the age of the oldest entry not yet synced (pending or unread)
+    oldest = await async_redis.xrange(_STREAM, count=1)
+    stats["lag_ms"] = int(time.time() * 1000) - _entry_time_ms(oldest[0][0]) if oldest else 0
+    try:
+        pending = await async_redis.xpending(_STREAM, _GROUP)
+        stats["pending"] = pending["pending"]
+    except Exception:
+        stats["pending"] = 0
+    return stats
@@ -0,0 +1,48 @@
+import base64
+import decimal
+from typing import Any
+import orjson
+from bson.decimal128 import Decimal128
+from bson.objectid import ObjectId
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+# datetime/date/UUID, str keys that are ints or datetimes, and numbers are handled by orjson itself
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+    """Types orjson does not know, as found in Mongo documents and route results"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return base64.b64encode(obj).decode()
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+
+def loads(data: Any) -> Any:
+    return orjson.loads(data)
+
+
+def to_jsonable(obj: Any) -> Any:
+    """Plain JSON types for APIs that serialize themselves (Meilisearch, SSE payloads)"""
+    return orjson.loads(dumps(obj))
+
+
+class BSONJSONResponse(ORJSONResponse):
+    """ORJSONResponse that also encodes ObjectId, bytes and Decimal128"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,210 @@
+import asyncio
+import io
+import time
+import zlib
+from collections import defaultdict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from utils.config import STREAMING
+
+_stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"chunks_in": 0, "chunk_frames_out": 0})
+_cancellation: Dict[str, int] = {
+    "disconnects": 0,
+    "streams_aborted": 0,
+    "tokens_before_abort": 0,
+    "tokens_saved_estimate": 0,
+    "image_calls_aborted": 0,
+}
+# Running mean of streamed tokens per stage, used to estimate what an abort saved
+_stage_tokens: Dict[str, list] = defaultdict(lambda: [0, 0.0])
+
+
+def _text_key(event_type: str, payload: Any) -> Optional[str]:
+    """Name of the field holding the token delta, if this event can be coalesced"""
+    if event_type != "chunk" or not isinstance(payload, dict):
+        return None
+    for key in ("delta", "text"):
+        if isinstance(payload.get(key), str):
+            return key
+    return None
+
+
+class CoalescingSender:
+    """
+    Wraps send_event and batches consecutive chunk deltas.
+
+    A chunk is sent immediately when nothing was sent during the last window,
+    otherwise deltas are merged until the window elapses or max_bytes is reached.
+    Other events flush pending text first, so ordering is preserved.
+    """
+
+    def __init__(self, send_event: Callable[[str, Any], Awaitable[None]], endpoint: str = "default"):
+        settings = STREAMING.get(endpoint, STREAMING["default"])
+        self._send_event = send_event
+        self._window = settings["window_ms"] / 1000
+        self._max_bytes = settings["max_bytes"]
+        self._stats = _stats[endpoint]
+        self._pending: Optional[Dict[str, Any]] = None
+        self._pending_key = None
+        self._pending_bytes = 0
+        self._last_flush = 0.0
+        self._timer: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def _emit(self, event_type: str, payload: Any):
+        async with self._lock:
+            await self._send_event(event_type, payload)
+
+    async def send_event(self, event_type: str, payload: Any):
+        text_key = _text_key(event_type, payload)
+        if text_key is None or (self._pending is not None and text_key != self._pending_key):
+            await self.flush()
+        if text_key is None:
+            await self._emit(event_type, payload)
+            return
+
+        self._stats["chunks_in"] += 1
+        if self._pending is None:
+            self._pending = dict(payload)
+            self._pending_key = text_key
+        else:
+            delta = self._pending[text_key] + payload[text_key]
+            self._pending.update(payload)
+            self._pending[text_key] = delta
+        self._pending_bytes += len(payload[text_key].encode("utf-8"))
+
+        elapsed = time.monotonic() - self._last_flush
+        if self._pending_bytes >= self._max_bytes or elapsed >= self._window:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later(self._window - elapsed))
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception:
+            # Disconnects are handled by the workflow's own send path
+            pass
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending is None:
+            return
+        payload = self._pending
+        self._pending, self._pending_key, self._pending_bytes = None, None, 0
+        self._last_flush = time.monotonic()
+        self._stats["chunk_frames_out"] += 1
+        await self._emit("chunk", payload)
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+DELTA_PROTOCOL = "delta"
+
+
+def negotiate_protocol(requested: Optional[str]) -> str:
+    """Chat streams use the delta protocol only when the client asks for it"""
+    return DELTA_PROTOCOL if (requested or "").lower() == DELTA_PROTOCOL else "full"
+
+
+def checksum(text: str) -> str:
+    return f"crc32:{zlib.crc32(text.encode('utf-8')):08x}"
+
+
+class ChatStreamEncoder:
+    """
+    Builds the chunk events of a chat reply.
+
+    "full" (the original format) repeats the accumulated reply in every chunk.
+    "delta" sends only {"delta", "seq"}, where seq is the number of the last
+    delta in the frame, plus a checksummed "snapshot" of the reply each time
+    its length doubles, so total bytes stay linear in the reply length.
+    """
+
+    def __init__(self, protocol: str = "full", snapshot_min_chars: int = None):
+        self.protocol = protocol
+        self.seq = 0
+        self._buffer = io.StringIO()
+        self._length = 0
+        self._next_snapshot = snapshot_min_chars or STREAMING["inspiration_chat"]["snapshot_min_chars"]
+
+    @property
+    def text(self) -> str:
+        return self._buffer.getvalue()
+
+    def add(self, piece: str) -> List[Tuple[str, Dict[str, Any]]]:
+        self._buffer.write(piece)
+        self._length += len(piece)
+        self.seq += 1
+        if self.protocol != DELTA_PROTOCOL:
+            content = self.text
+            return [("chunk", {"delta": piece, "content": content, "message": {"role": "assistant", "content": content}})]
+        events = [("chunk", {"delta": piece, "seq": self.seq})]
+        if self._length >= self._next_snapshot:
+            events.append(("snapshot", self.snapshot()))
+            self._next_snapshot = self._length * 2
+        return events
+
+    def snapshot(self) -> Dict[str, Any]:
+        content = self.text
+        return {"seq": self.seq, "length": len(content), "checksum": checksum(content), "content": content}
+
+    def result(self) -> Dict[str, Any]:
+        content = self.text
+        payload = {"content": content, "message": {"role": "assistant", "content": content}}
+        if self.protocol == DELTA_PROTOCOL:
+            payload.update(seq=self.seq, length=len(content), checksum=checksum(content))
+        return payload
+
+
+def record_disconnect():
+    _cancellation["disconnects"] += 1
+
+
+def record_aborted_images(count: int):
+    _cancellation["image_calls_aborted"] += count
+
+
+async def stream_text(chain, inputs, stage: str, **kwargs) -> AsyncIterator[str]:
+    """
+    Yield the text pieces of chain.astream(...). The provider stream is always
+    closed on exit, so cancelling the consumer releases the upstream connection.
+    Use with contextlib.aclosing so cancellation reaches this generator.
+    """
+    stream = chain.astream(inputs, **kwargs)
+    tokens = 0
+    try:
+        async for chunk in stream:
+            content = getattr(chunk, "content", None)
+            if content:
+                tokens += 1
+                yield content
+    except (asyncio.CancelledError, GeneratorExit):
+        count, mean = _stage_tokens[stage]
+        _cancellation["streams_aborted"] += 1
+        _cancellation["tokens_before_abort"] += tokens
+        _cancellation["tokens_saved_estimate"] += int(max(mean - tokens, 0))
+        raise
+    else:
+        count, mean = _stage_tokens[stage]
+        _stage_tokens[stage] = [count + 1, mean + (tokens - mean) / (count + 1)]
+    finally:
+        await stream.aclose()
+
+
+def get_stats() -> Dict[str, Dict[str, Any]]:
+    stats = {"cancellation": dict(_cancellation)}
+    for endpoint, counters in _stats.items():
+        saved = counters["chunks_in"] - counters["chunk_frames_out"]
+        stats[endpoint] = {
+            **counters,
+            "frames_saved": saved,
+            "saved_ratio": round(saved / counters["chunks_in"], 4) if counters["chunks_in"] else 0,
+        }
+    return stats
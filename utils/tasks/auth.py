@@ -3,12 +3,10 @@ import datetime
 import bcrypt
 import json
 import base64
+from pymongo.errors import DuplicateKeyError
 from utils.db import users_collection, ALLOWED_USER_TYPES, SECRET_KEY
 from utils.redis import async_redis
-from utils.tasks.task import (
-    update_user_to_meilisearch,
-    async_update_user_to_meilisearch,
-)
+import utils.search_outbox as OUTBOX
 
 
 async def register_user(email, name, password, user_type):
@@ -30,9 +28,12 @@ async def register_user(email, name, password, user_type):
         "user_type": user_type,
     }
 
-    result = await users_collection.insert_one(user)
-    created_user = await users_collection.find_one({"_id": result.inserted_id})
-    await async_update_user_to_meilisearch(created_user)
+    try:
+        result = await users_collection.insert_one(user)
+    except DuplicateKeyError:
+        # Concurrent registration with the same email, caught by the unique index
+        return {"error": "This email is already registered"}, 400
+    await OUTBOX.enqueue(OUTBOX.USER_INDEX, [result.inserted_id])
     return {"message": "Registration successful"}, 201
 
 
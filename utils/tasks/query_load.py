@@ -1,7 +1,12 @@
+import base64
 import json
 from bson.objectid import ObjectId
-from typing import List
-from utils.redis import async_redis
+from typing import Any, Dict, List, Optional
+from utils.config import CACHE, FEED, PAGINATION
+from utils.doc_cache import DocumentCache
+import utils.likes as likes
+import utils.feed as feed
+import utils.log as LOG
 from utils.db import (
     solutions_collection, papers_collection,
     solutions_liked_collection, papers_cited_collection
@@ -9,7 +14,9 @@ from utils.db import (
 
 ## Query #######################################################################
 
-async def query_solution(solution_id):
+async def _load_solution(solution_id):
+    if not ObjectId.is_valid(solution_id):
+        return None
     solution = await solutions_collection.find_one({
         '_id': ObjectId(solution_id)
     })
@@ -20,90 +27,236 @@ async def query_solution(solution_id):
         return solution
     return None
 
+async def _load_paper(paper_id):
+    if not ObjectId.is_valid(paper_id):
+        return None
+    paper = await papers_collection.find_one({'_id': ObjectId(paper_id)})
+    if paper:
+        paper['id'] = str(paper['_id'])
+        del paper['_id']
+    return paper
+
+solution_cache = DocumentCache("solution", _load_solution, CACHE["solution_expire"])
+paper_cache = DocumentCache("paper", _load_paper, CACHE["paper_expire"])
+
+async def query_solution(solution_id):
+    return await solution_cache.get(solution_id)
+
+async def query_solutions(solution_ids):
+    """Fetch several solutions in one query, preserving the order of solution_ids"""
+    solution_oids = [ObjectId(sid) for sid in solution_ids]
+    solutions = await solutions_collection.find({
+        '_id': {'$in': solution_oids}
+    }).to_list(None)
+    by_id = {}
+    for solution in solutions:
+        solution['id'] = str(solution['_id'])
+        solution['_id'] = str(solution['_id'])
+        solution['user_id'] = str(solution['user_id'])
+        by_id[solution['_id']] = solution
+    return [by_id[str(oid)] for oid in solution_oids if str(oid) in by_id]
+
 async def query_liked_solution(user_id: str, solution_ids: List[str]):
     """
     Query whether user has liked the specified solution list
     """
-    user_oid = ObjectId(user_id)
-    solution_oids = [ObjectId(sid) for sid in solution_ids]
-    cursor = solutions_liked_collection.find({
-        'user_id': user_oid,
-        'solution_id': {'$in': solution_oids}
-    })
-    
-    # Use to_list to get all results
-    liked_relations = await cursor.to_list(None)
-    liked_solution_ids = {str(relation['solution_id']) for relation in liked_relations}
-    result = [
+    liked = await likes.is_liked(user_id, solution_ids)
+    return [
         {
             'solution_id': sid,
-            'isLiked': sid in liked_solution_ids
+            'isLiked': is_liked
         }
-        for sid in solution_ids
+        for sid, is_liked in zip(solution_ids, liked)
     ]
-    
-    return result
 
 async def query_paper(paper_id: str):
-    paper = None
-    cache_key = f"paper:{paper_id}"
-    cached_result = await async_redis.get(cache_key)
-    if cached_result:
-        paper = json.loads(cached_result)
-    # Not in cache, read from database
-    else:
-        paper = await papers_collection.find_one({'_id': ObjectId(paper_id)})
-        if(paper):
-            paper['id'] = str(paper['_id'])
-            del paper['_id']
-    # Update to cache
-    if(paper):
-        await async_redis.setex(cache_key, 3600, json.dumps(paper))
-    return paper
+    return await paper_cache.get(paper_id)
 
 ## Load ########################################################################
 
-async def gallery(page: int = 1):
-    items_per_page = 10
-    skip = (page - 1) * items_per_page
-    
-    solutions = await solutions_collection.find().skip(skip).limit(items_per_page).to_list(None) 
-    return [{
+# Fields a solution card needs; full documents are fetched with query_solution
+CARD_PROJECTION = {
+    'user_id': 1,
+    'query': 1,
+    'timestamp': 1,
+    'solution.Title': 1,
+    'solution.Function': 1,
+    'solution.image_url': 1,
+}
+# Newest first; _id breaks ties between equal timestamps
+SOLUTION_SORT = [('timestamp', -1), ('_id', -1)]
+LIKED_SORT = [('_id', -1)]
+
+def encode_cursor(values: Dict[str, Any]) -> str:
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str, *keys: str) -> Dict[str, Any]:
+    """Raises ValueError for a cursor this server did not issue for this listing"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not ObjectId.is_valid(values['id']) or any(key not in values for key in keys):
+            raise ValueError
+        return values
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def _solution_card(solution):
+    return {
         "id": str(solution['_id']),
         "user_id": str(solution['user_id']),
         'query': solution['query'], 
         'solution': solution['solution'], 
         'timestamp': solution['timestamp']
-    } for solution in solutions]
-    
-async def load_solutions(user_id: str, page: int = 1):
-    items_per_page = 10
-    skip = (page - 1) * items_per_page
-    
+    }
+
+async def _solution_page(
+    query: Dict[str, Any],
+    page: int,
+    cursor: Optional[str],
+    limit: int,
+    page_projection: Optional[Dict[str, Any]] = None,
+):
+    if cursor is None:
+        # Compatibility path for ?page=N in the original list shape; full documents unless projected
+        skip = (page - 1) * limit
+        solutions = await solutions_collection.find(query, page_projection).sort(SOLUTION_SORT).skip(skip).limit(limit).to_list(None)
+        return [_solution_card(solution) for solution in solutions]
+
+    if cursor:
+        after = decode_cursor(cursor, 't')
+        oid = ObjectId(after['id'])
+        query = {**query, '$or': [
+            {'timestamp': {'$lt': after['t']}},
+            {'timestamp': after['t'], '_id': {'$lt': oid}},
+        ]}
+    solutions = await solutions_collection.find(query, CARD_PROJECTION).sort(SOLUTION_SORT).limit(limit + 1).to_list(None)
+    next_cursor = None
+    if len(solutions) > limit:
+        solutions = solutions[:limit]
+        last = solutions[-1]
+        next_cursor = encode_cursor({'t': last['timestamp'], 'id': str(last['_id'])})
+    return {'items': [_solution_card(solution) for solution in solutions], 'next_cursor': next_cursor}
+
+def feed_card(solution):
+    """_solution_card limited to CARD_PROJECTION, for documents fetched in full"""
+    fields = [key.split('.', 1)[1] for key in CARD_PROJECTION if key.startswith('solution.')]
+    body = solution['solution'] if isinstance(solution['solution'], dict) else {}
+    return _solution_card({**solution, 'solution': {key: body[key] for key in fields if key in body}})
+
+async def _feed_page(order: str, page: int, cursor: Optional[str], limit: int):
+    """
+    Gallery page from the Redis feed, or None when Mongo has to serve it
+    (feed not built, or a recency page reaching past what the feed keeps).
+    Recency cursors use the same {'t', 'id'} shape as the Mongo path.
+    """
+    if not await feed.is_built():
+        return None
+    score_key = 't' if order == feed.RECENT else 's'
+    if cursor is None:
+        start = (page - 1) * limit
+    elif cursor:
+        after = decode_cursor(cursor, score_key)
+        start = await feed.position_after(order, after['id'], after[score_key])
+    else:
+        start = 0
+    entries = await feed.read(order, start, limit + 1)
+    if len(entries) <= limit and order == feed.RECENT and feed.is_truncated(await feed.size()):
+        # The page runs past the oldest solution the feed keeps
+        return None
+
+    # Entries whose card is missing are skipped, but still count towards the page
+    items = [card for _, card, _ in entries[:limit] if card is not None]
+    if cursor is None:
+        return items
+    next_cursor = None
+    if len(entries) > limit:
+        # A recency score is the solution's timestamp
+        solution_id, _, score = entries[limit - 1]
+        next_cursor = encode_cursor({score_key: score, 'id': solution_id})
+    return {'items': items, 'next_cursor': next_cursor}
+
+async def gallery(page: int = 1, cursor: Optional[str] = None, limit: int = None, order: str = feed.RECENT):
+    """
+    cursor=None keeps the ?page=N list response; any cursor ("" for the first
+    page) switches to keyset pagination returning {"items", "next_cursor"}.
+    Served from the materialized feed in utils/feed.py when it is built.
+    Items are cards limited to CARD_PROJECTION whichever store serves them.
+    """
+    limit = limit or PAGINATION['default_page_size']
+    try:
+        result = await _feed_page(order, page, cursor, limit)
+    except ValueError:
+        raise
+    except Exception as e:
+        LOG.logger.warning(f"Gallery feed read failed, using Mongo: {e}")
+        result = None
+    if result is not None:
+        return result
+    feed.record_fallback()
+    # Mongo only knows recency; a 'hot' cursor is rejected by decode_cursor as invalid
+    return await _solution_page({}, page, cursor, limit, page_projection=CARD_PROJECTION)
+
+async def rebuild_gallery_feed() -> int:
+    """Regenerate the feed from Mongo; returns the number of solutions in it"""
     solutions = await solutions_collection.find(
-        {'user_id': ObjectId(user_id)}
-    ).skip(skip).limit(items_per_page).to_list(None)
-    return [{
-        "id": str(solution['_id']),
-        "user_id": str(solution['user_id']),
-        'query': solution['query'], 
-        'solution': solution['solution'], 
-        'timestamp': solution['timestamp']
-    } for solution in solutions]
+        {}, {**CARD_PROJECTION, 'Liked': 1}
+    ).sort(SOLUTION_SORT).limit(FEED['max_items']).to_list(None)
+    await feed.replace([(feed_card(solution), solution.get('Liked', 0)) for solution in solutions])
+    return len(solutions)
 
-async def load_liked_solutions(user_id: str, page: int = 1):
-    items_per_page = 10
-    skip = (page - 1) * items_per_page
+async def ensure_gallery_feed():
+    """Build the feed at startup if no process has built it yet"""
+    try:
+        if await feed.is_built() or not await feed.acquire_rebuild_lock():
+            return
+        try:
+            count = await rebuild_gallery_feed()
+            LOG.logger.info(f"Gallery feed built with {count} solutions")
+        finally:
+            await feed.release_rebuild_lock()
+    except Exception as e:
+        LOG.logger.error(f"Failed to build gallery feed: {e}")
     
-    relations = await solutions_liked_collection.find(
-        {'user_id': ObjectId(user_id)}
-    ).skip(skip).limit(items_per_page).to_list(None)
-    result = []
-    for relation in relations:
-        id = str(relation['solution_id'])
-        solution = await query_solution(id)
-        result.append(solution)
-    return result
+async def load_solutions(user_id: str, page: int = 1, cursor: Optional[str] = None, limit: int = None):
+    return await _solution_page({'user_id': ObjectId(user_id)}, page, cursor, limit or PAGINATION['default_page_size'])
+
+async def load_liked_solutions(user_id: str, page: int = 1, cursor: Optional[str] = None, limit: int = None):
+    """
+    One aggregation: the page of like relations joined with their solutions.
+    Relations whose solution was deleted are dropped; the cursor still moves
+    past them so a page of deleted solutions does not end the listing.
+    """
+    limit = limit or PAGINATION['default_page_size']
+    query = {'user_id': ObjectId(user_id)}
+    if cursor:
+        query['_id'] = {'$lt': ObjectId(decode_cursor(cursor)['id'])}
+    lookup = [{'$match': {'$expr': {'$eq': ['$_id', '$$solution_id']}}}]
+    if cursor is not None:
+        lookup.append({'$project': CARD_PROJECTION})
+    pipeline = [{'$match': query}, {'$sort': dict(LIKED_SORT)}]
+    if cursor is None:
+        pipeline.append({'$skip': (page - 1) * limit})
+    pipeline += [
+        {'$limit': limit + (cursor is not None)},
+        {'$lookup': {
+            'from': solutions_collection.name,
+            'let': {'solution_id': '$solution_id'},
+            'pipeline': lookup,
+            'as': 'solution',
+        }},
+        {'$project': {'solution': 1}},
+    ]
+    relations = await solutions_liked_collection.aggregate(pipeline).to_list(None)
+
+    next_cursor = None
+    if cursor is not None and len(relations) > limit:
+        relations = relations[:limit]
+        next_cursor = encode_cursor({'id': str(relations[-1]['_id'])})
+    result = [_solution_card(relation['solution'][0]) for relation in relations if relation['solution']]
+    if cursor is None:
+        return result
+    return {'items': result, 'next_cursor': next_cursor}
 
 async def load_paper_cited_by_solution(solution_id: str):
     relations = await papers_cited_collection.find(
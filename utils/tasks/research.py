@@ -1,13 +1,15 @@
 from typing import TypedDict, List, Dict, Any, Optional, Callable, Awaitable
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
-from langchain.chat_models import init_chat_model
+from langchain_core.runnables import RunnableConfig
 from IPython.display import Image, display
 from langgraph.graph import StateGraph, START, END
 from typing import Literal
 import json
-import re
 import os
+import time
+import uuid
+from contextlib import aclosing
 
 from utils.db import solution_eval, convert_objectid_to_str
 import utils.db as RAG
@@ -17,6 +19,15 @@ import asyncio
 import utils.tasks.task as TASK
 import utils.main as MAIN
 from utils.image import process_and_upload_image
+from utils.knowledge import compact_domain_knowledge
+from utils.config import DRAWING, CHECKPOINT, RESEARCH_CACHE
+import utils.research_cache as research_cache
+import utils.streaming as streaming
+from utils.llm_json import SolutionStreamParser
+from utils.model_registry import model_registry, resolve_user_model
+from utils.checkpoint import AsyncRedisCheckpointSaver
+from utils.redis import async_redis
+import utils.log as LOG
 from utils.tasks.llm import OpenAIClient
 
 # ------------------------------------------------------------
@@ -24,10 +35,7 @@ from utils.tasks.llm import OpenAIClient
 
 
 class ResearchState(TypedDict):
-    # user
-    model: Any
-    current_user: Dict[str, Any]
-    send_event: Callable[[str, Any], Awaitable[None]]
+    # options
     with_paper: bool
     with_example: bool
     is_drawing: bool
@@ -39,6 +47,7 @@ class ResearchState(TypedDict):
     # intermediate
     rag_results: Dict[str, Any]
     domain_knowledge: List[Dict[str, Any]]
+    domain_knowledge_text: str
     init_solution: Dict[str, Any]
     iterated_solution: Dict[str, Any]
     final_solution: Dict[str, Any]
@@ -55,55 +64,52 @@ class ResearchState(TypedDict):
 # ------------------------------------------------------------
 
 
-async def stream_chain(chain, inputs, state: ResearchState) -> str:
-    chunks = []
-    async for msg_chunk in chain.astream(inputs, stream_mode="messages"):
-        if hasattr(msg_chunk, "content") and msg_chunk.content:
-            await state["send_event"]("chunk", {"text": msg_chunk.content})
-            chunks.append(msg_chunk.content)
-    return "".join(chunks)
-
-
-def process_llm_response(content):
-    try:
-        return json.loads(content)
-    except json.JSONDecodeError:
-        # if content is not json, try to extract json from content
-        json_match = re.search(r"```json\s*([\s\S]*?)\s*```", content)
-        if json_match:
-            try:
-                return json.loads(json_match.group(1))
-            except json.JSONDecodeError:
-                # if extract json failed, return content as text
-                return {"text": content}
-        else:
-            # if no json found, return content as text
-            return {"text": content}
+async def stream_solution_chain(chain, inputs, config: RunnableConfig) -> Dict[str, Any]:
+    """Streams text chunks and sends each solution as a solution_partial event as soon as it closes"""
+    parser = SolutionStreamParser()
+    stage = config.get("metadata", {}).get("langgraph_node", "research")
+    send_event = config["configurable"]["send_event"]
+    async with aclosing(streaming.stream_text(chain, inputs, stage, stream_mode="messages")) as pieces:
+        async for content in pieces:
+            await send_event("chunk", {"text": content})
+            completed = parser.feed(content)
+            first = len(parser.solutions) - len(completed)
+            for index, solution in enumerate(completed, first):
+                await send_event("solution_partial", {"node": stage, "index": index, "solution": solution})
+    return parser.result()
 
 
 # ------------------------------------------------------------
 # Nodes Definition
 
+# Nodes whose prompts embed the compacted domain knowledge
+EXPERT_NODES = ("domain_expert", "interdisciplinary", "evaluation")
+
+# Caps image generations across all research runs in this process
+_drawing_semaphore = asyncio.Semaphore(DRAWING["global_concurrency"])
 
-async def rag_node(state: ResearchState):
+
+async def rag_node(state: ResearchState, config: RunnableConfig):
     # print("rag_node")
     query = state["query"]
     query_analysis_result = state["query_analysis_result"]
-    rag_results = RAG.search_in_meilisearch(
+    rag_results = await RAG.async_multi_search_in_meilisearch(
         query, query_analysis_result.get("Requirement", "")
     )
 
     state["progress"] = 30
     state["status"] = "RAG search completed"
     state["domain_knowledge"] = rag_results.get("hits", [])
+    # Kept as sent, so a resumed run replays the same rag event
+    state["rag_results"] = rag_results
 
     # Send node completion event
-    await state["send_event"]("node_complete", {"node": "rag", "result": rag_results})
+    await config["configurable"]["send_event"]("node_complete", {"node": "rag", "result": rag_results})
 
     return state
 
 
-async def paper_node(state: ResearchState):
+async def paper_node(state: ResearchState, config: RunnableConfig):
     # print("paper_node")
     paper_ids = state.get("paper_ids", [])
     papers = await asyncio.gather(
@@ -122,7 +128,7 @@ async def paper_node(state: ResearchState):
     return state
 
 
-async def example_node(state: ResearchState):
+async def example_node(state: ResearchState, config: RunnableConfig):
     # print("example_node")
     example_ids = state.get("example_ids", [])
     existing_rag_results = state.get("domain_knowledge", {"hits": []})
@@ -148,10 +154,24 @@ async def example_node(state: ResearchState):
     return state
 
 
-async def domain_expert_node(state: ResearchState):
+async def compaction_node(state: ResearchState, config: RunnableConfig):
+    domain_knowledge_text, stats = compact_domain_knowledge(state.get("domain_knowledge", []))
+    stats["tokens_saved_per_run"] = stats["tokens_saved_per_prompt"] * len(EXPERT_NODES)
+    LOG.logger.info(f"Domain knowledge compacted: {stats}")
+
+    state["progress"] = 40
+    state["status"] = "Domain knowledge compacted"
+    state["domain_knowledge_text"] = domain_knowledge_text
+
+    await config["configurable"]["send_event"]("node_complete", {"node": "compaction", "result": stats})
+
+    return state
+
+
+async def domain_expert_node(state: ResearchState, config: RunnableConfig):
     # print("domain_expert_node")
     query = state["query"]
-    domain_knowledge = state["domain_knowledge"]
+    domain_knowledge = state["domain_knowledge_text"]
     prompt = ChatPromptTemplate.from_messages(
         [
             SystemMessage(content=prompting.get_prompt("DOMAIN_EXPERT_SYSTEM_PROMPT")),
@@ -161,26 +181,26 @@ async def domain_expert_node(state: ResearchState):
         ]
     )
 
-    model = state["model"]
+    model = config["configurable"]["model"]
     chain = prompt | model
-    response = await stream_chain(chain, {"query": state["query"]}, state)
+    solution = await stream_solution_chain(chain, {"query": state["query"]}, config)
 
     state["progress"] = 60
     state["status"] = "Domain analysis completed"
-    state["init_solution"] = process_llm_response(response)
+    state["init_solution"] = solution
 
     # Send node completion event
-    await state["send_event"](
+    await config["configurable"]["send_event"](
         "node_complete", {"node": "domain_expert", "result": state["init_solution"]}
     )
 
     return state
 
 
-async def interdisciplinary_node(state: ResearchState):
+async def interdisciplinary_node(state: ResearchState, config: RunnableConfig):
     # print("interdisciplinary_node")
     query = state["query"]
-    domain_knowledge = state["domain_knowledge"]
+    domain_knowledge = state["domain_knowledge_text"]
     init_solution = state["init_solution"]
     prompt = ChatPromptTemplate.from_messages(
         [
@@ -193,16 +213,16 @@ async def interdisciplinary_node(state: ResearchState):
         ]
     )
 
-    model = state["model"]
+    model = config["configurable"]["model"]
     chain = prompt | model
-    response = await stream_chain(chain, {"query": state["query"]}, state)
+    solution = await stream_solution_chain(chain, {"query": state["query"]}, config)
 
     state["progress"] = 70
     state["status"] = "Interdisciplinary analysis completed"
-    state["iterated_solution"] = process_llm_response(response)
+    state["iterated_solution"] = solution
 
     # Send node completion event
-    await state["send_event"](
+    await config["configurable"]["send_event"](
         "node_complete",
         {"node": "interdisciplinary", "result": state["iterated_solution"]},
     )
@@ -210,10 +230,10 @@ async def interdisciplinary_node(state: ResearchState):
     return state
 
 
-async def evaluation_node(state: ResearchState):
+async def evaluation_node(state: ResearchState, config: RunnableConfig):
     # print("evaluation_node")
     query = state["query"]
-    domain_knowledge = state["domain_knowledge"]
+    domain_knowledge = state["domain_knowledge_text"]
     init_solution = state["init_solution"]
     iterated_solution = state["iterated_solution"]
     prompt = ChatPromptTemplate.from_messages(
@@ -227,27 +247,27 @@ async def evaluation_node(state: ResearchState):
         ]
     )
 
-    model = state["model"]
+    model = config["configurable"]["model"]
     chain = prompt | model
-    response = await stream_chain(chain, {"query": state["query"]}, state)
+    solution = await stream_solution_chain(chain, {"query": state["query"]}, config)
 
     state["progress"] = 80
     state["status"] = "Solution evaluation completed"
-    state["final_solution"] = process_llm_response(response)
+    state["final_solution"] = solution
 
     # Send node completion event
-    await state["send_event"](
+    await config["configurable"]["send_event"](
         "node_complete", {"node": "evaluation", "result": state["final_solution"]}
     )
 
     return state
 
 
-async def drawing_node(state: ResearchState):
+async def drawing_node(state: ResearchState, config: RunnableConfig):
     # print("drawing_node")
     query_analysis_result = state["query_analysis_result"]
     final_solution = state["final_solution"]
-    current_user = state["current_user"]
+    current_user = config["configurable"]["current_user"]
     user_type = current_user.get("user_type", "None Type")
 
     # Parse final_solution using solution_eval
@@ -269,54 +289,64 @@ async def drawing_node(state: ResearchState):
     client = OpenAIClient(api_key=API_KEY, base_url=BASE_URL, model_name=MODEL_NAME)
     SM_MS_API_KEY = os.getenv("SM_MS_API_KEY")
 
-    total_solutions = len(final_solution["solutions"])
-
-    for i, solution in enumerate(final_solution["solutions"]):
-        technical_method = solution.get("Technical Method")
-        possible_results = solution.get("Possible Results")
-
-        # Update progress for each image generation
-        current_progress = 80 + (i + 1) * 10 / total_solutions
-        await state["send_event"]("progress", int(current_progress))
-        await state["send_event"](
-            "status", f"Generating image {i+1}/{total_solutions}..."
-        )
+    solutions = final_solution["solutions"]
+    total_solutions = len(solutions)
+    run_semaphore = asyncio.Semaphore(DRAWING["run_concurrency"])
 
+    async def draw(i, solution):
         try:
-            # Generate image using drawing_expert_system
-            image_data = await MAIN.drawing_expert_system(
-                target_user,
-                technical_method,
-                possible_results,
-                client,
-                user_type=user_type,
-            )
-
-            # Process and upload image
-            image_url, image_name = await process_and_upload_image(
-                image_data["url"], SM_MS_API_KEY
-            )
-            final_solution["solutions"][i]["image_url"] = image_url
-            final_solution["solutions"][i]["image_name"] = image_name
-
+            async with run_semaphore, _drawing_semaphore:
+                # Generate image using drawing_expert_system
+                image_data = await MAIN.drawing_expert_system(
+                    target_user,
+                    solution.get("Technical Method"),
+                    solution.get("Possible Results"),
+                    client,
+                    user_type=user_type,
+                )
+
+                # Process and upload image
+                image_url, image_name = await process_and_upload_image(
+                    image_data["url"], SM_MS_API_KEY
+                )
+                solution["image_url"] = image_url
+                solution["image_name"] = image_name
         except Exception as e:
-            print(f"Failed to process image {i}: {e}")
             # Continue with other images even if one fails
-            continue
+            print(f"Failed to process image {i}: {e}")
+
+    await config["configurable"]["send_event"]("status", f"Generating {total_solutions} images...")
+    tasks = [asyncio.create_task(draw(i, solution)) for i, solution in enumerate(solutions)]
+    try:
+        for completed, future in enumerate(asyncio.as_completed(tasks), start=1):
+            await future
+
+            # Update progress as each image completes
+            current_progress = 80 + completed * 10 / total_solutions
+            await config["configurable"]["send_event"]("progress", int(current_progress))
+            await config["configurable"]["send_event"](
+                "status", f"Generated image {completed}/{total_solutions}"
+            )
+    finally:
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            streaming.record_aborted_images(len(pending))
 
     state["progress"] = 90
     state["status"] = "Image generation completed"
     state["final_solution"] = final_solution
 
     # Send node completion event
-    await state["send_event"](
+    await config["configurable"]["send_event"](
         "node_complete", {"node": "drawing", "result": final_solution}
     )
 
     return state
 
 
-async def persistence_node(state: ResearchState):
+async def persistence_node(state: ResearchState, config: RunnableConfig):
     print("persistence_node")
     query = state["query"]
     query_analysis_result = state["query_analysis_result"]
@@ -326,13 +356,12 @@ async def persistence_node(state: ResearchState):
     try:
         # Save solution to database
         solution_ids = await TASK.insert_solution(
-            state["current_user"], query, query_analysis_result, final_solution
+            config["configurable"]["current_user"], query, query_analysis_result, final_solution
         )
-        await TASK.paper_cited(domain_knowledge, solution_ids)
-
-        # Get saved solutions
-        solutions = await asyncio.gather(
-            *[QUERY.query_solution(str(solution_id)) for solution_id in solution_ids]
+        # Record citations and fetch the saved solutions concurrently
+        _, solutions = await asyncio.gather(
+            TASK.paper_cited(domain_knowledge, solution_ids),
+            QUERY.query_solutions(solution_ids),
         )
         solutions = [convert_objectid_to_str(solution) for solution in solutions]
         final_solution["solutions"] = solutions
@@ -343,16 +372,16 @@ async def persistence_node(state: ResearchState):
     state["status"] = "Task completed"
 
     # Send final completion event with solutions
-    await state["send_event"](
+    await config["configurable"]["send_event"](
         "node_complete", {"node": "persistence", "result": final_solution}
     )
 
     return state
 
 
-async def progress_tracker_node(state: ResearchState):
-    await state["send_event"]("progress", state["progress"])
-    await state["send_event"]("status", state["status"])
+async def progress_tracker_node(state: ResearchState, config: RunnableConfig):
+    await config["configurable"]["send_event"]("progress", state["progress"])
+    await config["configurable"]["send_event"]("status", state["status"])
     # # print(f"[ProgressTracker] {state['status']} ({state['progress']}%)")
     return {}
 
@@ -360,7 +389,7 @@ async def progress_tracker_node(state: ResearchState):
 # ------------------------------------------------------------
 
 
-def decide_paper(state: ResearchState) -> Literal["paper", "example", "domain_expert"]:
+def decide_paper(state: ResearchState) -> Literal["paper", "example", "compaction"]:
     with_paper = state.get("with_paper", False)
     with_example = state.get("with_example", False)
     if with_paper:
@@ -368,7 +397,7 @@ def decide_paper(state: ResearchState) -> Literal["paper", "example", "domain_ex
     elif with_example:
         return "example"
     else:
-        return "domain_expert"
+        return "compaction"
 
 
 def decide_draw(state: ResearchState) -> Literal["drawing", "persistence"]:
@@ -390,6 +419,7 @@ def create_research_graph():
     workflow.add_node("rag", rag_node)
     workflow.add_node("paper", paper_node)
     workflow.add_node("example", example_node)
+    workflow.add_node("compaction", compaction_node)
     workflow.add_node("domain_expert", domain_expert_node)
     workflow.add_node("interdisciplinary", interdisciplinary_node)
     workflow.add_node("evaluation", evaluation_node)
@@ -400,8 +430,9 @@ def create_research_graph():
     # define the workflow
     workflow.set_entry_point("rag")
     workflow.add_conditional_edges("rag", decide_paper)
-    workflow.add_edge("paper", "domain_expert")
-    workflow.add_edge("example", "domain_expert")
+    workflow.add_edge("paper", "compaction")
+    workflow.add_edge("example", "compaction")
+    workflow.add_edge("compaction", "domain_expert")
     workflow.add_edge("domain_expert", "interdisciplinary")
     workflow.add_edge("interdisciplinary", "evaluation")
     workflow.add_conditional_edges("evaluation", decide_draw)
@@ -413,6 +444,7 @@ def create_research_graph():
         "rag",
         "paper",
         "example",
+        "compaction",
         "domain_expert",
         "interdisciplinary",
         "evaluation",
@@ -420,12 +452,77 @@ def create_research_graph():
     ]:
         workflow.add_edge(node, "progress_tracker")
 
-    return workflow.compile()
+    return workflow.compile(checkpointer=AsyncRedisCheckpointSaver())
 
 
 # ------------------------------------------------------------
 
 
+class RunInProgressError(Exception):
+    """Another process holds the lock of this research run"""
+
+
+def _run_key(run_id: str) -> str:
+    return f"{CHECKPOINT['prefix']}run:{run_id}"
+
+
+def _run_config(run_id: str, current_user, send_event) -> RunnableConfig:
+    # Runtime objects live in the config so checkpoints only hold serializable state
+    return {
+        "configurable": {
+            "thread_id": run_id,
+            "current_user": current_user,
+            "send_event": send_event,
+        }
+    }
+
+
+async def _run_graph(run_id: str, graph_input, config: RunnableConfig):
+    lock_key = f"{CHECKPOINT['prefix']}lock:{run_id}"
+    if not await async_redis.set(lock_key, 1, nx=True, ex=CHECKPOINT["lock_ttl"]):
+        raise RunInProgressError("Research run is already in progress")
+
+    run_key = _run_key(run_id)
+    status = "interrupted"
+    try:
+        await async_redis.hset(run_key, "status", "running")
+        async with model_registry.for_user(config["configurable"]["current_user"]) as model:
+            config["configurable"]["model"] = model
+            result = await graph.ainvoke(graph_input, config)
+        status = "completed"
+        return result
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        status = "failed"
+        raise
+    finally:
+        await async_redis.hset(run_key, "status", status)
+        await async_redis.delete(lock_key)
+
+
+async def _replay_cached_research(
+    entry: Dict[str, Any],
+    current_user,
+    query: str,
+    query_analysis_result: Dict[str, Any],
+    send_event: Callable[[str, Any], Awaitable[None]],
+    replay_speed: float,
+):
+    await send_event("cache", {"hit": True, "created": entry.get("created")})
+    await research_cache.replay(entry, send_event, replay_speed)
+
+    # Persist a fresh copy of the cached solutions for this user
+    state = {
+        "query": query,
+        "query_analysis_result": query_analysis_result,
+        "domain_knowledge": entry.get("domain_knowledge") or [],
+        "final_solution": entry["final_solution"],
+    }
+    config = {"configurable": {"current_user": current_user, "send_event": send_event}}
+    await persistence_node(state, config)
+
+
 async def start_research(
     current_user,
     query: str,
@@ -434,24 +531,50 @@ async def start_research(
     with_example: bool,
     is_drawing: bool,
     send_event: Callable[[str, Any], Awaitable[None]],
+    run_id: Optional[str] = None,
+    use_cache: bool = True,
+    replay_speed: Optional[float] = None,
 ):
-    BASE_URL = current_user.get("api_url") or "https://api.deepseek.com/v1"
-    MODEL_NAME = current_user.get("model_name") or "deepseek-chat"
-    API_KEY = current_user.get("api_key") or None
-
-    model = init_chat_model(
-        model=MODEL_NAME,
-        model_provider="openai",
-        api_key=API_KEY,
-        base_url=BASE_URL,
-        streaming=True,
+    use_cache = use_cache and RESEARCH_CACHE["enabled"]
+    if use_cache:
+        model_name, _, base_url = resolve_user_model(current_user)
+        cache_key = research_cache.make_key(
+            query,
+            query_analysis_result,
+            with_paper,
+            with_example,
+            is_drawing,
+            model_name,
+            base_url,
+        )
+        entry = await research_cache.get(cache_key)
+        if entry:
+            if replay_speed is None:
+                replay_speed = RESEARCH_CACHE["replay_speed"]
+            await _replay_cached_research(
+                entry, current_user, query, query_analysis_result, send_event, replay_speed
+            )
+            return
+
+        recorder = research_cache.EventRecorder(send_event)
+        send_event = recorder.send_event
+
+    run_id = run_id or uuid.uuid4().hex
+    run_key = _run_key(run_id)
+    await async_redis.hset(
+        run_key,
+        mapping={
+            "user_id": str(current_user["_id"]),
+            "status": "created",
+            "created": int(time.time()),
+            "prompt_version": prompting.combined_version(research_cache.RESEARCH_PROMPTS),
+        },
     )
+    await async_redis.expire(run_key, CHECKPOINT["ttl"])
+    await send_event("run", {"run_id": run_id})
 
     # Create initial state
     initial_state = {
-        "model": model,
-        "current_user": current_user,
-        "send_event": send_event,
         "with_paper": with_paper,
         "with_example": with_example,
         "is_drawing": is_drawing,
@@ -461,9 +584,52 @@ async def start_research(
         "status": "Starting research workflow",
     }
 
-    # Run the graph
-    result = await graph.ainvoke(initial_state)
-    # print("Final state:", result)
+    # Run the graph, checkpointing after each node
+    result = await _run_graph(run_id, initial_state, _run_config(run_id, current_user, send_event))
+
+    if use_cache:
+        await research_cache.safe_put(cache_key, recorder, result.get("domain_knowledge"))
+
+
+# Completed stages replayed to a re-attached client, in graph order
+_REPLAY_NODES = [
+    ("rag", "rag_results"),
+    ("domain_expert", "init_solution"),
+    ("interdisciplinary", "iterated_solution"),
+    ("evaluation", "final_solution"),
+]
+
+
+async def resume_research(
+    current_user,
+    run_id: str,
+    send_event: Callable[[str, Any], Awaitable[None]],
+):
+    """Re-attach to a research run and continue it from its last completed node"""
+    run = await async_redis.hgetall(_run_key(run_id))
+    if not run or run.get("user_id") != str(current_user["_id"]):
+        raise ValueError("Research run not found")
+
+    config = _run_config(run_id, current_user, send_event)
+    snapshot = await graph.aget_state(config)
+    values = snapshot.values
+    if not values:
+        raise ValueError("Research run has no checkpoint")
+
+    await send_event("run", {"run_id": run_id, "resumed": True, "next": list(snapshot.next)})
+    for node, key in _REPLAY_NODES:
+        if values.get(key):
+            await send_event("node_complete", {"node": node, "result": values[key]})
+    await send_event("progress", values.get("progress", 0))
+    await send_event("status", values.get("status", ""))
+
+    if not snapshot.next:
+        await send_event(
+            "node_complete", {"node": "persistence", "result": values.get("final_solution")}
+        )
+        return
+
+    await _run_graph(run_id, None, config)
 
 
 # -------------------------------------------------------------
@@ -6,6 +6,8 @@ import os
 import asyncio
 from typing import Dict, Any
 from bson.objectid import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
 from meilisearch import Client
 from utils.config import MEILISEARCH
 from utils.db import (
@@ -26,7 +28,12 @@ from utils.db import (
 )
 from utils.tasks.query_load import *
 import utils.main as MAIN
+import utils.conversations as conversations
+import utils.likes as LIKES
+import utils.feed as FEED
+import utils.doc_cache as doc_cache
 import utils.log as LOG
+import utils.search_outbox as OUTBOX
 
 # Create MeiliSearch client instance
 meili_client = Client(MEILISEARCH["host"])
@@ -96,9 +103,12 @@ async def delete_solution(solution_id):
                 {"solution_id": ObjectId(solution_id)}
             )
 
-            # Delete document using async method
-            index = await get_async_solution_index()
-            await index.delete_document(str(solution_id))
+            # Remove from Meilisearch through the outbox
+            await OUTBOX.enqueue(OUTBOX.SOLUTION_INDEX, [solution_id], "delete")
+            await doc_cache.invalidate("solution", solution_id)
+            await conversations.invalidate_context(solution_id)
+            await LIKES.forget_solution(solution_id)
+            await FEED.remove(solution_id)
 
             return True
     return False
@@ -108,113 +118,109 @@ async def delete_solution(solution_id):
 
 
 async def insert_solution(current_user, query, query_analysis_result, final_solution):
-    results = []
     user_id = current_user.get("_id")
-    solutions = final_solution["solutions"]
-    for solution in solutions:
-        data = {
+    timestamp = int(time.time())
+    documents = [
+        {
             "user_id": ObjectId(user_id),
             "query": query,
             "query_analysis_result": query_analysis_result,
             "solution": solution,
-            "timestamp": int(time.time()),
+            "timestamp": timestamp,
         }
-        result = await solutions_collection.insert_one(data)
-        results.append(result.inserted_id)
-
-        temp = await solutions_collection.find_one({"_id": result.inserted_id})
-        # Update to Meilisearch using async method
-        await async_update_solution_to_meilisearch(temp)
-
-    print(f"New document inserted, ID: {results}")
-    return results
+        for solution in final_solution["solutions"]
+    ]
+    if not documents:
+        return []
+
+    result = await solutions_collection.insert_many(documents)
+    await OUTBOX.enqueue(OUTBOX.SOLUTION_INDEX, result.inserted_ids)
+    await FEED.add([(feed_card(document), 0) for document in documents])
+
+    print(f"New document inserted, ID: {result.inserted_ids}")
+    return result.inserted_ids
+
+
+def _cited_paper_ids(papers) -> List[ObjectId]:
+    if isinstance(papers, dict):
+        papers = papers.get("hits", [])
+    paper_ids = []
+    for paper in papers or []:
+        if not isinstance(paper, dict):
+            continue
+        paper_id = paper.get("_id") or paper.get("paper_id")
+        if paper_id and ObjectId.is_valid(str(paper_id)):
+            paper_id = ObjectId(str(paper_id))
+            if paper_id not in paper_ids:
+                paper_ids.append(paper_id)
+    return paper_ids
 
 
 async def paper_cited(
     papers: List[Dict[str, Any]], solution_ids: List[ObjectId]
 ) -> None:
-    formatted_time = get_formatted_time()
+    paper_ids = _cited_paper_ids(papers)
+    if not paper_ids:
+        return
 
-    for paper in papers:
-        paper_id = paper.get("_id")
-        if paper_id:
-            updated_paper = await papers_collection.find_one_and_update(
-                {"_id": ObjectId(paper_id)},
-                {"$inc": {"Cited": 1}},
-                return_document=True,
-            )
-            # Update to Meilisearch using async method
-            await async_update_paper_to_meilisearch(updated_paper)
-
-            for solution_id in solution_ids:
-                await papers_cited_collection.insert_one(
+    formatted_time = get_formatted_time()
+    await papers_collection.bulk_write(
+        [UpdateOne({"_id": paper_id}, {"$inc": {"Cited": 1}}) for paper_id in paper_ids],
+        ordered=False,
+    )
+    if solution_ids:
+        await papers_cited_collection.bulk_write(
+            [
+                InsertOne(
                     {
-                        "paper_id": ObjectId(paper_id),
+                        "paper_id": paper_id,
                         "solution_id": ObjectId(solution_id),
                         "time": formatted_time,
                     }
                 )
+                for paper_id in paper_ids
+                for solution_id in solution_ids
+            ],
+            ordered=False,
+        )
+    await OUTBOX.enqueue(OUTBOX.PAPER_INDEX, paper_ids)
+    await doc_cache.invalidate("paper", *paper_ids)
 
 
 async def like_paper(paper, user):
     paper_id = paper.get("_id")
     user_id = user.get("_id")
     if paper_id and user_id:
-        updated_paper = await papers_collection.find_one_and_update(
-            {"_id": ObjectId(paper_id)}, {"$inc": {"Liked": 1}}, return_document=True
-        )
-        # Update to Meilisearch using async method
-        await async_update_paper_to_meilisearch(updated_paper)
-
-        await papers_liked_collection.insert_one(
-            {
-                "user_id": ObjectId(user_id),
-                "paper_id": ObjectId(paper_id),
-                "time": get_formatted_time(),
-            }
+        # The unique (user_id, paper_id) index makes a repeated like a no-op
+        try:
+            await papers_liked_collection.insert_one(
+                {
+                    "user_id": ObjectId(user_id),
+                    "paper_id": ObjectId(paper_id),
+                    "time": get_formatted_time(),
+                }
+            )
+        except DuplicateKeyError:
+            return
+        await papers_collection.update_one(
+            {"_id": ObjectId(paper_id)}, {"$inc": {"Liked": 1}}
         )
+        await OUTBOX.enqueue(OUTBOX.PAPER_INDEX, [paper_id])
+        await doc_cache.invalidate("paper", paper_id)
 
 
 async def like_solution(user_id: str, solution_id: str):
-    if (solution_id is None) or (user_id is None):
+    if (solution_id is None) or (user_id is None) or not ObjectId.is_valid(solution_id):
         return {
             "message": "Failed",
             "user_id": str(user_id),
             "solution_id": str(solution_id),
         }, 400
 
-    is_exist = await query_liked_solution(user_id, [solution_id])
-    if is_exist and len(is_exist) > 0 and is_exist[0]["isLiked"]:
-        result = await solutions_collection.find_one_and_update(
-            {"_id": ObjectId(solution_id)},
-            {"$inc": {"Liked": -1}},
-            return_document=True,
-        )
-        await solutions_liked_collection.delete_one(
-            {"user_id": ObjectId(user_id), "solution_id": ObjectId(solution_id)}
-        )
-        # Update to Meilisearch using async method
-        await async_update_solution_to_meilisearch(result)
-        return {
-            "message": "Unlike",
-            "user_id": str(user_id),
-            "solution_id": str(solution_id),
-        }, 200
-
-    result = await solutions_collection.find_one_and_update(
-        {"_id": ObjectId(solution_id)}, {"$inc": {"Liked": 1}}, return_document=True
-    )
-    await solutions_liked_collection.insert_one(
-        {
-            "user_id": ObjectId(user_id),
-            "solution_id": ObjectId(solution_id),
-            "time": get_formatted_time(),
-        }
-    )
-    # Update to Meilisearch using async method
-    await async_update_solution_to_meilisearch(result)
+    # Toggled in Redis; utils.likes flushes relations, counts and search updates in batches
+    liked = await LIKES.toggle(user_id, solution_id)
     return {
-        "message": "Like successful",
+        "message": "Like successful" if liked > 0 else "Unlike",
         "user_id": str(user_id),
         "solution_id": str(solution_id),
     }, 200
@@ -245,8 +251,7 @@ async def set_apikey(current_user, api_key, api_url=None, model_name=None):
             {"_id": current_user["_id"]}, {"$set": update_data}
         )
 
-        updated_user = await users_collection.find_one({"_id": current_user["_id"]})
-        await async_update_user_to_meilisearch(updated_user)
+        await OUTBOX.enqueue(OUTBOX.USER_INDEX, [current_user["_id"]])
 
         return {"success": True, "message": "API settings updated successfully"}
     except Exception as e:
@@ -281,9 +286,7 @@ async def test_api_connection(current_user, api_key, api_url=None, model_name=No
         test_prompt = "Hello, this is a test message. Please respond with 'OK' if you receive this."
 
         try:
-            response = await asyncio.to_thread(
-                lambda: MAIN.simple_completion(test_prompt, client)
-            )
+            response = await MAIN.simple_completion(test_prompt, client)
             LOG.logger.info(
                 f"API connection test successful for user {current_user['email']}"
             )